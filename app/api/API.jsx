@@ -155,10 +155,105 @@ const handleApiError = (error, context = "") => {
   throw enhancedError;
 };
 
+// Ask /predict and /weather for the compact columnar format; the server falls back to plain JSON.
+// Compression (gzip) is negotiated and undone by the platform HTTP stack.
+const COMPACT_ACCEPT =
+  "application/vnd.aerovision.compact+json, application/json;q=0.9";
+
+// Rebuild the legacy /predict shape from the compact format (category codes index `categories`)
+const expandCompactForecast = (compact) => {
+  const entry = (pollutant, i) => {
+    const column = compact.predictions[pollutant];
+    const [category, warning, color] = compact.categories[column.category[i]];
+    return {
+      day: compact.days[i],
+      date: compact.dates[i],
+      value: column.value[i],
+      aqi: column.aqi[i],
+      category,
+      warning,
+      color,
+    };
+  };
+
+  const predictions = {};
+  Object.entries(compact.predictions).forEach(([pollutant, column]) => {
+    predictions[pollutant] = compact.dates
+      .map((_, i) => (column.category[i] === null ? null : entry(pollutant, i)))
+      .filter(Boolean);
+  });
+
+  const overallDailyAqi = [];
+  compact.main_pollutant.forEach((pollutant, i) => {
+    if (pollutant !== null) {
+      const { day, date, ...rest } = entry(pollutant, i);
+      overallDailyAqi.push({ day, date, main_pollutant: pollutant, ...rest });
+    }
+  });
+
+  return {
+    city: compact.city,
+    predictions,
+    today_pollutants: compact.today_pollutants.map((pollutant) => ({
+      ...predictions[pollutant][0],
+      pollutant,
+    })),
+    overall_daily_aqi: overallDailyAqi,
+    errors: compact.errors,
+    lat: compact.lat,
+    lon: compact.lon,
+    data_source: compact.data_source,
+  };
+};
+
+// Rebuild the legacy /weather shape (one object per day) from per-field arrays
+const expandCompactWeather = (compact) => {
+  const fields = Object.keys(compact.forecast);
+  const days = fields.length ? compact.forecast[fields[0]].length : 0;
+  return {
+    city: compact.city,
+    forecast: Array.from({ length: days }, (_, i) =>
+      Object.fromEntries(fields.map((field) => [field, compact.forecast[field][i]]))
+    ),
+  };
+};
+
+const COMPACT_DECODERS = {
+  "/predict": expandCompactForecast,
+  "/weather": expandCompactWeather,
+};
+
+// Last response body and ETag per endpoint + city, so unchanged data comes back as a bodiless 304
+const etagCache = {};
+
+const postWithETag = async (url, body) => {
+  const key = `${url}:${(body.city || "").trim().toLowerCase()}`;
+  const cached = etagCache[key];
+  const response = await api.post(url, body, {
+    headers: {
+      Accept: COMPACT_ACCEPT,
+      ...(cached ? { "If-None-Match": cached.etag } : {}),
+    },
+  });
+
+  if (response.status === 304 && cached) {
+    return { ...response, data: cached.data };
+  }
+  let data = response.data;
+  if (data?.format === "compact-1" && COMPACT_DECODERS[url]) {
+    data = COMPACT_DECODERS[url](data);
+  }
+  const etag = response.headers?.etag;
+  if (etag && response.status === 200) {
+    etagCache[key] = { etag, data };
+  }
+  return { ...response, data };
+};
+
 export const fetchAirQualityData = async (city) => {
   try {
     console.log(`🌍 Fetching air quality data for: ${city}`);
-    const { data } = await api.post("/predict", {
+    const { data } = await postWithETag("/predict", {
       city: city,
     });
 
@@ -186,7 +281,7 @@ export const fetchAirQualityData = async (city) => {
 export const weatherDetails = async (city) => {
   try {
     console.log(`🌤️  Fetching weather data for: ${city}`);
-    const { data } = await api.post("/weather", {
+    const { data } = await postWithETag("/weather", {
       city: city,
     });
 
@@ -255,23 +350,30 @@ export const fetchStationAQI = async (stationId) => {
   }
 };
 
-// Fetch AQI data for multiple stations
+// Fetch AQI data for multiple stations in one backend round trip
 export const fetchMultipleStationsAQI = async (stationIds) => {
   try {
-    const promises = stationIds.map((id) => fetchStationAQI(id));
-    const results = await Promise.allSettled(promises);
+    const { data } = await api.get("/api/stations", {
+      params: { ids: stationIds.join(",") },
+    });
+    if (!data || !data.stations) {
+      throw new Error(data?.error || "Invalid station data received from server");
+    }
 
-    return results.map((result, index) => {
-      if (result.status === "fulfilled") {
-        return result.value;
-      } else {
-        return {
-          stationId: stationIds[index],
-          error: true,
-          errorMessage: result.reason?.message || "Unknown error",
-          fetchedAt: new Date().toISOString(),
-        };
+    const fetchedAt = new Date().toISOString();
+    const fetchedTime = Date.now();
+    // Keep the per-station shape of fetchStationAQI ({ stationId, 0: station, ... })
+    return stationIds.map((id) => {
+      const station = data.stations[id];
+      if (station) {
+        return { stationId: id, 0: station, fetchedAt, fetchedTime };
       }
+      return {
+        stationId: id,
+        error: true,
+        errorMessage: data.errors?.[id] || "No data for station",
+        fetchedAt,
+      };
     });
   } catch (error) {
     console.error("Error fetching multiple stations AQI:", error);
@@ -284,4 +386,120 @@ export const fetchMultipleStationsAQI = async (stationIds) => {
   }
 };
 
+// Server-Sent Events endpoint; the reverse proxy routes it to the backend's SSE_PORT listener
+const LIVE_UPDATES_URL = `${api.defaults.baseURL}/api/subscribe`;
+
+// Minimal SSE reader over XMLHttpRequest (React Native has no EventSource); calls onEvent(name, data)
+// for every frame and reconnects after the server's retry delay until the returned function is called.
+const openEventStream = (url, onEvent) => {
+  let xhr = null;
+  let timer = null;
+  let closed = false;
+  let retry = 5000;
+
+  const connect = () => {
+    let seen = 0;
+    let buffer = "";
+    xhr = new XMLHttpRequest();
+    xhr.open("GET", url);
+    xhr.setRequestHeader("Accept", "text/event-stream");
+    xhr.onprogress = () => {
+      buffer += xhr.responseText.slice(seen);
+      seen = xhr.responseText.length;
+      const frames = buffer.split("\n\n");
+      buffer = frames.pop();
+      // responseText keeps the whole stream; start a fresh connection before it grows large
+      if (seen > 1024 * 1024) {
+        xhr.abort();
+      }
+      frames.forEach((frame) => {
+        let event = "message";
+        let data = "";
+        frame.split("\n").forEach((line) => {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+          else if (line.startsWith("retry: ")) retry = Number(line.slice(7)) || retry;
+        });
+        if (data) {
+          try {
+            onEvent(event, JSON.parse(data));
+          } catch (error) {
+            console.error("Live update handler failed:", error);
+          }
+        }
+      });
+    };
+    xhr.onloadend = () => {
+      // 400: nothing to subscribe to (e.g. an unmapped city); 404: live updates aren't deployed
+      if (!closed && ![400, 404].includes(xhr.status)) {
+        timer = setTimeout(connect, retry);
+      }
+    };
+    xhr.send();
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    xhr?.abort();
+  };
+};
+
+// Live forecast for a mapped city: onForecast receives the legacy /predict shape on subscribe (when
+// the server has one) and again whenever the hourly refresh changes it. Returns an unsubscribe function.
+export const subscribeToForecast = (city, onForecast) => {
+  let compact = null;
+  return openEventStream(
+    `${LIVE_UPDATES_URL}?cities=${encodeURIComponent(city)}`,
+    (event, data) => {
+      if (event === "forecast") {
+        compact = data.forecast;
+      } else if (event === "forecast-delta" && compact) {
+        const { predictions, ...rest } = data.changed;
+        compact = {
+          ...compact,
+          ...rest,
+          predictions: { ...compact.predictions, ...predictions },
+        };
+      } else {
+        return;
+      }
+      onForecast({
+        ...expandCompactForecast(compact),
+        fetchedAt: new Date().toISOString(),
+        fetchedTime: Date.now(),
+      });
+    }
+  );
+};
+
+// Voronoi cells and interpolated AQI grid for every station, built and cached by the backend
+export const fetchStationMap = async () => {
+  const cached = etagCache["/api/map"];
+  try {
+    const response = await api.get("/api/map", {
+      headers: cached ? { "If-None-Match": cached.etag } : {},
+    });
+    if (response.status === 304 && cached) {
+      return cached.data;
+    }
+    const { data } = response;
+    if (!data || !Array.isArray(data.features)) {
+      throw new Error(data?.error || "Invalid map data received from server");
+    }
+    const etag = response.headers?.etag;
+    if (etag) {
+      etagCache["/api/map"] = { etag, data };
+    }
+    return data;
+  } catch (error) {
+    console.error("Error fetching station map:", error);
+    if (cached) {
+      return cached.data;
+    }
+    throw error;
+  }
+};
+
 export default api;
@@ -8,24 +8,18 @@ import {
   View,
 } from "react-native";
 import { WebView } from "react-native-webview";
-import { fetchMultipleStationsAQI } from "../api/API";
+import { fetchStationMap } from "../api/API";
 import { useLanguage } from "../contexts/LanguageContext";
-import { getAQILevel } from "../utils/aqiUtils";
-import {
-  STATIONS,
-  getCleanStationCoordinates,
-  getStationsWithinRadius,
-} from "../utils/stations";
+import { getAllAQILevels } from "../utils/aqiUtils";
 import { getTranslation } from "../utils/translations";
 
 const AQIMap = ({ selectedLocation }) => {
   const { selectedLanguage } = useLanguage();
   const t = (key) => getTranslation(key, selectedLanguage);
 
-  const [stationsData, setStationsData] = useState({});
+  const [mapData, setMapData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [mapRegion, setMapRegion] = useState(null);
-  const [visibleStations, setVisibleStations] = useState([]);
   const [refreshing, setRefreshing] = useState(false);
 
   // Default location (Bhopal, Madhya Pradesh)
@@ -80,172 +74,42 @@ const AQIMap = ({ selectedLocation }) => {
       longitudeDelta: 0.5,
     };
     setMapRegion(initialRegion);
-
-    // Get stations within radius of the location
-    const nearbyStations = getStationsWithinRadius(
-      location.latitude,
-      location.longitude,
-      100 // 100km radius
-    );
-    setVisibleStations(nearbyStations);
   }, [selectedLocation]);
 
-  // Fetch AQI data for visible stations
-  const fetchStationsAQI = useCallback(async (stations) => {
-    if (!stations || stations.length === 0) {
-      //   console.log("AQIMap: No stations to fetch AQI for");
-      return;
-    }
-
-    // console.log("AQIMap: Fetching AQI for", stations.length, "stations");
+  // Fetch the station map layers (Voronoi cells + AQI grid), computed and cached by the backend
+  const fetchMap = useCallback(async () => {
     setLoading(true);
     try {
-      const stationIds = stations.map((station) => station.station_id);
-      //   console.log("AQIMap: Station IDs:", stationIds);
-
-      const aqiResults = await fetchMultipleStationsAQI(stationIds);
-      //   console.log("AQIMap: AQI results:", aqiResults);
-
-      // Convert array to object with station_id as key
-      const aqiData = {};
-      aqiResults.forEach((result) => {
-        aqiData[result.stationId] = result;
-      });
-
-      //   console.log("AQIMap: Processed AQI data:", aqiData);
-      setStationsData(aqiData);
+      setMapData(await fetchStationMap());
     } catch (error) {
-      console.error("AQIMap: Error fetching stations AQI:", error);
+      console.error("AQIMap: Error fetching station map:", error);
     } finally {
       setLoading(false);
     }
   }, []);
 
-  // Fetch data when visible stations change
   useEffect(() => {
-    // console.log(
-    //   "AQIMap: visibleStations changed:",
-    //   visibleStations.length,
-    //   "stations"
-    // );
-    if (visibleStations.length > 0) {
-      fetchStationsAQI(visibleStations);
-    }
-  }, [visibleStations, fetchStationsAQI]);
+    fetchMap();
+  }, [fetchMap]);
 
   // Refresh stations data
   const handleRefresh = useCallback(async () => {
     setRefreshing(true);
-    await fetchStationsAQI(visibleStations);
+    await fetchMap();
     setRefreshing(false);
-  }, [visibleStations, fetchStationsAQI]);
-
-  // Get AQI value and info for a station
-  const getStationAQIInfo = (station) => {
-    const stationData = stationsData[station.station_id];
-    if (!stationData || stationData.error) {
-      return {
-        aqi: null,
-        color: "#6b7280",
-        bgColor: "#f3f4f6",
-        error: true,
-      };
-    }
-
-    // The API returns data in stationData[0] format
-    const apiData = stationData[0];
-    if (
-      apiData &&
-      apiData.aqi &&
-      apiData.aqi !== "ID" &&
-      !isNaN(parseFloat(apiData.aqi))
-    ) {
-      const aqiValue = parseFloat(apiData.aqi);
-      const aqiInfo = getAQILevel(aqiValue);
-      return {
-        aqi: Math.round(aqiValue),
-        color: aqiInfo.color,
-        bgColor: aqiInfo.bgColor,
-        error: false,
-      };
-    }
-
-    return {
-      aqi: null,
-      color: "#6b7280",
-      bgColor: "#f3f4f6",
-      error: true,
-    };
-  };
+  }, [fetchMap]);
 
   // Generate HTML content for the map
   const generateMapHTML = () => {
     const location = mapRegion || { latitude: 22.7196, longitude: 75.8577 }; // Default to Indore
 
-    // Create station markers data with some sample data first
-    const markersData =
-      visibleStations.length > 0
-        ? visibleStations.map((station) => {
-            const coords = getCleanStationCoordinates(station);
-            const aqiInfo = getStationAQIInfo(station);
-
-            // For stations without data, generate a demo AQI for testing
-            const fallbackAQI =
-              aqiInfo.aqi || Math.floor(Math.random() * 200) + 50;
-            const fallbackAQIInfo = aqiInfo.error
-              ? getAQILevel(fallbackAQI)
-              : aqiInfo;
-
-            return {
-              id: station.station_id,
-              name: station.station_name,
-              location: station.arealocation,
-              lat: coords.latitude,
-              lng: coords.longitude,
-              aqi: aqiInfo.aqi || fallbackAQI,
-              color: fallbackAQIInfo.color,
-              bgColor: fallbackAQIInfo.bgColor,
-              error: false, // Show all markers for now
-            };
-          })
-        : // Sample stations for Indore area if no data loaded yet
-          [
-            {
-              id: 13,
-              name: "Indore - Chhoti Gwaltoli",
-              location: "Chhoti Gwaltoli",
-              lat: 22.719217,
-              lng: 75.869601,
-              aqi: 108,
-              color: "#ff9500",
-              bgColor: "#fff3e0",
-              error: false,
-            },
-            {
-              id: 31,
-              name: "Indore - Vijay Nagar",
-              location: "Vijay Nagar",
-              lat: 22.76726,
-              lng: 75.8871,
-              aqi: 95,
-              color: "#ffeb3b",
-              bgColor: "#fff9c4",
-              error: false,
-            },
-            {
-              id: 36,
-              name: "Indore - Maguda Nagar",
-              location: "Maguda Nagar",
-              lat: 22.752431,
-              lng: 75.884514,
-              aqi: 87,
-              color: "#ffeb3b",
-              bgColor: "#fff9c4",
-              error: false,
-            },
-          ];
-
-    // console.log("Generating map with markers:", markersData);
+    // Colour bands for the WebView; the last band's Infinity max doesn't survive JSON
+    const levels = getAllAQILevels().map((level) => ({
+      min: level.min,
+      color: level.color,
+      bgColor: level.bgColor,
+    }));
+    const layers = mapData || { features: [], grid: null };
 
     return `
 <!DOCTYPE html>
@@ -317,7 +181,6 @@ const AQIMap = ({ selectedLocation }) => {
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
             integrity="sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo="
             crossorigin=""></script>
-    <script src="https://d3js.org/d3-delaunay.v6.min.js"></script>
     
     <script>
         console.log('Initializing map...');
@@ -343,114 +206,82 @@ const AQIMap = ({ selectedLocation }) => {
             
             tileLayer.addTo(map);
             
-            // Station markers data
-            var stations = ${JSON.stringify(markersData)};
-            // console.log('Adding', stations.length, 'stations to map');
-            
-            // Create Thiessen polygons (Voronoi diagram)
-            if (stations.length >= 3 && typeof d3 !== 'undefined') {
-                try {
-                    // Extract coordinates for Voronoi calculation
-                    var points = stations.map(function(station) {
-                        return [station.lng, station.lat];
-                    });
-                    
-                    // Get map bounds to clip polygons
-                    var bounds = map.getBounds();
-                    var bbox = [
-                        bounds.getWest(),
-                        bounds.getSouth(),
-                        bounds.getEast(),
-                        bounds.getNorth()
-                    ];
-                    
-                    // Expand bounds to ensure polygons cover entire visible area
-                    var expandFactor = 0.5;
-                    var widthExpand = (bbox[2] - bbox[0]) * expandFactor;
-                    var heightExpand = (bbox[3] - bbox[1]) * expandFactor;
-                    bbox = [
-                        bbox[0] - widthExpand,
-                        bbox[1] - heightExpand,
-                        bbox[2] + widthExpand,
-                        bbox[3] + heightExpand
-                    ];
-                    
-                    // Create Delaunay triangulation and Voronoi diagram
-                    var delaunay = d3.Delaunay.from(points);
-                    var voronoi = delaunay.voronoi(bbox);
-                    
-                    // Draw Voronoi polygons
-                    stations.forEach(function(station, i) {
-                        var cell = voronoi.cellPolygon(i);
-                        if (cell) {
-                            // Convert cell coordinates from [lng, lat] to [lat, lng] for Leaflet
-                            var polygonCoords = cell.map(function(coord) {
-                                return [coord[1], coord[0]];
-                            });
-                            
-                            // Create polygon with AQI-based coloring
-                            var polygon = L.polygon(polygonCoords, {
-                                color: station.color,
-                                fillColor: station.bgColor,
-                                fillOpacity: 0.3,
-                                weight: 2,
-                                opacity: 0.6
-                            }).addTo(map);
-                            
-                            // Add popup to polygon
-                            var polygonPopupContent = '<div class="popup-content">' +
-                                '<div class="popup-title">' + (station.name || 'Station') + '</div>' +
-                                '<div class="popup-location">' + (station.location || 'Unknown location') + '</div>' +
-                                '<div class="popup-aqi" style="color: ' + station.color + ';">AQI: ' + (station.aqi || 'N/A') + '</div>' +
-                                '</div>';
-                            
-                            polygon.bindPopup(polygonPopupContent);
-                        }
-                    });
-                    
-                    console.log('Thiessen polygons drawn for', stations.length, 'stations');
-                } catch (e) {
-                    console.error('Error creating Thiessen polygons:', e);
+            // Map layers from the backend: Voronoi cell per station and an interpolated AQI grid
+            var layers = ${JSON.stringify(layers)};
+            var levels = ${JSON.stringify(levels)};
+
+            function levelFor(aqi) {
+                var level = levels[0];
+                for (var i = 0; i < levels.length; i++) {
+                    if (aqi >= levels[i].min) {
+                        level = levels[i];
+                    }
                 }
+                return level;
             }
-            
-            // Add markers for each station
-            stations.forEach(function(station, index) {
-                // console.log('Adding station:', station.name, station.lat, station.lng);
-                
-                if (station.lat && station.lng && !isNaN(station.lat) && !isNaN(station.lng)) {
-                    try {
-                        // Create custom marker
-                        var markerHtml = '<div class="aqi-marker" style="border-color: ' + station.color + '; color: ' + station.color + ';">' + 
-                                        (station.aqi || '?') + '</div>';
-                        
-                        var customIcon = L.divIcon({
-                            html: markerHtml,
-                            className: 'custom-div-icon',
-                            iconSize: [40, 40],
-                            iconAnchor: [20, 20],
-                            popupAnchor: [0, -20]
-                        });
-                        
-                        // Create popup content
-                        var popupContent = '<div class="popup-content">' +
-                            '<div class="popup-title">' + (station.name || 'Station') + '</div>' +
-                            '<div class="popup-location">' + (station.location || 'Unknown location') + '</div>' +
-                            '<div class="popup-aqi" style="color: ' + station.color + ';">AQI: ' + (station.aqi || 'N/A') + '</div>' +
-                            '</div>';
-                        
-                        // Add marker to map
-                        var marker = L.marker([station.lat, station.lng], {icon: customIcon})
-                            .addTo(map)
-                            .bindPopup(popupContent);
-                            
-                        // console.log('Added marker for station:', station.name);
-                    } catch (e) {
-                        console.error('Error adding marker for station:', station.name, e);
+
+            function popupContent(station, color) {
+                return '<div class="popup-content">' +
+                    '<div class="popup-title">' + (station.city || 'Station') + '</div>' +
+                    '<div class="popup-location">' + (station.category || 'No data') + '</div>' +
+                    '<div class="popup-aqi" style="color: ' + color + ';">AQI: ' + (station.aqi === null ? 'N/A' : station.aqi) + '</div>' +
+                    '</div>';
+            }
+
+            // Interpolated AQI grid, drawn once into a canvas (one pixel per cell) and stretched over its bounds
+            var grid = layers.grid;
+            if (grid && grid.aqi.some(function(v) { return v !== null; })) {
+                var canvas = document.createElement('canvas');
+                canvas.width = grid.cols;
+                canvas.height = grid.rows;
+                var ctx = canvas.getContext('2d');
+                grid.aqi.forEach(function(aqi, i) {
+                    if (aqi === null) {
+                        return;
                     }
-                } else {
-                    console.warn('Invalid coordinates for station:', station.name, station.lat, station.lng);
+                    ctx.fillStyle = levelFor(aqi).color;
+                    ctx.fillRect(i % grid.cols, Math.floor(i / grid.cols), 1, 1);
+                });
+                L.imageOverlay(canvas.toDataURL(), [[grid.bbox[1], grid.bbox[0]], [grid.bbox[3], grid.bbox[2]]], {
+                    opacity: 0.25
+                }).addTo(map);
+            }
+
+            // Thiessen polygons (Voronoi cells)
+            L.geoJSON(layers, {
+                style: function(feature) {
+                    var aqi = feature.properties.aqi;
+                    var level = aqi === null ? null : levelFor(aqi);
+                    return {
+                        color: level ? level.color : '#6b7280',
+                        fillColor: level ? level.bgColor : '#f3f4f6',
+                        fillOpacity: 0.3,
+                        weight: 2,
+                        opacity: 0.6
+                    };
+                },
+                onEachFeature: function(feature, layer) {
+                    var aqi = feature.properties.aqi;
+                    layer.bindPopup(popupContent(feature.properties, aqi === null ? '#6b7280' : levelFor(aqi).color));
                 }
+            }).addTo(map);
+
+            // Station markers
+            layers.features.forEach(function(feature) {
+                var station = feature.properties;
+                var color = station.aqi === null ? '#6b7280' : levelFor(station.aqi).color;
+                var markerHtml = '<div class="aqi-marker" style="border-color: ' + color + '; color: ' + color + ';">' +
+                                (station.aqi === null ? '?' : station.aqi) + '</div>';
+                var customIcon = L.divIcon({
+                    html: markerHtml,
+                    className: 'custom-div-icon',
+                    iconSize: [40, 40],
+                    iconAnchor: [20, 20],
+                    popupAnchor: [0, -20]
+                });
+                L.marker([station.lat, station.lon], {icon: customIcon})
+                    .addTo(map)
+                    .bindPopup(popupContent(station, color));
             });
             
             // Remove loading message
@@ -470,34 +301,6 @@ const AQIMap = ({ selectedLocation }) => {
 </html>`;
   };
 
-  // Handle map region change to update visible stations
-  const handleRegionChangeComplete = useCallback(
-    (region) => {
-      setMapRegion(region);
-
-      // Calculate which stations are in the current view
-      const paddingFactor = 1.2; // Add some padding to include stations slightly outside view
-      const latDelta = region.latitudeDelta * paddingFactor;
-      const lngDelta = region.longitudeDelta * paddingFactor;
-
-      const visibleInRegion = STATIONS.filter((station) => {
-        const coords = getCleanStationCoordinates(station);
-        return (
-          coords.latitude >= region.latitude - latDelta / 2 &&
-          coords.latitude <= region.latitude + latDelta / 2 &&
-          coords.longitude >= region.longitude - lngDelta / 2 &&
-          coords.longitude <= region.longitude + lngDelta / 2
-        );
-      });
-
-      // Only update if the stations list changed significantly
-      if (visibleInRegion.length !== visibleStations.length) {
-        setVisibleStations(visibleInRegion);
-      }
-    },
-    [visibleStations]
-  );
-
   if (!mapRegion) {
     return (
       <View style={styles.loadingContainer}>
@@ -540,9 +343,7 @@ const AQIMap = ({ selectedLocation }) => {
           </View>
         ) : (
           <WebView
-            key={`map-${visibleStations.length}-${
-              Object.keys(stationsData).length
-            }`}
+            key={`map-${mapData?.updated_at || "empty"}`}
             source={{ html: generateMapHTML() }}
             style={styles.webview}
             javaScriptEnabled={true}
@@ -585,15 +386,15 @@ const AQIMap = ({ selectedLocation }) => {
         <View style={styles.infoItem}>
           <Feather name="map-pin" size={16} color="#6b7280" />
           <Text style={styles.infoText}>
-            {visibleStations.length}{" "}
+            {mapData?.features.length || 0}{" "}
             {t("stationsVisible") || "stations visible"}
           </Text>
         </View>
-        {Object.keys(stationsData).length > 0 && (
+        {mapData && (
           <View style={styles.infoItem}>
             <Feather name="activity" size={16} color="#10b981" />
             <Text style={styles.infoText}>
-              {Object.values(stationsData).filter((data) => !data.error).length}{" "}
+              {mapData.stations_with_data}{" "}
               {t("withData") || "with data"}
             </Text>
           </View>
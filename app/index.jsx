@@ -9,7 +9,11 @@ import {
   StyleSheet,
 } from "react-native";
 import { SafeAreaView } from "react-native-safe-area-context";
-import { fetchAirQualityData, weatherDetails } from "./api/API";
+import {
+  fetchAirQualityData,
+  subscribeToForecast,
+  weatherDetails,
+} from "./api/API";
 import BarLoader from "./components/BarLoader";
 import ErrorPopup from "./components/ErrorPopup";
 import { useLanguage } from "./contexts/LanguageContext";
@@ -236,6 +240,18 @@ export default function Index() {
     initializeData();
   }, [city]);
 
+  // Hourly forecast changes are pushed by the server, so the screen stays current without refetching
+  useEffect(() => {
+    const unsubscribe = subscribeToForecast(city, (airData) => {
+      setAirQualityData(airData);
+      AsyncStorage.setItem(
+        getCacheKey(city, "airQuality"),
+        JSON.stringify(airData)
+      ).catch((err) => console.error("Error caching live update:", err));
+    });
+    return unsubscribe;
+  }, [city]);
+
   useEffect(() => {
     const initializeApp = async () => {
       const detectedCity = await getCurrentLocation();
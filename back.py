@@ -1,45 +1,380 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, stream_with_context
 import os
 import numpy as np
-import requests
+import aiohttp
+import asyncio
+import atexit
+import bisect
+import concurrent.futures
+import contextlib
+import contextvars
+import copy
+import difflib
+import functools
+import gzip
 from datetime import datetime, timedelta
 from flask_cors import CORS
-from tensorflow.keras.models import load_model
-import pandas as pd
+from aiohttp import web
 from zoneinfo import ZoneInfo
-from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, namedtuple
+import hashlib
+import itertools
+import json
+import logging
+import logging.handlers
+import math
+import queue
+import socket
+import sqlite3
+import sys
+import threading
 import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows: history store writes are only locked within the process
+    fcntl = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # the compact format is still available as JSON
+    msgpack = None
 
 IST = ZoneInfo("Asia/Kolkata")
+UTC = ZoneInfo("UTC")
+
+# Correlation ID of the request being handled, attached to every log record
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via extra= are included as keys"""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, IST).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    """Renders the message and traceback in the calling thread; the listener thread only formats and writes"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging():
+    """
+    Queue-based logging: request threads only enqueue records; one listener thread writes them to stdout.
+    LOG_LEVEL sets the level (INFO by default; DEBUG adds per-station and per-pollutant detail),
+    LOG_FORMAT=text switches from JSON lines to plain text for local development.
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get("LOG_FORMAT", "json") == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    log = logging.getLogger("aerovision")
+    log.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    log.addHandler(queue_handler)
+    log.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    def restart_listener():
+        # The listener thread doesn't survive a fork (gunicorn workers), so each child starts its own
+        listener._thread = None
+        listener.start()
+
+    os.register_at_fork(after_in_child=restart_listener)
+    return log
+
+logger = setup_logging()
 
 # Disable GPU for CPU inference
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
 app = Flask(__name__)
+
+# "forecast" serves /predict and loads the models; "proxy" serves /weather and the station endpoints
+# without ever importing TensorFlow; "all" (the default) does both in one process
+AEROVISION_ROLE = os.environ.get("AEROVISION_ROLE", "all")
+if AEROVISION_ROLE not in ("all", "forecast", "proxy"):
+    raise ValueError(f"AEROVISION_ROLE must be all, forecast or proxy, not {AEROVISION_ROLE!r}")
+SERVES_FORECASTS = AEROVISION_ROLE in ("all", "forecast")
+SERVES_PROXY = AEROVISION_ROLE in ("all", "proxy")
+
+def role_route(serves, rule, **options):
+    """app.route that only registers the view in processes whose role serves it"""
+    def decorator(fn):
+        return app.route(rule, **options)(fn) if serves else fn
+    return decorator
 # Allow all origins for React Native app compatibility
 # React Native doesn't send traditional browser origins
 CORS(app, 
      resources={r"/*": {
          "origins": "*",
          "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         "allow_headers": ["Content-Type", "Authorization", "Accept"],
-         "expose_headers": ["Content-Type"],
+         "allow_headers": ["Content-Type", "Authorization", "Accept", "If-None-Match"],
+         "expose_headers": ["Content-Type", "ETag", "Server-Timing", "X-Request-ID"],
          "supports_credentials": False
      }}
 )
 
 api_key = "701cf10ad3df9b6f5f58f40bfba7e837"
 
+# Upstream endpoints; overridable so benchmarks can point the backend at a local replay server
+OPENWEATHER_GEO_URL = os.environ.get("OPENWEATHER_GEO_URL", "http://api.openweathermap.org/geo/1.0/direct")
+ENVALERT_URL = os.environ.get("ENVALERT_URL", "https://erc.mp.gov.in/EnvAlert/Wa-CityAQI")
+OPEN_METEO_AQ_URL = os.environ.get("OPEN_METEO_AQ_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+OPEN_METEO_FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
 # Add after_request handler to ensure CORS headers
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept,If-None-Match')
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
     return response
 
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, labels)), value) for labels, value in self.values.items()]
+
+class Histogram:
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self.values.items()]
+        out = []
+        for labels, series in snapshot:
+            labels = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                out.append((f"{self.name}_bucket", {**labels, "le": repr(float(bound))}, cumulative))
+            out.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]))
+            out.append((f"{self.name}_sum", labels, series[-2]))
+            out.append((f"{self.name}_count", labels, series[-1]))
+        return out
+
+class Gauge:
+    """Value computed at scrape time; fn returns a number or {labels: number}"""
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [(self.name, dict(zip(self.labelnames, labels)), v) for labels, v in value.items()]
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format; each gunicorn worker keeps its own"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric, kind):
+        self._metrics.append((metric, kind))
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames), "counter")
+
+    def histogram(self, name, documentation, labelnames=(), buckets=Histogram.BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets), "histogram")
+
+    def gauge(self, name, documentation, fn, labelnames=()):
+        return self._register(Gauge(name, documentation, fn, labelnames), "gauge")
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+    def render(self):
+        lines = []
+        for metric, kind in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.counter("aerovision_http_requests_total", "HTTP requests by route and status", ("route", "status"))
+HTTP_SECONDS = metrics.histogram("aerovision_http_request_seconds", "HTTP request latency by route", ("route",))
+STAGE_SECONDS = metrics.histogram("aerovision_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+ERRORS = metrics.counter("aerovision_errors_total", "Errors by pipeline stage", ("stage",))
+UPSTREAM_SECONDS = metrics.histogram(
+    "aerovision_upstream_request_seconds", "Upstream HTTP call latency by host and outcome", ("host", "outcome")
+)
+UPSTREAM_RETRIES = metrics.counter("aerovision_upstream_retries_total", "Upstream calls retried, by host", ("host",))
+MODEL_SECONDS = metrics.histogram(
+    "aerovision_model_inference_seconds", "Seven-day rollout time per pollutant batch", ("pollutant",)
+)
+INFERENCE_BATCH_SIZE = metrics.histogram(
+    "aerovision_inference_batch_size", "Sequences per micro-batched rollout, by pollutant", ("pollutant",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+INFERENCE_QUEUE_SECONDS = metrics.histogram(
+    "aerovision_inference_queue_seconds", "Time a rollout waited in the micro-batching queue, by pollutant", ("pollutant",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+# Per-request (stage, seconds) list for the Server-Timing header; None when not collecting
+request_timings = contextvars.ContextVar("request_timings", default=None)
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+def count_error(stage):
+    ERRORS.inc(stage)
+
+@contextlib.contextmanager
+def span(stage):
+    """Time a block as a pipeline stage; exceptions escaping it are counted as that stage's errors"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def timed(stage):
+    """Decorator form of span() for plain functions and coroutines"""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(stage):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.timings_token = request_timings.set([] if SERVER_TIMING else None)
+    # Reuse the caller's correlation ID when a proxy already assigned one
+    g.request_id_token = request_id_var.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16])
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    # The URL rule, not the path, so /api/station/<id> stays one series
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUESTS.inc(route, str(response.status_code))
+    HTTP_SECONDS.observe(elapsed, route)
+    response.headers["X-Request-ID"] = request_id_var.get() or ""
+    timings = request_timings.get()
+    if timings is not None:
+        # One entry per stage; stages that ran several times (predict_pollutant) are summed
+        totals = {}
+        for stage, seconds in timings:
+            count, total = totals.get(stage, (0, 0.0))
+            totals[stage] = (count + 1, total + seconds)
+        parts = [
+            f'{stage};dur={total * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for stage, (count, total) in totals.items()
+        ]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+@app.teardown_request
+def reset_request_context(exc):
+    for var, name in ((request_timings, "timings_token"), (request_id_var, "request_id_token")):
+        token = g.pop(name, None)
+        if token is not None:
+            var.reset(token)
+
 TARGET_POLLUTANTS = ["pm2_5", "pm10", "no2", "so2", "o3", "co"]
 
 POLLUTANT_API_MAP = {
@@ -79,6 +414,54 @@ CITY_STATIONS = {
     "Ujjain": [2]
 }
 
+# EnvAlert station coordinates (station_id -> (lat, lon)), mirroring app/utils/stations.js
+STATION_COORDINATES = {
+    18: (23.138013, 81.699238),  # Anuppur, Collectorate
+    22: (21.908980, 77.902435),  # Betul, Collector Office
+    27: (23.210553, 77.425546),  # Bhopal, Paryavaran Parisar
+    34: (23.265097, 77.381434),  # Bhopal, Collectorate Office
+    10: (23.233956, 77.399889),  # Bhopal, T T Nagar
+    44: (22.6294539, 75.6800229),  # CTSDF, Pithampur
+    7: (23.838502, 79.441927),  # Damoh, Shrivastav Colony
+    23: (22.962205, 76.047959),  # Dewas, Govt. MG Hospital
+    3: (22.968264, 76.064121),  # Dewas, Bhopal Chauraha
+    16: (26.210423, 78.169320),  # Gwalior, Phool Bagh
+    29: (26.200049, 78.146671),  # Gwalior, Maharaj bada
+    30: (26.258327, 78.216799),  # Gwalior, DD Nagar
+    15: (26.202038, 78.198143),  # Gwalior, City Center
+    31: (22.76726, 75.88710),  # Indore, Vijay Nagar
+    36: (22.752431, 75.884514),  # Indore, Maguda Nagar
+    35: (22.726042, 75.804831),  # Indore, Airport Area
+    37: (22.677580, 75.855894),  # Indore, Regional Park N Nigam
+    40: (22.735083, 75.855700),  # Indore, Pologround
+    38: (22.703845, 75.886472),  # Indore, Residency Area
+    33: (22.680019, 75.859093),  # Indore, Regional Park
+    13: (22.719217, 75.869601),  # Indore, Chhoti Gwaltoli
+    41: (23.142932, 79.916147),  # Jabalpur, Gupteshwar
+    12: (23.165668, 79.932855),  # Jabalpur, Marhatal
+    42: (23.163252, 79.973050),  # Jabalpur, Govindh Bhavan Colony
+    43: (23.218184, 79.957770),  # Jabalpur, Suhagi
+    11: (23.834202, 80.390115),  # Katni, Gole Bazar
+    19: (23.806303, 80.372305),  # Katni, Regional Office
+    32: (21.821707, 76.352166),  # Khandwa, Lok Seva Kendra
+    25: (21.830452, 75.617630),  # Khargone, Nagar Palika
+    8: (24.261279, 80.723177),  # Maihar, Sharda Temple
+    5: (23.108440, 77.511428),  # Mandideep, Sector New Industrial Area
+    26: (22.943514, 79.188508),  # Narsinghpur, District Education Office
+    17: (24.460708, 74.875915),  # Neemuch, Civil Hospital
+    39: (24.735896, 80.194095),  # Panna, Collectorate
+    1: (22.624758, 75.675238),  # Pithampur, Sector-2 Industrial Area
+    9: (23.334094, 75.037136),  # Ratlam, Shathri Nagar
+    20: (24.54663, 81.32058),  # Rewa, Regional Office
+    21: (24.53869, 81.28911),  # Rewa, Collector Office
+    28: (23.838807, 78.758577),  # Sagar, Collectorate Office
+    14: (23.864633, 78.897981),  # Sagar, Deen Dayal Nagar
+    6: (24.602160, 80.832589),  # Satna, Bandhavgar Colony
+    4: (24.108970, 82.64580),  # Singrauli, Surya Kiran Bhawan Dudhichua
+    24: (24.071713, 82.618340),  # Singrauli, Trauma Centre Waidhan
+    2: (23.18270, 75.76819),  # Ujjain, Mahakaleshwar Temple
+}
+
 # EnvAlert API pollutant mapping to API response keys
 ENVALERT_POLLUTANT_MAP = {
     "pm2_5": ("pm25", "pm25_subindex"),
@@ -104,6 +487,10 @@ AQI_BREAKPOINTS = {
     'so2': [(0, 40, 0, 50), (41, 80, 51, 100), (81, 380, 101, 200), (381, 800, 201, 300), (801, 1600, 301, 400), (1601, np.inf, 401, 500)]
 }
 
+# Model input: one pad value, 72 hourly pollutant readings and 9 weather features
+SEQUENCE_LENGTH = 82
+FORECAST_DAYS = 7
+
 AQI_CATEGORIES = {
     (0, 50): 'Good',
     (51, 100): 'Satisfactory',
@@ -113,216 +500,1543 @@ AQI_CATEGORIES = {
     (401, 500): 'Severe'
 }
 
+AQI_CATEGORY_COLORS = {
+    'Good': 'green',
+    'Satisfactory': 'yellow',
+    'Moderately Polluted': 'orange',
+    'Poor': 'red',
+    'Very Poor': 'purple',
+    'Severe': 'maroon'
+}
+
+def _compile_aqi_table(breakpoints):
+    """Breakpoints as (B_low, B_high, I_low, I_high, slope) columns, ready for np.searchsorted"""
+    table = np.array(breakpoints, dtype=np.float64)
+    slope = (table[:, 3] - table[:, 2]) / (table[:, 1] - table[:, 0])
+    return np.column_stack([table, slope])
+
+AQI_TABLES = {p: _compile_aqi_table(bp) for p, bp in AQI_BREAKPOINTS.items()}
+
+# Category lookup tables; the extra last code is "Out of Range"
+AQI_CATEGORY_BOUNDS = np.array(list(AQI_CATEGORIES.keys()), dtype=np.float64)
+OUT_OF_RANGE = len(AQI_CATEGORIES)
+CATEGORY_NAMES = np.array(list(AQI_CATEGORIES.values()) + ["Out of Range"], dtype=object)
+CATEGORY_WARNINGS = np.array([f"{cat} air quality." for cat in AQI_CATEGORIES.values()] + ["AQI beyond measurable limits."], dtype=object)
+CATEGORY_COLORS = np.array([AQI_CATEGORY_COLORS[cat] for cat in AQI_CATEGORIES.values()] + ["gray"], dtype=object)
+
+def aqi_sub_index_array(C, pollutant):
+    """
+    Sub-index for an array of concentrations of one pollutant.
+    Values outside every breakpoint range (including the gaps between ranges) are NaN.
+    """
+    C = np.asarray(C, dtype=np.float64)
+    table = AQI_TABLES[pollutant]
+    segment = np.searchsorted(table[:, 0], C, side='right') - 1
+    row = table[np.clip(segment, 0, len(table) - 1)]
+    valid = (segment >= 0) & (C <= row[..., 1])
+    with np.errstate(invalid='ignore'):
+        sub_index = np.minimum(np.round(row[..., 4] * (C - row[..., 0]) + row[..., 2]), 500)
+    return np.where(valid, sub_index, np.nan)
+
+def aqi_sub_indices(values, pollutants=TARGET_POLLUTANTS):
+    """Sub-indices for an array whose first axis follows pollutants, e.g. (pollutant, day, city)"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty_like(values)
+    for i, pollutant in enumerate(pollutants):
+        result[i] = aqi_sub_index_array(values[i], pollutant)
+    return result
+
+def aqi_category_codes(aqi):
+    """Index into CATEGORY_NAMES/WARNINGS/COLORS for each AQI value; OUT_OF_RANGE when no band matches"""
+    aqi = np.asarray(aqi, dtype=np.float64)
+    segment = np.searchsorted(AQI_CATEGORY_BOUNDS[:, 0], aqi, side='right') - 1
+    clipped = np.clip(segment, 0, OUT_OF_RANGE - 1)
+    valid = (segment >= 0) & (aqi <= AQI_CATEGORY_BOUNDS[clipped, 1])
+    return np.where(valid, clipped, OUT_OF_RANGE)
+
+def aqi_category_info(aqi):
+    """(categories, warnings, colors) arrays for an array of AQI values"""
+    codes = aqi_category_codes(aqi)
+    return CATEGORY_NAMES[codes], CATEGORY_WARNINGS[codes], CATEGORY_COLORS[codes]
+
+def is_missing(value):
+    """None or NaN, for scalars coming from JSON or NumPy"""
+    try:
+        return value is None or math.isnan(value)
+    except TypeError:
+        return False
+
 def get_aqi_sub_index(C, pollutant):
-    if pd.isna(C): return np.nan
-    breakpoints = AQI_BREAKPOINTS.get(pollutant)
-    for B_low, B_high, I_low, I_high in breakpoints:
-        if B_low <= C <= B_high:
-            sub_index = ((I_high - I_low) / (B_high - B_low)) * (C - B_low) + I_low
-            return min(round(sub_index), 500)
-    return np.nan
+    if is_missing(C): return np.nan
+    sub_index = float(aqi_sub_index_array(C, pollutant))
+    return np.nan if np.isnan(sub_index) else int(sub_index)
 
 def get_category_info(aqi):
-    for (low, high), cat in AQI_CATEGORIES.items():
-        if low <= aqi <= high:
-            color_map = {
-                'Good': 'green',
-                'Satisfactory': 'yellow',
-                'Moderately Polluted': 'orange',
-                'Poor': 'red',
-                'Very Poor': 'purple',
-                'Severe': 'maroon'
-            }
-            return cat, f"{cat} air quality.", color_map.get(cat, "gray")
-    return "Out of Range", "AQI beyond measurable limits.", "gray"
+    code = int(aqi_category_codes(aqi))
+    return CATEGORY_NAMES[code], CATEGORY_WARNINGS[code], CATEGORY_COLORS[code]
+
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.dirname(os.path.abspath(__file__)))
+# "keras" runs best_cnn_{pollutant}.keras on full TensorFlow,
+# "tflite" runs best_cnn_{pollutant}.tflite (see convert_models.py) on the TFLite interpreter
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "keras")
+
+class KerasModel:
+    """Keras model behind a compiled forward pass, avoiding model.predict per-call overhead"""
+
+    extension = "keras"
+    shareable = False
+
+    def __init__(self, path):
+        import tensorflow as tf
+        self._tf = tf
+        self.model = tf.keras.models.load_model(path)
+        self._forward = tf.function(
+            self.model, input_signature=[tf.TensorSpec([None, SEQUENCE_LENGTH, 1], tf.float32)]
+        )
+
+    def __call__(self, batch):
+        return self._forward(self._tf.constant(batch, dtype=self._tf.float32)).numpy()
+
+def _tflite_interpreter_class():
+    """Prefer the standalone TFLite runtime, falling back to the interpreter bundled with TensorFlow"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+class TFLiteModel:
+    """Converted model on the TFLite interpreter: faster start-up and far less memory than TensorFlow"""
+
+    extension = "tflite"
+    # Can be built from model bytes read before the server forks (see ModelRegistry.load_shared)
+    shareable = True
+
+    def __init__(self, path, content=None):
+        interpreter_class = _tflite_interpreter_class()
+        if content is not None:
+            self.interpreter = interpreter_class(model_content=content, num_threads=os.cpu_count())
+        else:
+            self.interpreter = interpreter_class(model_path=path, num_threads=os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self._input_index = self.interpreter.get_input_details()[0]["index"]
+        self._output_index = self.interpreter.get_output_details()[0]["index"]
+        self._batch_size = 1
+        # Interpreters hold mutable tensor buffers and are not thread-safe
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output_index).copy()
+
+MODEL_BACKENDS = {"keras": KerasModel, "tflite": TFLiteModel}
+
+class ModelRegistry:
+    """Thread-safe registry of the per-pollutant forecast models"""
+
+    def __init__(self, model_dir=MODEL_DIR, backend=MODEL_BACKEND):
+        self.model_dir = model_dir
+        self.model_class = MODEL_BACKENDS[backend]
+        self.warm = False
+        self._models = {}
+        self._shared = {}
+        self._lock = threading.Lock()
+
+    def get(self, pollutant):
+        """Return the model for a pollutant, loading it once; None if it cannot be loaded"""
+        if pollutant in self._models:
+            return self._models[pollutant]
+        with self._lock:
+            if pollutant not in self._models:
+                path = self._path(pollutant)
+                try:
+                    with span("model_load"):
+                        if pollutant in self._shared:
+                            self._models[pollutant] = self.model_class(path, content=self._shared[pollutant])
+                        else:
+                            self._models[pollutant] = self.model_class(path)
+                    logger.info("Loaded model for %s", pollutant)
+                except Exception as e:
+                    logger.error("Model load error for %s: %s", pollutant, e)
+                    self._models[pollutant] = None
+        return self._models[pollutant]
+
+    def _path(self, pollutant):
+        return os.path.join(self.model_dir, f"best_cnn_{pollutant}.{self.model_class.extension}")
+
+    def load_shared(self):
+        """
+        Read the model files in the server's master process so preforked workers share them copy-on-write.
+        Only TFLite models support this: interpreters (and TensorFlow's thread pools) must be created after
+        the fork, so each worker builds its own interpreter over the shared bytes.
+        """
+        if not self.model_class.shareable:
+            logger.info("Keras models are loaded per worker; use MODEL_BACKEND=tflite to share them")
+            return
+        shared = {}
+        for pollutant in TARGET_POLLUTANTS:
+            try:
+                with open(self._path(pollutant), "rb") as f:
+                    shared[pollutant] = f.read()
+            except OSError as e:
+                logger.error("Model read error for %s: %s", pollutant, e)
+        self._shared = shared
+        logger.info("Read %d models (%.0f KiB) for the workers", len(shared), sum(map(len, shared.values())) / 1024)
+
+    def preload(self):
+        """Load every model and run one dummy forward pass so the first request pays no load or tracing cost"""
+        start = time.time()
+        dummy = np.zeros((1, SEQUENCE_LENGTH, 1), dtype=np.float32)
+        for pollutant in TARGET_POLLUTANTS:
+            model = self.get(pollutant)
+            if model is not None:
+                model(dummy)
+        self.warm = True
+        logger.info("Models warmed up in %.1fs", time.time() - start)
+
+    def status(self):
+        return {p: self._models.get(p) is not None for p in TARGET_POLLUTANTS}
+
+    def preload_in_background(self):
+        """Warm up on a daemon thread so the server can answer health checks meanwhile"""
+        threading.Thread(target=self.preload, name="model-warmup", daemon=True).start()
 
-# Lazy load models on demand
-models = {}
-models_loaded = {}
+model_registry = ModelRegistry()
 
 def get_model(pollutant):
-    """Lazy load model when needed"""
-    if pollutant not in models_loaded:
+    """Model for a pollutant from the shared registry"""
+    return model_registry.get(pollutant)
+
+def build_input_sequence(data, weather_data):
+    """
+    Build the (82, 1) model input from the last 72 hours of pollutant data and the latest weather row.
+    Raises ValueError when an hour is missing (null upstream, or NaN from the history store), so the
+    pollutant is skipped rather than forecast as NaN.
+    """
+    weather_features = weather_data[-1][:9] if len(weather_data) else [0] * 9
+    seq = np.concatenate((
+        [0.0], np.asarray(data[-72:], dtype=np.float32), np.asarray(weather_features, dtype=np.float32)
+    ))
+    if not np.isfinite(seq).all():
+        raise ValueError(f"{int(np.count_nonzero(~np.isfinite(seq)))} missing values in the model input")
+    return seq.astype(np.float32).reshape((SEQUENCE_LENGTH, 1))
+
+def rollout_forecast(pollutant, sequences, steps=FORECAST_DAYS):
+    """
+    Run the autoregressive daily rollout for a batch of input sequences.
+    sequences has shape (N, 82, 1); returns an (N, steps) array of predictions, or None without a model.
+    """
+    model = get_model(pollutant)
+    if model is None:
+        return None
+
+    start = time.perf_counter()
+    batch = np.array(sequences, dtype=np.float32)
+    preds = np.empty((batch.shape[0], steps), dtype=np.float64)
+    for step in range(steps):
+        step_preds = np.abs(model(batch)[:, 0])
+        preds[:, step] = step_preds
+
+        # Feed the prediction back in, exactly like the single-sequence loop did
+        batch[:, -1, 0] = step_preds
+        batch = np.roll(batch, -1, axis=1)
+    MODEL_SECONDS.observe(time.perf_counter() - start, pollutant)
+    return preds
+
+class InferenceBatcher:
+    """
+    Merges rollouts that concurrent requests queue for the same pollutant into one rollout_forecast call.
+    A batch is flushed once max_batch sequences are waiting or its oldest one has waited max_wait seconds,
+    and the prediction rows are handed back to each caller. One worker thread per pollutant makes all of
+    that model's calls. max_wait <= 0 turns batching off and runs every rollout on the caller's thread.
+    """
+
+    def __init__(self, max_batch=32, max_wait=0.005):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queues = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _queue(self, pollutant):
+        # Worker threads don't survive a fork, so a forked worker starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queues = {}
+                self._pid = os.getpid()
+            pending = self._queues.get(pollutant)
+            if pending is None:
+                pending = self._queues[pollutant] = queue.SimpleQueue()
+                threading.Thread(
+                    target=self._serve, args=(pollutant, pending), name=f"inference-{pollutant}", daemon=True
+                ).start()
+            return pending
+
+    def submit(self, pollutant, sequences):
+        """Queue (N, 82, 1) sequences; returns a Future of their (N, steps) predictions, or of None without a model"""
+        future = concurrent.futures.Future()
+        sequences = np.asarray(sequences, dtype=np.float32)
+        if self.max_wait <= 0:
+            try:
+                future.set_result(rollout_forecast(pollutant, sequences))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._queue(pollutant).put((sequences, time.perf_counter(), future))
+        return future
+
+    def _serve(self, pollutant, pending):
+        carried = None
+        while True:
+            first = carried or pending.get()
+            carried = None
+            batch, size = [first], len(first[0])
+            deadline = first[1] + self.max_wait
+            while size < self.max_batch:
+                try:
+                    item = pending.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if size + len(item[0]) > self.max_batch:
+                    # Starts the next batch rather than overfilling this one
+                    carried = item
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._flush(pollutant, batch, size)
+
+    def _flush(self, pollutant, batch, size):
+        start = time.perf_counter()
+        for _, enqueued, _ in batch:
+            INFERENCE_QUEUE_SECONDS.observe(start - enqueued, pollutant)
+        INFERENCE_BATCH_SIZE.observe(size, pollutant)
+        try:
+            preds = rollout_forecast(pollutant, np.concatenate([sequences for sequences, _, _ in batch]))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for sequences, _, future in batch:
+            future.set_result(None if preds is None else preds[offset:offset + len(sequences)])
+            offset += len(sequences)
+
+inference_batcher = InferenceBatcher(
+    max_batch=int(os.environ.get("INFERENCE_BATCH_SIZE", 32)),
+    max_wait=float(os.environ.get("INFERENCE_BATCH_WAIT_MS", 5)) / 1000
+)
+
+@timed("inference")
+def batched_forecast_rollouts(inputs_list):
+    """
+    Run the 7-day rollouts for many forecasts at once: one batched rollout per pollutant, shared with
+    other requests' rollouts through the inference batcher. All pollutants are queued before waiting.
+    Each input needs "pollutant_series" ({pollutant: (data, timestamps)}) and "weather_data";
+    returns one {pollutant: predictions} dict per input.
+    """
+    rollouts = [{} for _ in inputs_list]
+    submitted = []
+    for pollutant in TARGET_POLLUTANTS:
+        members, sequences = [], []
+        for i, inputs in enumerate(inputs_list):
+            data = inputs["pollutant_series"].get(pollutant, ([], []))[0]
+            if len(data) < 72:
+                continue
+            try:
+                sequences.append(build_input_sequence(data, inputs["weather_data"]))
+                members.append(i)
+            except (TypeError, ValueError) as e:
+                logger.warning("Invalid model input for %s: %s", pollutant, e)
+        if members:
+            submitted.append((pollutant, members, inference_batcher.submit(pollutant, sequences)))
+
+    for pollutant, members, future in submitted:
+        try:
+            preds = future.result()
+        except Exception:
+            logger.exception("Rollout error for %s", pollutant)
+            continue
+        if preds is not None:
+            for i, row in zip(members, preds):
+                rollouts[i][pollutant] = row
+    return rollouts
+
+def forecast_rollouts(pollutant_series, weather_data):
+    """
+    Run one full 7-day rollout per pollutant.
+    The same rollout serves both the today (start_day=0) and tomorrow-onwards (start_day=1) views.
+    """
+    return batched_forecast_rollouts([{"pollutant_series": pollutant_series, "weather_data": weather_data}])[0]
+
+def current_hour_bucket():
+    """Start of the current IST hour as an epoch timestamp"""
+    return int(datetime.now(IST).replace(minute=0, second=0, microsecond=0).timestamp())
+
+class SQLiteCacheBackend:
+    """
+    Cache entries in a SQLite file so every gunicorn worker on the host shares them.
+    Expired rows are purged every purge_every writes (per process) rather than on each one,
+    since the purge holds the write lock all workers share.
+    """
+
+    def __init__(self, path, purge_every=256):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS upstream_cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS upstream_cache_expires_at ON upstream_cache (expires_at)")
+        self.purge()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, nor inherited across a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, now):
+        row = self._connect().execute(
+            "SELECT expires_at, value FROM upstream_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, key, value, expires_at):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO upstream_cache (key, expires_at, value) VALUES (?, ?, ?)",
+            (key, expires_at, json.dumps(value))
+        )
+        if next(self._writes) % self.purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        self._connect().execute("DELETE FROM upstream_cache WHERE expires_at <= ?", (time.time(),))
+
+class _Flight:
+    """One in-progress upstream load that concurrent callers wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class UpstreamCache:
+    """
+    In-process LRU cache for upstream API payloads, optionally backed by SQLite.
+    Entries are keyed on (source, lat, lon, field, hour bucket) and expire at the next IST hour.
+    Concurrent misses for the same key are coalesced into a single upstream call.
+    """
+
+    def __init__(self, max_entries=1024, db_path=None):
+        self.max_entries = max_entries
+        self.backend = SQLiteCacheBackend(db_path) if db_path else None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def time_bucket(ttl=None):
+        """(bucket start, expiry) for the current IST hour, or for the current ttl-second slot"""
+        if ttl is None:
+            bucket = current_hour_bucket()
+            return bucket, bucket + 3600
+        bucket = int(time.time() // ttl * ttl)
+        return bucket, bucket + ttl
+
+    @staticmethod
+    def make_key(source, lat, lon, field, bucket):
+        lat = round(lat, 4) if lat is not None else None
+        lon = round(lon, 4) if lon is not None else None
+        return f"{source}|{lat}|{lon}|{field}|{bucket}"
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    async def _aget_backend(self, key):
+        # SQLite blocks (on disk and on other workers' write locks), so it stays off the event loop
+        try:
+            entry = await asyncio.to_thread(self.backend.get, key, time.time())
+        except sqlite3.Error as e:
+            logger.warning("Upstream cache read error: %s", e)
+            return None
+        if entry is None:
+            return None
+        self._store(key, entry[1], entry[0])
+        with self._lock:
+            self.hits += 1
+        return entry[1]
+
+    def _store(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_load(self, source, lat, lon, field, loader, ttl=None):
+        """
+        Return the cached payload for this key, awaiting loader() on a miss.
+        Runs on the upstream client's event loop, so concurrent misses simply await the same future;
+        SQLite reads and writes run in worker threads.
+        loader should raise or return None on failure; failures are never cached.
+        Entries expire at the next IST hour, or at the end of the current ttl-second slot when ttl is given.
+        """
+        bucket, expires_at = self.time_bucket(ttl)
+        key = self.make_key(source, lat, lon, field, bucket)
+        value = self._get(key)
+        if value is None and self.backend:
+            value = await self._aget_backend(key)
+        if value is not None:
+            return value
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        flight = self._inflight[key] = asyncio.get_running_loop().create_future()
+        self.misses += 1
+        try:
+            value = await loader()
+            if value is not None:
+                self._store(key, value, expires_at)
+                if self.backend:
+                    try:
+                        await asyncio.to_thread(self.backend.set, key, value, expires_at)
+                    except sqlite3.Error as e:
+                        logger.warning("Upstream cache write error: %s", e)
+            flight.set_result(value)
+            return value
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            if not flight.done():
+                flight.cancel()
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+                "shared_backend": self.backend.path if self.backend else None
+            }
+
+# Set UPSTREAM_CACHE_DB to a file path to share cached upstream data across workers
+upstream_cache = UpstreamCache(
+    max_entries=int(os.environ.get("UPSTREAM_CACHE_SIZE", 1024)),
+    db_path=os.environ.get("UPSTREAM_CACHE_DB")
+)
+
+class RetryableStatus(Exception):
+    """Upstream answered with a status worth retrying (429 or 5xx)"""
+
+    def __init__(self, status):
+        super().__init__(f"upstream returned {status}")
+        self.status = status
+
+class UpstreamClient:
+    """
+    Async HTTP client for every upstream API, running on one dedicated event-loop thread.
+    Connections are pooled and kept alive per host, each host has its own concurrency limit,
+    and failed calls are retried with exponential backoff.
+    """
+
+    HOST_LIMITS = {
+        "erc.mp.gov.in": 8,
+        "api.openweathermap.org": 8
+    }
+    DEFAULT_HOST_LIMIT = 16
+
+    def __init__(self, retries=2, backoff=0.25):
+        self.retries = retries
+        self.backoff = backoff
+        self.loop = None
+        self._pid = None
+        self._session = None
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        # Also restarts the loop in a forked worker, where the parent's thread no longer exists
+        with self._lock:
+            if self.loop is None or self._pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                self._session = None
+                self._semaphores = {}
+                threading.Thread(target=self.loop.run_forever, name="upstream-io", daemon=True).start()
+        return self.loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the I/O loop from synchronous code; returns a concurrent.futures.Future"""
+        request_id = request_id_var.get()
+        if request_id is not None:
+            coro = self._in_request_context(coro, request_id, request_timings.get())
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout=30):
+        """Run a coroutine on the I/O loop from synchronous code and wait for its result"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    @staticmethod
+    async def _in_request_context(coro, request_id, timings):
+        # Tasks start from the loop thread's context, so carry the request's log ID and timings over
+        request_id_var.set(request_id)
+        request_timings.set(timings)
+        return await coro
+
+    def close(self):
+        """Close pooled connections; registered to run at interpreter exit"""
+        if self._session is not None and self._pid == os.getpid():
+            try:
+                self.run(self._session.close(), timeout=5)
+            except Exception:
+                pass
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _semaphore(self, host):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.HOST_LIMITS.get(host, self.DEFAULT_HOST_LIMIT))
+        return semaphore
+
+    async def fetch_json(self, method, url, timeout=10):
+        """Fetch an upstream URL and decode its JSON body, raising aiohttp.ClientResponseError on 4xx"""
+        host = urlsplit(url).hostname
+        for attempt in range(self.retries + 1):
+            outcome = "error"
+            try:
+                async with self._semaphore(host):
+                    start = time.perf_counter()
+                    try:
+                        async with self._get_session().request(
+                            method, url, timeout=aiohttp.ClientTimeout(total=timeout)
+                        ) as response:
+                            outcome = str(response.status)
+                            if response.status == 429 or response.status >= 500:
+                                raise RetryableStatus(response.status)
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                    except asyncio.TimeoutError:
+                        outcome = "timeout"
+                        raise
+                    finally:
+                        # Measured inside the semaphore: time on the wire, not time queued for a slot
+                        UPSTREAM_SECONDS.observe(time.perf_counter() - start, host, outcome)
+            except (RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                UPSTREAM_RETRIES.inc(host)
+                delay = self.backoff * (2 ** attempt)
+                logger.warning("Retrying %s in %.2fs after: %r", host, delay, e)
+                await asyncio.sleep(delay)
+
+upstream_client = UpstreamClient()
+atexit.register(upstream_client.close)
+
+def normalize_city(city_name):
+    """Case- and whitespace-insensitive form of a city name"""
+    return " ".join(str(city_name or "").split()).lower()
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+class StationGrid:
+    """
+    Uniform grid over station coordinates for nearest-station queries.
+    Longitudes are scaled by cos(reference latitude) so grid distances approximate ground distances.
+    """
+
+    def __init__(self, coordinates, cell_deg=0.5, ref_lat=23.5):
+        self.cell = cell_deg
+        self.scale = math.cos(math.radians(ref_lat))
+        self.points = dict(coordinates)
+        self.cells = {}
+        for station_id, (lat, lon) in self.points.items():
+            self.cells.setdefault(self._cell(lat, lon), []).append(station_id)
+        rows = [c[0] for c in self.cells] or [0]
+        cols = [c[1] for c in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon * self.scale / self.cell))
+
+    def _dist(self, lat, lon, station_id):
+        s_lat, s_lon = self.points[station_id]
+        return math.hypot(lat - s_lat, (lon - s_lon) * self.scale)
+
+    def nearest(self, lat, lon):
+        """Closest station id to (lat, lon), searching outwards ring by ring; None for an empty grid"""
+        if not self.points:
+            return None
+        row, col = self._cell(lat, lon)
+        r_min, r_max, c_min, c_max = self.bounds
+        max_ring = max(abs(row - r_min), abs(row - r_max), abs(col - c_min), abs(col - c_max))
+        best, best_dist = None, math.inf
+        for ring in range(max_ring + 1):
+            # Points outside the rings searched so far are at least (ring - 1) * cell away
+            if best is not None and best_dist <= (ring - 1) * self.cell:
+                break
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    for station_id in self.cells.get((r, c), ()):
+                        d = self._dist(lat, lon, station_id)
+                        if d < best_dist:
+                            best, best_dist = station_id, d
+        return best
+
+class GeocodingIndex:
+    """
+    Offline city geocoding. Ships coordinates for every CITY_STATIONS city (centroid of its stations)
+    and keeps names resolved online in a JSON file, so restarts and deploys don't re-geocode.
+    Lookups are normalized and fall back to a unique prefix; a close spelling of a known name is only
+    accepted once the geocoder has failed. Failures are only remembered for a short while.
+    """
+
+    def __init__(self, cache_path, failure_ttl=600):
+        self.cache_path = cache_path
+        self.failure_ttl = failure_ttl
+        self._coords = {}
+        self._names = []
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._station_city = {}
+        for city, station_ids in CITY_STATIONS.items():
+            points = [STATION_COORDINATES[sid] for sid in station_ids if sid in STATION_COORDINATES]
+            for sid in station_ids:
+                self._station_city[sid] = city
+            if points:
+                lats, lons = zip(*points)
+                self._coords[normalize_city(city)] = (round(sum(lats) / len(lats), 6), round(sum(lons) / len(lons), 6))
+        self.grid = StationGrid(STATION_COORDINATES)
+        self._load()
+        self._names = sorted(self._coords)
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                for name, (lat, lon) in json.load(f).items():
+                    # Shipped coordinates win over anything cached
+                    self._coords.setdefault(normalize_city(name), (lat, lon))
+        except Exception as e:
+            logger.warning("Ignoring unreadable geocode cache %s: %s", self.cache_path, e)
+
+    def _persist(self, key, coords):
+        """Merge one entry into the cache file; atomic replace so concurrent workers never see a partial file"""
+        if not self.cache_path:
+            return
+        try:
+            entries = {}
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path) as f:
+                    entries = json.load(f)
+            entries[key] = list(coords)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning("Could not write geocode cache %s: %s", self.cache_path, e)
+
+    def lookup(self, city_name, close_match=False):
+        """
+        (lat, lon) for a known name or unique prefix, or None when the network has to be asked.
+        close_match=True also accepts a near spelling (typo correction); a real town spelled like a
+        mapped city ("Sagara" for Sagar) must be geocoded first, or it gets that city's forecast.
+        """
+        key = normalize_city(city_name)
+        if not key:
+            return None
+        coords = self._coords.get(key)
+        if coords:
+            return coords
+        # "Bhopal, Madhya Pradesh" -> "bhopal"
+        head = key.split(",")[0].strip()
+        if head in self._coords:
+            return self._coords[head]
+        if len(head) >= 3:
+            names = self._names
+            i = bisect.bisect_left(names, head)
+            matches = []
+            while i < len(names) and names[i].startswith(head) and len(matches) < 2:
+                matches.append(names[i])
+                i += 1
+            if len(matches) == 1:
+                return self._coords[matches[0]]
+            if close_match:
+                close = difflib.get_close_matches(head, names, n=1, cutoff=0.85)
+                if close:
+                    logger.info("Using %r for unresolved city %r", close[0], city_name)
+                    return self._coords[close[0]]
+        return None
+
+    def remember(self, city_name, coords):
+        key = normalize_city(city_name)
+        with self._lock:
+            self._failures.pop(key, None)
+            if key in self._coords:
+                return
+            self._coords[key] = coords
+            self._names = sorted(self._coords)
+            self._persist(key, coords)
+
+    def remember_failure(self, city_name):
+        with self._lock:
+            self._failures[normalize_city(city_name)] = time.time() + self.failure_ttl
+
+    def failed_recently(self, city_name):
+        return self._failures.get(normalize_city(city_name), 0) > time.time()
+
+    def nearest_mapped_city(self, lat, lon):
+        """Mapped city of the station closest to (lat, lon): {"city", "station_id", "distance_km"} or None"""
+        station_id = self.grid.nearest(lat, lon)
+        if station_id is None:
+            return None
+        s_lat, s_lon = STATION_COORDINATES[station_id]
+        return {
+            "city": self._station_city.get(station_id),
+            "station_id": station_id,
+            "distance_km": round(haversine_km(lat, lon, s_lat, s_lon), 2),
+        }
+
+geocoding_index = GeocodingIndex(
+    os.environ.get("GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.json"))
+)
+
+@timed("geocode")
+async def aget_city_coordinates(city_name):
+    coords = geocoding_index.lookup(city_name)
+    if coords:
+        return coords
+    if not geocoding_index.failed_recently(city_name):
         try:
-            path = os.path.join(os.path.dirname(__file__), f"best_cnn_{pollutant}.keras")
-            models[pollutant] = load_model(path)
-            models_loaded[pollutant] = True
-            print(f"✅ Loaded model for {pollutant}", flush=True)
+            url = f"{OPENWEATHER_GEO_URL}?q={quote(str(city_name))}&limit=1&appid={api_key}"
+            data = await upstream_client.fetch_json("GET", url, timeout=5)
+            if data and isinstance(data, list):
+                item = data[0]
+                lat = item.get('lat')
+                lon = item.get('lon')
+                if lat is not None and lon is not None:
+                    geocoding_index.remember(city_name, (lat, lon))
+                    return lat, lon
         except Exception as e:
-            print(f"Model load error for {pollutant}: {e}", flush=True)
-            models[pollutant] = None
-            models_loaded[pollutant] = False
-    return models.get(pollutant)
+            logger.warning("Geocoding failed for %r: %s", city_name, e)
+            count_error("geocode")
+        geocoding_index.remember_failure(city_name)
+    # Only a name the geocoder doesn't know is treated as a misspelling of a known one
+    return geocoding_index.lookup(city_name, close_match=True) or (None, None)
 
-# Cache for geocoding results (city -> coordinates)
-@lru_cache(maxsize=100)
 def get_city_coordinates(city_name):
-    try:
-        url = f"http://api.openweathermap.org/geo/1.0/direct?q={city_name}&limit=1&appid={api_key}"
-        res = requests.get(url, timeout=5)
-        data = res.json()
-        if data and isinstance(data, list):
-            item = data[0]
-            lat = item.get('lat')
-            lon = item.get('lon')
-            if lat is not None and lon is not None:
-                return lat, lon
-    except Exception as e:
-        print("Error in get_city_coordinates:", e, flush=True)
-    return None, None
+    return upstream_client.run(aget_city_coordinates(city_name))
 
-def fetch_envalert_current_aqi(station_id):
+async def afetch_envalert_current_aqi(station_id):
     """Fetch current AQI data for a specific station"""
     try:
-        url = f"https://erc.mp.gov.in/EnvAlert/Wa-CityAQI?id={station_id}"
-        response = requests.post(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            # API returns a list with one station object
-            if isinstance(data, list) and len(data) > 0:
-                return data[0]
-            return data
-        else:
-            print(f"EnvAlert AQI API failed for station {station_id} with status {response.status_code}", flush=True)
-            return None
+        url = f"{ENVALERT_URL}?id={station_id}"
+        data = await upstream_cache.get_or_load(
+            "envalert", None, None, station_id, lambda: upstream_client.fetch_json("POST", url)
+        )
+        # API returns a list with one station object
+        if isinstance(data, list) and len(data) > 0:
+            return data[0]
+        return data
+    except aiohttp.ClientResponseError as e:
+        logger.warning("EnvAlert AQI API failed for station %s with status %s", station_id, e.status)
+        return None
     except Exception as e:
-        print(f"Error fetching EnvAlert AQI for station {station_id}: {e}", flush=True)
+        logger.warning("Error fetching EnvAlert AQI for station %s: %s", station_id, e)
+        count_error("envalert")
         return None
 
-def get_today_data_from_envalert(city_name):
+def fetch_envalert_current_aqi(station_id):
+    return upstream_client.run(afetch_envalert_current_aqi(station_id))
+
+def _parse_envalert_number(raw):
+    if raw is None or raw == '' or raw == 'null':
+        return np.nan
+    try:
+        return float(raw)
+    except (ValueError, TypeError):
+        return np.nan
+
+def parse_envalert_station(station_data):
+    """Concentrations and sub-indices of one EnvAlert station in TARGET_POLLUTANTS order, NaN where missing"""
+    values, sub_indices = [], []
+    for pollutant in TARGET_POLLUTANTS:
+        value_key, aqi_key = ENVALERT_POLLUTANT_MAP[pollutant]
+        values.append(_parse_envalert_number(station_data.get(value_key)))
+        sub_indices.append(_parse_envalert_number(station_data.get(aqi_key)))
+    return values, sub_indices
+
+def station_aqi(station_data):
+    """Overall AQI of one EnvAlert station: the reported aqi, else its highest sub-index, NaN when neither exists"""
+    aqi = _parse_envalert_number(station_data.get("aqi"))
+    if np.isnan(aqi):
+        sub_indices = np.array(parse_envalert_station(station_data)[1])
+        if not np.isnan(sub_indices).all():
+            aqi = float(np.nanmax(sub_indices))
+    return aqi
+
+def average_station_readings(city_name, values, sub_indices):
+    """
+    City averages from (station x pollutant) arrays of concentrations and sub-indices.
+    A pollutant is reported when at least one station has its value and one has its sub-index.
+    """
+    value_counts = np.count_nonzero(~np.isnan(values), axis=0)
+    aqi_counts = np.count_nonzero(~np.isnan(sub_indices), axis=0)
+    value_sums = np.nansum(values, axis=0)
+    aqi_sums = np.nansum(sub_indices, axis=0)
+
+    result = {}
+    for i, pollutant in enumerate(TARGET_POLLUTANTS):
+        if value_counts[i] and aqi_counts[i]:
+            avg_value = float(value_sums[i] / value_counts[i])
+            avg_aqi = float(aqi_sums[i] / aqi_counts[i])
+            result[pollutant] = {
+                'value': avg_value,
+                'aqi': round(avg_aqi)
+            }
+            logger.debug("EnvAlert average %s: value=%.2f, aqi=%.0f (from %d stations)", pollutant, avg_value, avg_aqi, value_counts[i])
+
+    # If we got at least some data, return it
+    if result:
+        return result
+    logger.info("No valid pollutant data found for %s", city_name)
+    return None
+
+@timed("envalert")
+async def aget_today_data_from_envalert(city_name):
     """
     Fetch today's air quality data from EnvAlert API for the given city.
     Returns average values and AQIs if stations found, or None if no data available.
+    Served from the station poller's snapshot when it holds fresh readings for the city.
     """
     try:
         # Normalize city name for matching (case-insensitive)
         city_key = None
         for key in CITY_STATIONS.keys():
-            if key.lower() == city_name.lower():
+            if normalize_city(key) == normalize_city(city_name):
                 city_key = key
                 break
         
         if not city_key:
-            print(f"City '{city_name}' not found in CITY_STATIONS mapping", flush=True)
+            logger.debug("City %r not found in CITY_STATIONS mapping", city_name)
             return None
         
         station_ids = CITY_STATIONS[city_key]
-        print(f"Found {len(station_ids)} stations for {city_key}: {station_ids}", flush=True)
-        
-        # Fetch data for each station in parallel
-        all_pollutant_values = {p: [] for p in TARGET_POLLUTANTS}
-        all_pollutant_aqis = {p: [] for p in TARGET_POLLUTANTS}
-        
-        # Use ThreadPoolExecutor to fetch station data concurrently
-        with ThreadPoolExecutor(max_workers=min(len(station_ids), 5)) as executor:
-            station_data_list = list(executor.map(fetch_envalert_current_aqi, station_ids))
-        
+        logger.debug("Found %d stations for %s: %s", len(station_ids), city_key, station_ids)
+
+        snapshot = station_poller.snapshot
+        rows = snapshot.fresh_rows(station_ids, station_poller.max_age) if station_poller.running else []
+        if rows:
+            return average_station_readings(city_name, snapshot.values[rows], snapshot.sub_indices[rows])
+
+        # No fresh snapshot: fetch data for each station in parallel
+        station_data_list = await asyncio.gather(*(afetch_envalert_current_aqi(sid) for sid in station_ids))
+
+        readings = []
         for station_data in station_data_list:
             if not station_data:
                 continue
+            logger.debug("Station data: %s", station_data.get('station_name', 'Unknown'))
+            readings.append(parse_envalert_station(station_data))
+
+        values = np.array([r[0] for r in readings], dtype=np.float64).reshape(-1, len(TARGET_POLLUTANTS))
+        sub_indices = np.array([r[1] for r in readings], dtype=np.float64).reshape(-1, len(TARGET_POLLUTANTS))
+        return average_station_readings(city_name, values, sub_indices)
             
-            print(f"Station data: {station_data.get('station_name', 'Unknown')}", flush=True)
-            
-            # Extract pollutant values and their AQIs
-            for pollutant in TARGET_POLLUTANTS:
-                value_key, aqi_key = ENVALERT_POLLUTANT_MAP.get(pollutant)
-                
-                # Get concentration value
-                value = station_data.get(value_key)
-                if value is not None and value != '' and value != 'null':
-                    try:
-                        all_pollutant_values[pollutant].append(float(value))
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Get AQI sub-index
-                aqi_value = station_data.get(aqi_key)
-                if aqi_value is not None and aqi_value != '' and aqi_value != 'null':
-                    try:
-                        all_pollutant_aqis[pollutant].append(float(aqi_value))
-                    except (ValueError, TypeError):
-                        pass
-        
-        # Calculate averages
-        result = {}
-        for pollutant in TARGET_POLLUTANTS:
-            values = all_pollutant_values[pollutant]
-            aqis = all_pollutant_aqis[pollutant]
-            
-            if values and aqis:
-                avg_value = sum(values) / len(values)
-                avg_aqi = sum(aqis) / len(aqis)
-                result[pollutant] = {
-                    'value': avg_value,
-                    'aqi': round(avg_aqi)
-                }
-                print(f"EnvAlert average {pollutant}: value={avg_value:.2f}, aqi={avg_aqi:.0f} (from {len(values)} stations)", flush=True)
-        
-        # If we got at least some data, return it
-        if result:
-            return result
+    except Exception:
+        logger.exception("Error in get_today_data_from_envalert for %s", city_name)
+        count_error("envalert")
+        return None
+
+def get_today_data_from_envalert(city_name):
+    return upstream_client.run(aget_today_data_from_envalert(city_name))
+
+# Live station readings (proxy and batch endpoints) are cached briefly rather than per hour
+STATION_CACHE_TTL = int(os.environ.get("STATION_CACHE_TTL", 120))
+MAX_BATCH_STATIONS = 64
+
+async def afetch_station_payload(station_id):
+    """Raw EnvAlert payload for one station, shared between callers for STATION_CACHE_TTL seconds"""
+    url = f"{ENVALERT_URL}?id={station_id}"
+    return await upstream_cache.get_or_load(
+        "envalert-live", None, None, station_id, lambda: upstream_client.fetch_json("POST", url),
+        ttl=STATION_CACHE_TTL
+    )
+
+async def afetch_stations(station_ids):
+    """
+    Current readings for several stations: fresh ones from the poller snapshot, the rest fetched concurrently.
+    Returns ({station_id: station object}, {station_id: error message}, oldest fetch time) so one failure
+    doesn't sink the batch.
+    """
+    stations, errors = {}, {}
+    oldest = time.time()
+    missing = []
+    for station_id in station_ids:
+        cached = station_poller.lookup(station_id)
+        if cached is None:
+            missing.append(station_id)
+            continue
+        payload, fetched_at = cached
+        stations[station_id] = payload[0] if isinstance(payload, list) else payload
+        oldest = min(oldest, fetched_at)
+
+    payloads = await asyncio.gather(*(afetch_station_payload(sid) for sid in missing), return_exceptions=True)
+    for station_id, payload in zip(missing, payloads):
+        if isinstance(payload, aiohttp.ClientResponseError):
+            errors[station_id] = f"EnvAlert returned status {payload.status}"
+        elif isinstance(payload, Exception):
+            errors[station_id] = f"{type(payload).__name__}: {payload}".rstrip(": ")
         else:
-            print(f"No valid pollutant data found for {city_name}", flush=True)
+            # API returns a list with one station object
+            station = payload[0] if isinstance(payload, list) and payload else payload
+            if station:
+                stations[station_id] = station
+            else:
+                errors[station_id] = "No data for station"
+    return {sid: stations[sid] for sid in station_ids if sid in stations}, errors, oldest
+
+class StationSnapshot:
+    """
+    Immutable columnar view of the polled EnvAlert stations: one row per station, one column per
+    pollutant in TARGET_POLLUTANTS order (NaN where missing), plus the raw payload for the proxy.
+    """
+
+    def __init__(self, station_ids):
+        self.station_ids = list(station_ids)
+        self.rows = {sid: i for i, sid in enumerate(self.station_ids)}
+        self.values = np.full((len(self.station_ids), len(TARGET_POLLUTANTS)), np.nan)
+        self.sub_indices = np.full_like(self.values, np.nan)
+        self.fetched_at = np.full(len(self.station_ids), np.nan)
+        self.payloads = [None] * len(self.station_ids)
+        self.version = 0
+
+    def updated(self, readings, fetched_at):
+        """New snapshot with the rows in {station_id: payload} replaced; other rows keep their last reading"""
+        snapshot = StationSnapshot.__new__(StationSnapshot)
+        snapshot.station_ids = self.station_ids
+        snapshot.rows = self.rows
+        snapshot.values = self.values.copy()
+        snapshot.sub_indices = self.sub_indices.copy()
+        snapshot.fetched_at = self.fetched_at.copy()
+        snapshot.payloads = list(self.payloads)
+        snapshot.version = self.version + 1
+        for station_id, payload in readings.items():
+            row = self.rows[station_id]
+            station = payload[0] if isinstance(payload, list) else payload
+            snapshot.values[row], snapshot.sub_indices[row] = parse_envalert_station(station)
+            snapshot.fetched_at[row] = fetched_at
+            snapshot.payloads[row] = payload
+        return snapshot
+
+    def fresh_rows(self, station_ids, max_age):
+        cutoff = time.time() - max_age
+        rows = [self.rows[sid] for sid in station_ids if sid in self.rows]
+        return [row for row in rows if self.fetched_at[row] >= cutoff]
+
+class StationPoller:
+    """
+    Refreshes every CITY_STATIONS station in the background with bounded concurrency, so city averages,
+    the station proxy and the batch endpoint are served from memory instead of waiting on EnvAlert.
+    """
+
+    def __init__(self, station_ids, interval=300, concurrency=8):
+        self.interval = interval
+        self.concurrency = concurrency
+        # Readings older than this are treated as missing and fetched live
+        self.max_age = interval * 3
+        self.snapshot = StationSnapshot(station_ids)
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="station-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Station poll failed")
+            self._stop.wait(self.interval)
+
+    async def _poll_all(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def poll(station_id):
+            url = f"{ENVALERT_URL}?id={station_id}"
+            async with semaphore:
+                try:
+                    return station_id, await upstream_client.fetch_json("POST", url)
+                except Exception as e:
+                    logger.debug("Station poll failed for %s: %r", station_id, e)
+                    return station_id, None
+
+        return await asyncio.gather(*(poll(sid) for sid in self.snapshot.station_ids))
+
+    def refresh(self):
+        start = time.time()
+        results = upstream_client.run(self._poll_all(), timeout=120)
+        readings = {sid: payload for sid, payload in results if payload}
+        previous, self.snapshot = self.snapshot, self.snapshot.updated(readings, start)
+        live_updates.stations_updated(previous, self.snapshot)
+        logger.info("Polled %d/%d EnvAlert stations in %.1fs", len(readings), len(results), time.time() - start)
+
+    def lookup(self, station_id):
+        """(raw payload, fetch time) for a fresh reading of the station, else None"""
+        if not self.running:
             return None
-            
-    except Exception as e:
-        print(f"Error in get_today_data_from_envalert: {e}", flush=True)
-        return None
+        snapshot = self.snapshot
+        row = snapshot.rows.get(station_id)
+        if row is None or not snapshot.fetched_at[row] >= time.time() - self.max_age:
+            return None
+        return snapshot.payloads[row], float(snapshot.fetched_at[row])
 
-def fetch_pollutant_series(lat, lon, pollutant):
+station_poller = StationPoller(
+    sorted({sid for ids in CITY_STATIONS.values() for sid in ids}),
+    interval=int(os.environ.get("STATION_POLL_INTERVAL", 300))
+)
+
+
+def air_quality_url(lat, lon, api_fields):
+    """Open-Meteo air-quality URL covering the last 72 hours up to the current IST hour"""
+    end_datetime_ist = datetime.now(IST).replace(minute=0, second=0, microsecond=0)
+    start_datetime = end_datetime_ist - timedelta(hours=71)
+
+    start_date = start_datetime.date().strftime("%Y-%m-%d")
+    end_date = end_datetime_ist.date().strftime("%Y-%m-%d")
+
+    return (
+        f"{OPEN_METEO_AQ_URL}"
+        f"?latitude={lat}&longitude={lon}"
+        f"&start_date={start_date}&end_date={end_date}"
+        f"&hourly={api_fields}&timezone=Asia%2FKolkata"
+    )
+
+class HourIndex:
+    """
+    Open-Meteo hourly `time` strings (IST wall-clock) parsed once into int64 epoch hours.
+    Window slicing, current-hour and previous-day lookups become arithmetic or a single searchsorted.
+    """
+
+    def __init__(self, timestamps, hours=None):
+        self.timestamps = timestamps
+        if hours is None:
+            hours = np.array(timestamps, dtype="datetime64[h]").astype(np.int64) if timestamps else np.empty(0, np.int64)
+        self.hours = hours
+
+    def __len__(self):
+        return len(self.hours)
+
+    @staticmethod
+    def hour_of(dt):
+        """Epoch hour of a datetime's IST wall-clock time"""
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(IST).replace(tzinfo=None)
+        return int(np.datetime64(dt, "h").astype(np.int64))
+
+    @classmethod
+    def from_range(cls, start_hour, end_hour):
+        """Index of the contiguous epoch hours [start_hour, end_hour)"""
+        hours = np.arange(start_hour, end_hour, dtype=np.int64)
+        return cls(np.datetime_as_string(hours.astype("datetime64[h]"), unit="m").tolist(), hours)
+
+    def slice(self, start, end):
+        """Sub-index over [start, end); shares the underlying hours array"""
+        return HourIndex(self.timestamps[start:end], self.hours[start:end])
+
+    def current_window(self, now, hours=72):
+        """(start, end) bounds of the last `hours` entries ending at the first entry at or after now's hour"""
+        current_index = int(np.searchsorted(self.hours, self.hour_of(now), side='left'))
+        if current_index == len(self.hours):
+            current_index = len(self.hours) - 1
+        return max(0, current_index - (hours - 1)), current_index + 1
+
+    def previous_day_hour(self, now):
+        """
+        Index of the current hour on the previous day, or of that day's last entry if the hour is missing.
+        None when the previous day is not covered at all.
+        """
+        day_start = (self.hour_of(now) // 24 - 1) * 24
+        lo, hi = np.searchsorted(self.hours, [day_start, day_start + 24], side='left')
+        if lo == hi:
+            return None
+        target = int(np.searchsorted(self.hours, day_start + now.hour, side='left'))
+        if target < hi and self.hours[target] == day_start + now.hour:
+            return target
+        return int(hi) - 1
+
+def current_window(timestamps):
+    """(start, end) slice bounds of the last 72 hours ending at the current hour"""
+    index = timestamps if isinstance(timestamps, HourIndex) else HourIndex(timestamps)
+    return index.current_window(datetime.now(IST))
+
+class HistoryStore:
+    """
+    Local hourly history, one memory-mapped float64 (hours, variables) array per location and dataset.
+    Rows are indexed by epoch hour and stay NaN until fetched; `covered` lists the [start, end) hour ranges
+    that were actually downloaded as final, so refreshes only fetch hours outside them. Windows are zero-copy views.
+    """
+
+    GROW_HOURS = 24 * 30
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps = {}
+
+    @staticmethod
+    def location_key(lat, lon):
+        return f"{float(lat):.4f}_{float(lon):.4f}"
+
+    def _paths(self, location, dataset):
+        base = os.path.join(self.root, location, dataset)
+        return base + ".json", base + ".f64"
+
+    def _meta(self, location, dataset, variables):
+        meta_path, _ = self._paths(location, dataset)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        # A different variable layout is rebuilt from scratch on the next write
+        if meta.get("variables") != list(variables):
+            return None
+        return meta
+
+    def _array(self, data_path, width):
+        """Read-only map of a data file, reopened when another writer grew or replaced it"""
+        st = os.stat(data_path)
+        cached = self._maps.get(data_path)
+        if cached is None or cached[0] != (st.st_ino, st.st_size):
+            arr = np.memmap(data_path, dtype=np.float64, mode="r", shape=(st.st_size // (8 * width), width))
+            cached = self._maps[data_path] = ((st.st_ino, st.st_size), arr)
+        return cached[1]
+
+    def missing_from(self, location, dataset, variables, start_hour):
+        """First hour at or after start_hour that is not stored yet"""
+        meta = self._meta(location, dataset, variables)
+        hour = start_hour
+        # Sorted, disjoint and never adjacent, so one pass finds the end of the run containing start_hour
+        for lo, hi in (meta or {}).get("covered", []):
+            if lo <= hour < hi:
+                hour = hi
+        return hour
+
+    def window(self, location, dataset, variables, start_hour, end_hour):
+        """(end_hour - start_hour, len(variables)) view of the stored rows, or None if not covered"""
+        meta = self._meta(location, dataset, variables)
+        if meta is None or start_hour < meta["base_hour"]:
+            return None
+        arr = self._array(self._paths(location, dataset)[1], len(variables))
+        lo, hi = start_hour - meta["base_hour"], end_hour - meta["base_hour"]
+        if hi > len(arr):
+            return None
+        return arr[lo:hi]
+
+    def write(self, location, dataset, variables, hours, columns, final_until):
+        """
+        Store one value per variable for each epoch hour in hours (None/NaN for gaps). Hours before
+        final_until that came back with at least one value are recorded as covered; everything else,
+        including hours the upstream left out, is fetched again next time.
+        """
+        hours = np.asarray(hours, dtype=np.int64)
+        if not len(hours):
+            return
+        values = np.array(columns, dtype=np.float64).T
+        width = len(variables)
+        meta_path, data_path = self._paths(location, dataset)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with self._lock, self._file_lock(location):
+            meta = self._meta(location, dataset, variables)
+            lo, hi = int(hours.min()), int(hours.max()) + 1
+            if meta is not None:
+                base = meta["base_hour"]
+                capacity = os.path.getsize(data_path) // (8 * width)
+            if meta is None or lo < base:
+                # New or rebased file: build it aside, carry over stored rows and swap it in
+                old_end = base + capacity if meta is not None else hi
+                tmp_path = f"{data_path}.{os.getpid()}.tmp"
+                arr = np.memmap(tmp_path, dtype=np.float64, mode="w+", shape=(max(hi, old_end) - lo + self.GROW_HOURS, width))
+                arr[:] = np.nan
+                if meta is not None:
+                    old = np.memmap(data_path, dtype=np.float64, mode="r", shape=(capacity, width))
+                    arr[base - lo:old_end - lo] = old
+                    del old
+                arr[hours - lo] = values
+                arr.flush()
+                del arr
+                os.replace(tmp_path, data_path)
+                base = lo
+            else:
+                if hi - base > capacity:
+                    new_capacity = hi - base + self.GROW_HOURS
+                    with open(data_path, "r+b") as f:
+                        f.truncate(new_capacity * 8 * width)
+                    arr = np.memmap(data_path, dtype=np.float64, mode="r+", shape=(new_capacity, width))
+                    arr[capacity:] = np.nan
+                else:
+                    arr = np.memmap(data_path, dtype=np.float64, mode="r+", shape=(capacity, width))
+                arr[hours - base] = values
+                arr.flush()
+                del arr
+            meta = {
+                "variables": list(variables),
+                "base_hour": base,
+                "covered": merge_hour_ranges(
+                    meta.get("covered", []) if meta else [],
+                    hours[(hours < final_until) & ~np.isnan(values).all(axis=1)]
+                ),
+            }
+            tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+
+    def _file_lock(self, location):
+        """Exclusive lock so several worker processes can share one store"""
+        if fcntl is None:
+            return contextlib.nullcontext()
+        return _FileLock(os.path.join(self.root, location, ".lock"))
+
+def merge_hour_ranges(ranges, hours):
+    """Sorted, disjoint [start, end) ranges covering both ranges and the epoch hours given"""
+    hours = np.unique(hours)
+    ranges = [tuple(r) for r in ranges]
+    if len(hours):
+        breaks = np.flatnonzero(np.diff(hours) != 1) + 1
+        starts = hours[np.concatenate(([0], breaks))]
+        ends = hours[np.concatenate((breaks - 1, [len(hours) - 1]))] + 1
+        ranges += zip(starts.tolist(), ends.tolist())
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self._f = open(self.path, "a")
+        fcntl.flock(self._f, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+
+def init_history_store():
+    history_dir = os.environ.get("HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"))
+    # Only forecast inputs are kept in history; the proxy role never reads it
+    if not history_dir or not SERVES_FORECASTS:
+        return None
     try:
-        end_datetime_ist = datetime.now(IST).replace(minute=0, second=0, microsecond=0)
-        start_datetime = end_datetime_ist - timedelta(hours=71)
+        return HistoryStore(history_dir)
+    except OSError as e:
+        logger.warning("History store disabled: %s", e)
+        return None
 
-        start_date = start_datetime.date().strftime("%Y-%m-%d")
-        end_date = end_datetime_ist.date().strftime("%Y-%m-%d")
+history_store = init_history_store()
 
-        api_field = POLLUTANT_API_MAP[pollutant]
+def hour_param(hour):
+    """Open-Meteo start_hour/end_hour value for an epoch hour"""
+    return str(np.datetime64(int(hour), "h").astype("datetime64[m]"))
 
-        url = (
-            f"https://air-quality-api.open-meteo.com/v1/air-quality"
-            f"?latitude={lat}&longitude={lon}"
-            f"&start_date={start_date}&end_date={end_date}"
-            f"&hourly={api_field}&timezone=Asia%2FKolkata"
+async def arefresh_history(source, lat, lon, dataset, variables, start_hour, end_hour, final_until, url_for):
+    """
+    Download the hours of [start_hour, end_hour) the store doesn't hold yet and return the window view.
+    url_for(first_hour, last_hour) builds the request; hours from final_until on are fetched again next time.
+    """
+    location = HistoryStore.location_key(lat, lon)
+    first = history_store.missing_from(location, dataset, variables, start_hour)
+    if first < end_hour:
+        async def load():
+            data = await upstream_client.fetch_json("GET", url_for(first, end_hour - 1))
+            hourly = data["hourly"]
+            hours = HourIndex(hourly.get("time", [])).hours
+            columns = [hourly.get(v) or [None] * len(hours) for v in variables]
+            await asyncio.to_thread(
+                history_store.write, location, dataset, variables, hours, columns, min(final_until, end_hour)
+            )
+            return len(hours)
+
+        # One download per location and missing range per hour, however many requests ask
+        await upstream_cache.get_or_load(source, lat, lon, f"{','.join(variables)}@{first}", load)
+
+    window = history_store.window(location, dataset, variables, start_hour, end_hour)
+    if window is None:
+        raise ValueError(f"{dataset} history for {location} does not cover the requested window")
+    return window
+
+async def afetch_pollutant_series(lat, lon, pollutant):
+    try:
+        api_field = POLLUTANT_API_MAP[pollutant]
+        url = air_quality_url(lat, lon, api_field)
+        data = await upstream_cache.get_or_load(
+            "open-meteo-aq", lat, lon, api_field, lambda: upstream_client.fetch_json("GET", url)
         )
-        response = requests.get(url, timeout=10)
-        data = response.json()
         values = data["hourly"].get(api_field, [])
         timestamps = data["hourly"].get("time", [])
 
         # Align last 72 hours ending at current hour
-        current_hour = datetime.now(IST).replace(minute=0, second=0, microsecond=0)
-        current_index = None
-        for i, ts in enumerate(timestamps):
-            ts_dt = datetime.fromisoformat(ts).replace(tzinfo=IST)
-            if ts_dt >= current_hour:
-                current_index = i
-                break
-        if current_index is None:
-            current_index = len(timestamps) - 1
+        start, end = current_window(timestamps)
+        return values[start:end], timestamps[start:end]
+    except Exception as e:
+        logger.warning("[%s] Pollutant fetch error: %s", pollutant.upper(), e)
+        return [], []
 
-        start_index = max(0, current_index - 71)
-        series = values[start_index:current_index+1]
-        ts_series = timestamps[start_index:current_index+1]
+def fetch_pollutant_series(lat, lon, pollutant):
+    return upstream_client.run(afetch_pollutant_series(lat, lon, pollutant))
 
-        return series, ts_series
+@timed("open_meteo_aq")
+async def afetch_pollutant_batch(lat, lon):
+    """
+    Fetch all six pollutant series in a single air-quality call.
+    Returns {pollutant: (series, HourIndex)} aligned exactly like afetch_pollutant_series;
+    all pollutants share one parsed HourIndex.
+    With the history store, only hours not stored yet are downloaded and series are views into it.
+    """
+    api_fields = ",".join(POLLUTANT_API_MAP[p] for p in TARGET_POLLUTANTS)
+    try:
+        if history_store is not None:
+            variables = [POLLUTANT_API_MAP[p] for p in TARGET_POLLUTANTS]
+            end_hour = HourIndex.hour_of(datetime.now(IST)) + 1
+            start_hour = end_hour - 72
+            # The current hour is still a forecast, so it is fetched again next hour
+            window = await arefresh_history(
+                "open-meteo-aq", lat, lon, "air_quality", variables, start_hour, end_hour, end_hour - 1,
+                lambda first, last: (
+                    f"{OPEN_METEO_AQ_URL}"
+                    f"?latitude={lat}&longitude={lon}"
+                    f"&start_hour={hour_param(first)}&end_hour={hour_param(last)}"
+                    f"&hourly={api_fields}&timezone=Asia%2FKolkata"
+                )
+            )
+            window_index = HourIndex.from_range(start_hour, end_hour)
+            return {p: (window[:, i], window_index) for i, p in enumerate(TARGET_POLLUTANTS)}
+
+        url = air_quality_url(lat, lon, api_fields)
+        data = await upstream_cache.get_or_load(
+            "open-meteo-aq", lat, lon, api_fields, lambda: upstream_client.fetch_json("GET", url)
+        )
+        hourly = data["hourly"]
+        index = HourIndex(hourly.get("time", []))
+        start, end = index.current_window(datetime.now(IST))
+        window_index = index.slice(start, end)
+        return {
+            p: (hourly.get(POLLUTANT_API_MAP[p], [])[start:end], window_index)
+            for p in TARGET_POLLUTANTS
+        }
     except Exception as e:
-        print(f"[{pollutant.upper()}] Pollutant fetch error:", e, flush=True)
-        return [], []
+        logger.warning("Pollutant batch fetch error: %s", e)
+        count_error("open_meteo_aq")
+        return {p: ([], HourIndex([])) for p in TARGET_POLLUTANTS}
 
-def fetch_weather_series(lat, lon):
+def fetch_pollutant_batch(lat, lon):
+    return upstream_client.run(afetch_pollutant_batch(lat, lon))
+
+@timed("open_meteo_weather")
+async def afetch_weather_series(lat, lon):
+    """
+    Hourly weather rows for the five UTC days up to yesterday.
+    With the history store this is a (hours, WEATHER_COLS) view and only new days are downloaded.
+    """
     try:
         end_date = datetime.utcnow().date() - timedelta(days=1)
         start_date = end_date - timedelta(days=4)
         weather_params = ",".join(WEATHER_COLS)
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&start_date={start_date}&end_date={end_date}&hourly={weather_params}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        if history_store is not None:
+            start_hour = int(np.datetime64(start_date, "h").astype(np.int64))
+            end_hour = start_hour + 5 * 24
+            return await arefresh_history(
+                "open-meteo-weather", lat, lon, "weather", WEATHER_COLS, start_hour, end_hour, end_hour,
+                lambda first, last: (
+                    f"{OPEN_METEO_FORECAST_URL}?latitude={lat}&longitude={lon}"
+                    f"&start_hour={hour_param(first)}&end_hour={hour_param(last)}&hourly={weather_params}"
+                )
+            )
+        url = f"{OPEN_METEO_FORECAST_URL}?latitude={lat}&longitude={lon}&start_date={start_date}&end_date={end_date}&hourly={weather_params}"
+        data = await upstream_cache.get_or_load(
+            "open-meteo-weather", lat, lon, "hourly", lambda: upstream_client.fetch_json("GET", url)
+        )
         hourly = data["hourly"]
         return [[hourly[col][i] for col in WEATHER_COLS] for i in range(len(hourly['time']))]
-    except:
+    except Exception:
+        count_error("open_meteo_weather")
         return []
 
+def fetch_weather_series(lat, lon):
+    return upstream_client.run(afetch_weather_series(lat, lon))
+
 def calculate_errors(envalert_today_data, model_predictions_for_error):
     """
     Calculate errors: avg of all stations - predicted by model
@@ -341,8 +2055,8 @@ def calculate_errors(envalert_today_data, model_predictions_for_error):
             errors["pm2_5_concentration"] = round(api_pm25_value - model_pm25_value, 2)
             errors["pm2_5_aqi"] = round(api_pm25_aqi - model_pm25_aqi, 2)
             
-            print(f"PM2.5 - API: {api_pm25_value}, Model: {model_pm25_value}, Error: {errors['pm2_5_concentration']}", flush=True)
-            print(f"PM2.5 AQI - API: {api_pm25_aqi}, Model: {model_pm25_aqi}, Error: {errors['pm2_5_aqi']}", flush=True)
+            logger.debug("PM2.5 - API: %s, Model: %s, Error: %s", api_pm25_value, model_pm25_value, errors['pm2_5_concentration'])
+            logger.debug("PM2.5 AQI - API: %s, Model: %s, Error: %s", api_pm25_aqi, model_pm25_aqi, errors['pm2_5_aqi'])
         
         # PM10 errors
         if envalert_today_data and "pm10" in envalert_today_data and "pm10" in model_predictions_for_error:
@@ -354,8 +2068,8 @@ def calculate_errors(envalert_today_data, model_predictions_for_error):
             errors["pm10_concentration"] = round(api_pm10_value - model_pm10_value, 2)
             errors["pm10_aqi"] = round(api_pm10_aqi - model_pm10_aqi, 2)
             
-            print(f"PM10 - API: {api_pm10_value}, Model: {model_pm10_value}, Error: {errors['pm10_concentration']}", flush=True)
-            print(f"PM10 AQI - API: {api_pm10_aqi}, Model: {model_pm10_aqi}, Error: {errors['pm10_aqi']}", flush=True)
+            logger.debug("PM10 - API: %s, Model: %s, Error: %s", api_pm10_value, model_pm10_value, errors['pm10_concentration'])
+            logger.debug("PM10 AQI - API: %s, Model: %s, Error: %s", api_pm10_aqi, model_pm10_aqi, errors['pm10_aqi'])
         
         # Overall AQI error - calculate from all available pollutants
         if envalert_today_data and model_predictions_for_error:
@@ -376,92 +2090,1053 @@ def calculate_errors(envalert_today_data, model_predictions_for_error):
                 model_overall_aqi = max(model_aqis)
                 errors["overall_aqi"] = round(api_overall_aqi - model_overall_aqi, 2)
                 
-                print(f"Overall AQI - API: {api_overall_aqi}, Model: {model_overall_aqi}, Error: {errors['overall_aqi']}", flush=True)
+                logger.debug("Overall AQI - API: %s, Model: %s, Error: %s", api_overall_aqi, model_overall_aqi, errors['overall_aqi'])
         
-        print(f"Calculated errors: {errors}", flush=True)
+        logger.debug("Calculated errors: %s", errors)
         
-    except Exception as e:
-        print(f"Error calculating errors: {e}", flush=True)
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error calculating errors")
     
     return errors
 
-def predict_pollutant(pollutant, data, weather_data, timestamps, start_day=1):
+@timed("predict_pollutant")
+def predict_pollutant(pollutant, data, weather_data, timestamps, start_day=1, rollout=None):
     """
     Predict pollutant values starting from a given day.
-    start_day=0 for today, start_day=1 for tomorrow onwards
+    start_day=0 for today, start_day=1 for tomorrow onwards.
+    timestamps is the window's timestamp list or its HourIndex.
+    rollout is an optional precomputed forecast_rollouts() entry; day i uses rollout[i - start_day].
     """
     try:
-        model = get_model(pollutant)  # Use lazy loading
-        if not model or len(data) < 72:
+        if len(data) < 72:
             return []
-
-        # Latest weather features
-        weather_features = weather_data[-1][:9] if weather_data else [0] * 9
-
-        # Prepare initial sequence for model
-        seq = [0.0] + data[-72:] + weather_features
-        sequence = np.array(seq).reshape((1, 82, 1))
+        if rollout is None:
+            preds = rollout_forecast(pollutant, [build_input_sequence(data, weather_data)])
+            if preds is None:
+                return []
+            rollout = preds[0]
 
         results = []
 
-        # Determine previous day date
-        today_date = datetime.now(IST).date()
-        prev_date = today_date - timedelta(days=1)
+        # Parsed once per request when the caller passes the shared HourIndex
+        index = timestamps if isinstance(timestamps, HourIndex) else HourIndex(timestamps)
+        now_ist = datetime.now(IST)
+        prev_hour_index = index.previous_day_hour(now_ist)
 
-        # Get indices of previous day
-        prev_day_indices = [i for i, ts in enumerate(timestamps) if datetime.fromisoformat(ts).date() == prev_date]
+        if prev_hour_index is None:
+            logger.info("No previous day data found for %s", now_ist.date() - timedelta(days=1))
+            return []
 
-        if not prev_day_indices:
-            print(f"No previous day data found for {prev_date}")
+        # Take previous 23 hours from previous day, ending at the current hour of that day
+        start_index = max(prev_hour_index - 23, 0)
+        last_23_hours = data[start_index:prev_hour_index]
+        if np.isnan(np.asarray(last_23_hours, dtype=np.float64)).any():
+            logger.info("Missing previous day history for %s", pollutant)
             return []
+        last_23_sum = sum(last_23_hours)
+        now_utc = datetime.utcnow()
 
         for i in range(start_day, 7):
-            pred_val = float(abs(model.predict(sequence, verbose=0)[0, 0]))
-
-            # Find current hour of previous day
-            hour_now = datetime.now(IST).hour
-            prev_hour_index = next((idx for idx in prev_day_indices if datetime.fromisoformat(timestamps[idx]).hour == hour_now), None)
-
-            if prev_hour_index is None:
-                prev_hour_index = prev_day_indices[-1]
-
-            # Take previous 23 hours from previous day
-            start_index = max(prev_hour_index - 23, 0)
-            last_23_hours = [data[j] for j in range(start_index, prev_hour_index)]
+            pred_val = float(rollout[i - start_day])
 
             # Combine with predicted value
-            values_avg = last_23_hours + [pred_val]
-            C_avg = sum(values_avg) / len(values_avg)
+            C_avg = (last_23_sum + pred_val) / (len(last_23_hours) + 1)
 
             aqi = get_aqi_sub_index(C_avg, pollutant)
             category, warning, color = get_category_info(aqi)
 
-            date = (datetime.utcnow() + timedelta(days=i)).strftime("%Y-%m-%d")
-            day = "Today" if i == 0 else "Tomorrow" if i == 1 else (datetime.utcnow() + timedelta(days=i)).strftime("%d %b")
+            date = (now_utc + timedelta(days=i)).strftime("%Y-%m-%d")
+            day = "Today" if i == 0 else "Tomorrow" if i == 1 else (now_utc + timedelta(days=i)).strftime("%d %b")
 
             results.append({
                 "day": day,
                 "date": date,
                 "value": round(pred_val, 2),
-                "aqi": int(aqi) if not pd.isna(aqi) else 0,
+                "aqi": int(aqi) if not is_missing(aqi) else 0,
                 "category": category,
                 "warning": warning,
                 "color": color
             })
 
-            # Update sequence for next prediction
-            sequence[0, -1, 0] = pred_val
-            sequence = np.roll(sequence, -1, axis=1)
-
         return results
 
-    except Exception as e:
-        print(f"Prediction error for {pollutant}: {e}", flush=True)
+    except Exception:
+        logger.exception("Prediction error for %s", pollutant)
+        count_error("predict_pollutant")
         return []
 
-@app.route('/predict', methods=['POST', 'OPTIONS'])
+# variants holds other representations of body (compact, compressed), built on first request.
+# Past fresh_until (the end of the entry's hour; None means expires_at) it is only served as stale.
+CachedResponse = namedtuple("CachedResponse", ["body", "etag", "expires_at", "variants", "fresh_until"])
+
+def make_cached_response(body, expires_at, fresh_until=None):
+    return CachedResponse(body, hashlib.blake2b(body, digest_size=10).hexdigest(), expires_at, {}, fresh_until)
+
+class ResponseCache:
+    """
+    LRU of pre-serialized JSON responses keyed by (endpoint, normalized city, IST hour).
+    Bounded by total body size so memory stays predictable however many cities are requested.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(endpoint, city_name, hour_bucket=None):
+        return (endpoint, normalize_city(city_name), hour_bucket or current_hour_bucket())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def serialize(payload, expires_at, fresh_until=None):
+        with span("serialize"):
+            body = app.json.dumps(payload).encode("utf-8")
+        return make_cached_response(body, expires_at, fresh_until)
+
+    def put(self, key, payload, expires_at=None):
+        """Serialize a payload once and store it; returns the CachedResponse"""
+        entry = self.serialize(payload, expires_at or key[-1] + 3600, key[-1] + 3600)
+        body = entry.body
+        if self.max_bytes <= 0:
+            return entry
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            self._entries[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def get_or_build(self, key, builder, stale_key=None):
+        """
+        Return (CachedResponse, None) from cache or a fresh build, or (None, (payload, status)) when the
+        build did not succeed. Concurrent builds of the same key are coalesced; errors are never cached.
+        The builder returns (payload, status), plus True when the payload was built while an upstream was
+        failing: such a build is served to the waiting requests but not cached, and expires immediately.
+        stale_key names an older entry that may be served while a background refresh replaces it.
+        """
+        entry = self.get(key)
+        if entry is None and stale_key is not None:
+            entry = self.get(stale_key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry, None
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            payload, status, *degraded = builder()
+            if status == 200 and any(degraded):
+                flight.value = (self.serialize(payload, time.time()), None)
+            elif status == 200:
+                flight.value = (self.put(key, payload), None)
+            else:
+                flight.value = (None, (payload, status))
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+response_cache = ResponseCache(max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024)))
+
+COMPACT_MIMETYPE = "application/vnd.aerovision.compact+json"
+MSGPACK_MIMETYPE = "application/msgpack"
+COMPACT_FORMAT = "compact-1"
+# Smaller bodies aren't worth the Content-Encoding overhead
+MIN_COMPRESS_BYTES = 512
+CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORY_NAMES.tolist())}
+
+def compact_forecast(payload):
+    """
+    /predict payload as day-aligned columns: per pollutant value/aqi/category-code arrays (null on days
+    without a forecast) and the category strings once. today_pollutants and overall_daily_aqi repeat
+    prediction entries, so only which pollutants they point at is kept.
+    """
+    dates, days = [], []
+    for entries in payload["predictions"].values():
+        for entry in entries:
+            if entry["date"] not in dates:
+                dates.append(entry["date"])
+                days.append(entry["day"])
+    column = {date: i for i, date in enumerate(dates)}
+
+    predictions = {}
+    for pollutant, entries in payload["predictions"].items():
+        values, aqi, codes = [None] * len(dates), [None] * len(dates), [None] * len(dates)
+        for entry in entries:
+            i = column[entry["date"]]
+            values[i], aqi[i], codes[i] = entry["value"], entry["aqi"], CATEGORY_CODES[entry["category"]]
+        predictions[pollutant] = {"value": values, "aqi": aqi, "category": codes}
+
+    main_pollutant = [None] * len(dates)
+    for entry in payload["overall_daily_aqi"]:
+        main_pollutant[column[entry["date"]]] = entry["main_pollutant"]
+
+    return {
+        "format": COMPACT_FORMAT,
+        "city": payload["city"],
+        "lat": payload["lat"],
+        "lon": payload["lon"],
+        "dates": dates,
+        "days": days,
+        "categories": [list(row) for row in zip(CATEGORY_NAMES.tolist(), CATEGORY_WARNINGS.tolist(), CATEGORY_COLORS.tolist())],
+        "predictions": predictions,
+        "today_pollutants": [entry["pollutant"] for entry in payload["today_pollutants"]],
+        "main_pollutant": main_pollutant,
+        "errors": payload["errors"],
+        "data_source": payload["data_source"],
+    }
+
+def compact_weather(payload):
+    """/weather payload with the daily forecast as one array per field"""
+    rows = payload["forecast"]
+    fields = list(rows[0]) if rows else []
+    return {"format": COMPACT_FORMAT, "city": payload["city"],
+            "forecast": {field: [row[field] for row in rows] for field in fields}}
+
+COMPACT_ENCODERS = {"predict": compact_forecast, "weather": compact_weather}
+
+def negotiate_encoding():
+    """Best Content-Encoding the client accepts, or None for identity"""
+    return request.accept_encodings.best_match(("br", "gzip") if brotli is not None else ("gzip",))
+
+def compress_body(body, encoding):
+    return brotli.compress(body, quality=5) if encoding == "br" else gzip.compress(body, compresslevel=6)
+
+def representation(entry, fmt, encoding, compact):
+    """(body, mimetype, etag) of a cached entry in the negotiated format and encoding, built once per entry"""
+    key = (fmt, encoding)
+    variant = entry.variants.get(key)
+    if variant is not None:
+        return variant
+    if fmt == "json":
+        body, mimetype = entry.body, "application/json"
+    else:
+        payload = json.loads(entry.body)
+        if compact is not None:
+            payload = compact(payload)
+        if fmt == "msgpack":
+            body, mimetype = msgpack.packb(payload), MSGPACK_MIMETYPE
+        else:
+            body, mimetype = app.json.dumps(payload).encode("utf-8"), COMPACT_MIMETYPE
+    if encoding is not None:
+        body = compress_body(body, encoding)
+    # Every representation needs its own ETag, or a cache could hand one client another's bytes
+    tags = [tag for tag in (fmt if fmt != "json" else None, encoding) if tag]
+    variant = (body, mimetype, "-".join([entry.etag] + tags))
+    entry.variants[key] = variant
+    return variant
+
+def cached_response(entry, compact=None):
+    """
+    Serve a CachedResponse, answering 304 when the client already holds this ETag.
+    Content negotiation: Accept picks legacy JSON (default), the compact columnar format (when the
+    endpoint has a compact encoder; also ?format=compact) or MessagePack; Accept-Encoding picks gzip or
+    brotli for bodies over MIN_COMPRESS_BYTES. Each representation is built once and kept on the entry.
+    """
+    offered = ["application/json"]
+    if compact is not None:
+        offered.append(COMPACT_MIMETYPE)
+    if msgpack is not None:
+        offered.append(MSGPACK_MIMETYPE)
+    best = request.accept_mimetypes.best_match(offered, default="application/json")
+    fmt = {COMPACT_MIMETYPE: "compact", MSGPACK_MIMETYPE: "msgpack"}.get(best, "json")
+    if fmt == "json" and compact is not None and request.args.get("format") == "compact":
+        fmt = "compact"
+    encoding = negotiate_encoding() if len(entry.body) >= MIN_COMPRESS_BYTES else None
+
+    body, mimetype, etag = representation(entry, fmt, encoding, compact)
+    now = time.time()
+    cacheable = entry.expires_at > now
+    if cacheable and request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype=mimetype)
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+    if cacheable:
+        response.set_etag(etag)
+        # Fresh until the hour turns; the grace period after it is only for serving while revalidating
+        fresh_until = max(min(entry.expires_at, entry.fresh_until or entry.expires_at), now)
+        cache_control = f"public, max-age={int(fresh_until - now)}"
+        if entry.expires_at - fresh_until >= 1:
+            cache_control += f", stale-while-revalidate={int(entry.expires_at - fresh_until)}"
+        response.headers["Cache-Control"] = cache_control
+    else:
+        # Already expired: a degraded build that no cache should keep
+        response.headers["Cache-Control"] = "no-store"
+    response.vary.add("Accept-Encoding")
+    if len(offered) > 1:
+        response.vary.add("Accept")
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli for JSON built per request (station proxy, errors); cached responses arrive already encoded"""
+    if (response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers
+            or response.mimetype != "application/json"):
+        return response
+    body = response.get_data()
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding() if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding is not None:
+        response.set_data(compress_body(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+def cached_json_response(endpoint, city_name, builder):
+    """Serve an endpoint's payload for a city from the response cache, building it on a miss"""
+    key = ResponseCache.make_key(endpoint, city_name)
+    # Precomputed cities keep serving last hour's response until this hour's refresh lands
+    stale_key = ResponseCache.make_key(endpoint, city_name, key[-1] - 3600) if forecast_precomputer.covers(city_name) else None
+    entry, failure = response_cache.get_or_build(key, builder, stale_key)
+    if entry is None:
+        payload, status = failure
+        return jsonify(payload), status
+    return cached_response(entry, COMPACT_ENCODERS.get(endpoint))
+
+# Madhya Pradesh bounding box (west, south, east, north) that clips the station map layers
+MP_BBOX = (74.0, 21.0, 82.9, 26.9)
+MAP_GRID_STEP = float(os.environ.get("MAP_GRID_STEP", 0.1))
+MAP_IDW_POWER = 2
+# ~11 m; also the snapping tolerance when simplifying cell outlines
+MAP_PRECISION = 4
+
+def clip_half_plane(polygon, normal, offset):
+    """Part of a convex polygon [(x, y), ...] where normal . p <= offset (one Sutherland-Hodgman pass)"""
+    result = []
+    for i, current in enumerate(polygon):
+        previous = polygon[i - 1]
+        d_prev = normal[0] * previous[0] + normal[1] * previous[1] - offset
+        d_cur = normal[0] * current[0] + normal[1] * current[1] - offset
+        if (d_prev <= 0) != (d_cur <= 0):
+            t = d_prev / (d_prev - d_cur)
+            result.append((previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])))
+        if d_cur <= 0:
+            result.append(current)
+    return result
+
+def simplify_ring(points, precision=MAP_PRECISION):
+    """Closed GeoJSON ring from polygon vertices: snapped to precision, duplicate and collinear vertices dropped"""
+    snapped = []
+    for x, y in points:
+        point = (round(x, precision), round(y, precision))
+        if not snapped or point != snapped[-1]:
+            snapped.append(point)
+    if len(snapped) > 1 and snapped[0] == snapped[-1]:
+        snapped.pop()
+    ring = []
+    for i, (x, y) in enumerate(snapped):
+        (px, py), (nx, ny) = snapped[i - 1], snapped[(i + 1) % len(snapped)]
+        if abs((x - px) * (ny - y) - (y - py) * (nx - x)) > 10 ** (-2 * precision):
+            ring.append([x, y])
+    return ring + ring[:1]
+
+class StationMap:
+    """
+    Map layers for every EnvAlert station: Voronoi cells clipped to MP_BBOX (GeoJSON features) and an
+    inverse-distance-weighted AQI grid. Geometry and IDW weights are built once; when station values
+    change only the affected features and weight columns are updated, and the serialized response is
+    reused (same ETag) for as long as no station AQI moves.
+    """
+
+    def __init__(self, coordinates, bbox=MP_BBOX, step=MAP_GRID_STEP, power=MAP_IDW_POWER):
+        self.station_ids = sorted(coordinates)
+        self.index = {sid: i for i, sid in enumerate(self.station_ids)}
+        self.bbox = bbox
+        self.step = step
+        # Distances in degrees with longitudes scaled by cos(latitude), as in StationGrid
+        self.scale = math.cos(math.radians((bbox[1] + bbox[3]) / 2))
+        points = np.array([coordinates[sid] for sid in self.station_ids], dtype=np.float64)
+        self.features = self._voronoi_features(points)
+
+        west, south, east, north = bbox
+        self.cols = int(math.ceil(round((east - west) / step, 6)))
+        self.rows = int(math.ceil(round((north - south) / step, 6)))
+        # Cell centres, row 0 at the north edge
+        lats = north - (np.arange(self.rows) + 0.5) * step
+        lons = west + (np.arange(self.cols) + 0.5) * step
+        grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+        distances = np.hypot(grid_lat.reshape(-1, 1) - points[:, 0], (grid_lon.reshape(-1, 1) - points[:, 1]) * self.scale)
+        self.weights = 1.0 / np.maximum(distances, step / 100) ** power
+
+        self.aqi = np.full(len(self.station_ids), np.nan)
+        self._numerator = np.zeros(len(self.weights))
+        self._denominator = np.zeros(len(self.weights))
+        self._source = None
+        self._entry = None
+        # Held by the one thread refreshing the layers; everything but _entry is only touched under it
+        self._refresh_lock = threading.Lock()
+
+    def _voronoi_features(self, points):
+        west, south, east, north = self.bbox
+        scaled = [(lon * self.scale, lat) for lat, lon in points]
+        box = [(west * self.scale, south), (east * self.scale, south), (east * self.scale, north), (west * self.scale, north)]
+        city_of = {sid: city for city, ids in CITY_STATIONS.items() for sid in ids}
+        features = []
+        for i, (x, y) in enumerate(scaled):
+            cell = box
+            for j, (ox, oy) in enumerate(scaled):
+                if j == i or (ox, oy) == (x, y):
+                    continue
+                # Closer to station i than to station j: 2 (p_j - p_i) . p <= |p_j|^2 - |p_i|^2
+                cell = clip_half_plane(cell, (2 * (ox - x), 2 * (oy - y)), ox * ox + oy * oy - x * x - y * y)
+            station_id = self.station_ids[i]
+            lat, lon = points[i]
+            features.append({
+                "type": "Feature",
+                "id": station_id,
+                "geometry": {"type": "Polygon", "coordinates": [simplify_ring([(cx / self.scale, cy) for cx, cy in cell])]},
+                "properties": {"city": city_of.get(station_id), "lat": float(lat), "lon": float(lon),
+                               "aqi": None, "category": None},
+            })
+        return features
+
+    def _current_aqi(self):
+        """(station AQI vector, source key); the key is the poller snapshot version when it is running"""
+        if station_poller.running:
+            snapshot = station_poller.snapshot
+            if self._source == ("snapshot", snapshot.version):
+                return self.aqi, self._source
+            aqi = np.full(len(self.station_ids), np.nan)
+            for row in snapshot.fresh_rows(self.station_ids, station_poller.max_age):
+                payload = snapshot.payloads[row]
+                station = payload[0] if isinstance(payload, list) else payload
+                station_id = snapshot.station_ids[row]
+                if station_id in self.index:
+                    aqi[self.index[station_id]] = station_aqi(station)
+            return np.round(aqi), ("snapshot", snapshot.version)
+        stations, _, _ = upstream_client.run(afetch_stations(self.station_ids))
+        aqi = np.array([station_aqi(stations[sid]) if sid in stations else np.nan for sid in self.station_ids])
+        return np.round(aqi), ("live", time.time())
+
+    def _apply(self, aqi):
+        """Fold changed station values into the features and the IDW sums; True when anything changed"""
+        changed = np.flatnonzero(~((aqi == self.aqi) | (np.isnan(aqi) & np.isnan(self.aqi))))
+        if not len(changed):
+            return False
+        valid = ~np.isnan(aqi)
+        if len(changed) > len(aqi) // 2:
+            self._numerator = self.weights @ np.where(valid, aqi, 0)
+            self._denominator = self.weights @ valid.astype(np.float64)
+        else:
+            delta = np.nan_to_num(aqi[changed]) - np.nan_to_num(self.aqi[changed])
+            delta_valid = valid[changed].astype(np.float64) - (~np.isnan(self.aqi[changed]))
+            self._numerator += self.weights[:, changed] @ delta
+            self._denominator += self.weights[:, changed] @ delta_valid
+        codes = aqi_category_codes(aqi[changed])
+        for i, code in zip(changed.tolist(), np.atleast_1d(codes).tolist()):
+            properties = self.features[i]["properties"]
+            properties["aqi"] = None if np.isnan(aqi[i]) else int(aqi[i])
+            properties["category"] = None if np.isnan(aqi[i]) else CATEGORY_NAMES[code]
+        self.aqi = aqi
+        return True
+
+    def grid(self):
+        """IDW AQI per cell, rounded to integers, None everywhere when no station has a reading"""
+        if np.isnan(self.aqi).all():
+            return [None] * len(self.weights)
+        return np.rint(self._numerator / self._denominator).astype(int).tolist()
+
+    def payload(self):
+        west, south, east, north = self.bbox
+        return {
+            "type": "FeatureCollection",
+            "features": self.features,
+            "grid": {"bbox": [west, south, east, north], "step": self.step, "rows": self.rows, "cols": self.cols,
+                     "aqi": self.grid()},
+            "stations_with_data": int(np.count_nonzero(~np.isnan(self.aqi))),
+            "updated_at": datetime.now(IST).isoformat(timespec="seconds"),
+        }
+
+    def response_entry(self):
+        """
+        CachedResponse of the current layers; rebuilt only when a station's AQI changed.
+        Single-flight: while one thread fetches readings and rebuilds, the others get the previous
+        entry rather than waiting on the upstream; only the very first build is waited for.
+        """
+        first = self._entry is None
+        if not self._refresh_lock.acquire(blocking=first):
+            return self._entry
+        try:
+            if first and self._entry is not None:
+                return self._entry
+            aqi, source = self._current_aqi()
+            expires_at = time.time() + (station_poller.interval if station_poller.running else STATION_CACHE_TTL)
+            if self._apply(aqi) or self._entry is None:
+                with span("serialize"):
+                    body = app.json.dumps(self.payload()).encode("utf-8")
+                self._entry = make_cached_response(body, expires_at)
+            elif source != self._source:
+                self._entry = self._entry._replace(expires_at=expires_at)
+            self._source = source
+            return self._entry
+        finally:
+            self._refresh_lock.release()
+
+# Only built where /api/map is registered
+station_map = StationMap(STATION_COORDINATES) if SERVES_PROXY else None
+
+def finite_window(series):
+    """True when a pollutant series holds the 72 finite hours the model needs (None counts as missing)"""
+    return len(series) >= 72 and bool(np.isfinite(np.asarray(series[-72:], dtype=np.float64)).all())
+
+async def acollect_forecast_inputs(city_name):
+    """
+    Fetch everything the forecast needs for a city, concurrently on the upstream event loop.
+    Returns (inputs, None) on success or (None, (error payload, status code)).
+    inputs["degraded"] lists the sources whose fetch failed (pollutants without a complete 72-hour window,
+    "weather" when the latest row has gaps, "envalert" when a mapped city got no readings); the forecast
+    is still built without them but shouldn't be cached.
+    """
+    async def locate_and_fetch():
+        lat, lon = await aget_city_coordinates(city_name)
+        if not lat or not lon:
+            return None
+        weather_data, pollutant_series = await asyncio.gather(
+            afetch_weather_series(lat, lon), afetch_pollutant_batch(lat, lon)
+        )
+        return lat, lon, weather_data, pollutant_series
+
+    # EnvAlert is keyed by city name alone, so it runs alongside geocoding
+    located, envalert_today_data = await asyncio.gather(
+        locate_and_fetch(), aget_today_data_from_envalert(city_name)
+    )
+    if located is None:
+        return None, ({"error": "Invalid city"}, 400)
+
+    lat, lon, weather_data, pollutant_results = located
+    if not len(weather_data):
+        return None, ({"error": "Weather fetch failed"}, 400)
+
+    # A null or uncovered hour makes the model skip the pollutant, the same as a failed fetch
+    degraded = [p for p, (series, _) in pollutant_results.items() if not finite_window(series)]
+    if not np.isfinite(np.asarray(weather_data[-1][:9], dtype=np.float64)).all():
+        degraded.append("weather")
+    if envalert_today_data is None and any(normalize_city(c) == normalize_city(city_name) for c in CITY_STATIONS):
+        degraded.append("envalert")
+    if degraded:
+        logger.info("Forecast inputs for %s are missing %s", city_name, ", ".join(degraded))
+
+    return {
+        "city": city_name,
+        "lat": lat,
+        "lon": lon,
+        "weather_data": weather_data,
+        "envalert_today_data": envalert_today_data,
+        "pollutant_series": pollutant_results,
+        "degraded": degraded
+    }, None
+
+@timed("collect_inputs")
+def collect_forecast_inputs(city_name):
+    return upstream_client.run(acollect_forecast_inputs(city_name))
+
+def build_forecast(city_name):
+    """Run the full forecast pipeline for a city; returns (payload, status code, degraded)"""
+    inputs, failure = collect_forecast_inputs(city_name)
+    if failure:
+        return failure
+    # One rollout per pollutant, shared by the today and tomorrow-onwards views
+    rollouts = forecast_rollouts(inputs["pollutant_series"], inputs["weather_data"])
+    return assemble_forecast(inputs, rollouts), 200, bool(inputs["degraded"])
+
+POLLUTANT_ROW = {p: i for i, p in enumerate(TARGET_POLLUTANTS)}
+# Only PM2.5 and PM10 take today's value from EnvAlert
+API_POLLUTANTS = ("pm2_5", "pm10")
+NON_OZONE = np.array([p != "o3" for p in TARGET_POLLUTANTS])
+
+def round2(values):
+    """round(v, 2) elementwise; np.round scales by 100 first and can pick the other side of a tie"""
+    return np.array([round(v, 2) for v in values.tolist()])
+
+def model_forecast_matrix(pollutant_series, rollouts, now):
+    """
+    Daily model forecasts for every pollutant as (pollutant x day) arrays, the columnar form of predict_pollutant:
+    values (rounded) and raw AQI of each day's rollout value averaged with the previous day's last 23 hours.
+    Rows without a usable rollout or previous-day history are NaN and False in the returned mask.
+    """
+    preds = np.full((len(TARGET_POLLUTANTS), FORECAST_DAYS), np.nan)
+    sums = np.zeros(len(TARGET_POLLUTANTS))
+    counts = np.zeros(len(TARGET_POLLUTANTS))
+    available = np.zeros(len(TARGET_POLLUTANTS), dtype=bool)
+    for row, pollutant in enumerate(TARGET_POLLUTANTS):
+        data, timestamps = pollutant_series.get(pollutant, ([], []))
+        rollout = rollouts.get(pollutant)
+        if rollout is None or len(data) < 72:
+            continue
+        index = timestamps if isinstance(timestamps, HourIndex) else HourIndex(timestamps)
+        prev_hour_index = index.previous_day_hour(now)
+        if prev_hour_index is None:
+            logger.info("No previous day data found for %s", now.date() - timedelta(days=1))
+            continue
+        # Previous 23 hours from the previous day, ending at the current hour of that day
+        last_23_hours = np.asarray(data[max(prev_hour_index - 23, 0):prev_hour_index], dtype=np.float64)
+        if np.isnan(last_23_hours).any():
+            logger.info("Missing previous day history for %s", pollutant)
+            continue
+        preds[row] = rollout[:FORECAST_DAYS]
+        sums[row] = sum(last_23_hours.tolist())
+        counts[row] = len(last_23_hours)
+        available[row] = True
+
+    daily_average = (sums[:, None] + preds) / (counts[:, None] + 1)
+    return round2(preds.ravel()).reshape(preds.shape), aqi_sub_indices(daily_average), available
+
+@timed("assemble")
+def assemble_forecast(inputs, rollouts, now=None):
+    """
+    Turn fetched inputs and model rollouts into the /predict payload.
+    Every step works on (pollutant x day) arrays: values, AQI, category codes and a mask of filled days.
+    now (an aware datetime, default the current time) is the issue time; the backtest replays past ones.
+    """
+    city_name = inputs["city"]
+    lat, lon = inputs["lat"], inputs["lon"]
+    envalert_today_data = inputs["envalert_today_data"]
+    use_api_data = envalert_today_data is not None
+
+    logger.debug("Forecast for %s: EnvAlert for today's PM2.5/PM10 (%s), model predictions for the rest",
+                 city_name, "available" if use_api_data else "unavailable")
+
+    now_ist = now or datetime.now(IST)
+    now_utc = now_ist.astimezone(UTC).replace(tzinfo=None)
+    model_values, model_aqi, has_model = model_forecast_matrix(inputs["pollutant_series"], rollouts, now_ist)
+
+    shape = model_values.shape
+    values = np.full(shape, np.nan)
+    aqi = np.zeros(shape)
+    codes = np.full(shape, OUT_OF_RANGE)
+    filled = np.zeros(shape, dtype=bool)
+    model_predictions_for_error = {}
+    api_today = {p: use_api_data and p in API_POLLUTANTS and p in envalert_today_data for p in TARGET_POLLUTANTS}
+
+    for row, pollutant in enumerate(TARGET_POLLUTANTS):
+        # Model day i sits in column i, or i + 1 when today comes from EnvAlert
+        first = 1 if api_today[pollutant] else 0
+        if api_today[pollutant]:
+            api_data = envalert_today_data[pollutant]
+            values[row, 0] = round(api_data['value'], 2)
+            aqi[row, 0] = int(api_data['aqi'])
+            codes[row, 0] = aqi_category_codes(api_data['aqi'])
+            filled[row, 0] = True
+            if has_model[row]:
+                # The model's own today forecast, for the bias correction
+                model_predictions_for_error[pollutant] = {
+                    "value": float(model_values[row, 0]),
+                    "aqi": 0 if np.isnan(model_aqi[row, 0]) else int(model_aqi[row, 0])
+                }
+        if has_model[row]:
+            values[row, first:] = model_values[row, :FORECAST_DAYS - first]
+            raw = model_aqi[row, :FORECAST_DAYS - first]
+            aqi[row, first:] = np.nan_to_num(raw, nan=0)
+            codes[row, first:] = aqi_category_codes(raw)
+            filled[row, first:] = True
+
+    # Calculate errors (avg of all stations - predicted by model)
+    errors = calculate_errors(envalert_today_data, model_predictions_for_error)
+
+    def set_values(row, days, new_values, aqi_values):
+        values[row, days] = round2(new_values)
+        aqi[row, days] = np.nan_to_num(aqi_sub_index_array(aqi_values, TARGET_POLLUTANTS[row]), nan=0)
+        codes[row, days] = aqi_category_codes(aqi[row, days])
+
+    # PM10 model predictions exclude PM2.5, so add it; EnvAlert's PM10 (day 0 only) already includes it
+    pm25, pm10 = POLLUTANT_ROW["pm2_5"], POLLUTANT_ROW["pm10"]
+    combine = filled[pm10] & filled[pm25]
+    if api_today["pm10"] and api_today["pm2_5"]:
+        combine[0] = False
+    if combine.any():
+        combined = values[pm10, combine] + values[pm25, combine]
+        set_values(pm10, combine, combined, combined)
+
+    # Shift days 1-6 of PM2.5 and PM10 by today's EnvAlert-minus-model error
+    for pollutant in API_POLLUTANTS:
+        error = errors.get(f"{pollutant}_concentration")
+        row = POLLUTANT_ROW[pollutant]
+        days = filled[row].copy()
+        days[0] = False
+        if error is not None and days.any():
+            adjusted = round2(values[row, days] + error)
+            set_values(row, days, adjusted, adjusted)
+
+    day_labels = ["Today", "Tomorrow"] + [(now_utc + timedelta(days=i)).strftime("%d %b") for i in range(2, FORECAST_DAYS)]
+    dates = [(now_utc + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(FORECAST_DAYS)]
+    value_list, aqi_list, code_list = values.tolist(), aqi.astype(int).tolist(), codes.tolist()
+
+    def entry(row, day):
+        code = code_list[row][day]
+        return {
+            "day": day_labels[day],
+            "date": dates[day],
+            "value": value_list[row][day],
+            "aqi": aqi_list[row][day],
+            "category": CATEGORY_NAMES[code],
+            "warning": CATEGORY_WARNINGS[code],
+            "color": CATEGORY_COLORS[code]
+        }
+
+    result = {
+        pollutant: [entry(row, day) for day in range(FORECAST_DAYS) if filled[row, day]]
+        for row, pollutant in enumerate(TARGET_POLLUTANTS)
+    }
+    today_pollutants = [
+        {**result[pollutant][0], "pollutant": pollutant}
+        for row, pollutant in enumerate(TARGET_POLLUTANTS) if filled[row, 0]
+    ]
+
+    # Dominant pollutant per day: highest AQI ignoring ozone (first in TARGET_POLLUTANTS order on ties),
+    # ozone only when nothing else was forecast that day
+    candidates = np.where(filled & NON_OZONE[:, None], aqi, -np.inf)
+    dominant = np.where(np.isfinite(candidates.max(axis=0)), candidates.argmax(axis=0), POLLUTANT_ROW["o3"])
+    overall_daily_aqi = []
+    for day in np.flatnonzero(filled.any(axis=0)).tolist():
+        row = int(dominant[day])
+        main = entry(row, day)
+        overall_daily_aqi.append({
+            "day": main["day"],
+            "date": main["date"],
+            "main_pollutant": TARGET_POLLUTANTS[row],
+            **{key: main[key] for key in ("value", "aqi", "category", "warning", "color")}
+        })
+
+    return {
+        "city": city_name,
+        "predictions": result,
+        "today_pollutants": today_pollutants,
+        "overall_daily_aqi": overall_daily_aqi,
+        "errors": errors,
+        "lat": lat,
+        "lon": lon,
+        "data_source": {
+            p: "EnvAlert API (today)" if api_today.get(p) else "Model Predictions"
+            for p in ("pm2_5", "pm10", "co", "no2", "o3", "so2")
+        }
+    }
+
+class ForecastPrecomputer:
+    """
+    Refreshes /predict and /weather responses for every CITY_STATIONS city shortly after each IST hour,
+    so mapped cities are served from the response cache. Unmapped cities are still computed on demand.
+    weather=False leaves /weather out, for processes that don't serve it.
+    """
+
+    def __init__(self, cities, delay=120, max_workers=4, grace=900, weather=True):
+        self.cities = list(cities)
+        self.weather = weather
+        self.delay = delay
+        self.max_workers = max_workers
+        # Entries outlive their hour by this much so they can be served until the next refresh lands
+        self.grace = grace
+        self.last_run = None
+        self._normalized = {normalize_city(c) for c in self.cities}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def covers(self, city_name):
+        return self._thread is not None and normalize_city(city_name) in self._normalized
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="forecast-precompute", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_all()
+            except Exception:
+                logger.exception("Forecast precompute failed")
+            next_run = current_hour_bucket() + 3600 + self.delay
+            self._stop.wait(max(next_run - time.time(), 1))
+
+    async def _collect(self, city_name, semaphore):
+        async with semaphore:
+            inputs = None
+            try:
+                inputs, failure = await acollect_forecast_inputs(city_name)
+                if failure:
+                    logger.info("Precompute skipped %s: %s", city_name, failure[0].get('error'))
+            except Exception as e:
+                logger.warning("Precompute fetch failed for %s: %s", city_name, e)
+            if not self.weather:
+                return inputs, (None, None)
+            try:
+                weather = await abuild_weather_forecast(city_name)
+            except Exception as e:
+                logger.warning("Precompute weather failed for %s: %s", city_name, e)
+                weather = (None, 500)
+            return inputs, weather
+
+    async def _collect_all(self):
+        semaphore = asyncio.Semaphore(self.max_workers)
+        return await asyncio.gather(*(self._collect(city_name, semaphore) for city_name in self.cities))
+
+    def refresh_all(self):
+        """Fetch inputs for all cities with bounded concurrency, then run one batched inference per pollutant"""
+        start = time.time()
+        hour_bucket = current_hour_bucket()
+        expires_at = hour_bucket + 3600 + self.grace
+
+        results = upstream_client.run(self._collect_all(), timeout=600)
+        collected = [inputs for inputs, _ in results]
+        weather = [weather for _, weather in results]
+
+        inputs_list = [inputs for inputs in collected if inputs]
+        degraded = 0
+        for inputs, rollouts in zip(inputs_list, batched_forecast_rollouts(inputs_list)):
+            if inputs["degraded"]:
+                # Leave the last good forecast in place until it expires; requests after that retry the upstreams
+                degraded += 1
+                continue
+            key = ResponseCache.make_key("predict", inputs["city"], hour_bucket)
+            entry = response_cache.put(key, assemble_forecast(inputs, rollouts), expires_at)
+            live_updates.forecast_updated(inputs["city"], entry)
+
+        for city_name, (payload, status) in zip(self.cities, weather):
+            if status == 200:
+                response_cache.put(ResponseCache.make_key("weather", city_name, hour_bucket), payload, expires_at)
+
+        self.last_run = start
+        logger.info("Precomputed forecasts for %d/%d cities in %.1fs (%d left uncached with missing inputs)",
+                    len(inputs_list) - degraded, len(self.cities), time.time() - start, degraded)
+
+forecast_precomputer = ForecastPrecomputer(
+    CITY_STATIONS.keys(),
+    max_workers=int(os.environ.get("PRECOMPUTE_WORKERS", 4)),
+    weather=SERVES_PROXY
+)
+
+# Separate listener for Server-Sent Events (0 disables it); gthread workers would tie up a thread per subscriber
+SSE_PORT = int(os.environ.get("SSE_PORT", 0))
+SSE_HEARTBEAT = 25
+# Frames a subscriber may fall behind before it is disconnected and has to reconnect
+SSE_QUEUE_SIZE = 32
+SSE_PING = b": ping\n\n"
+
+def sse_frame(event, data):
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n".encode("utf-8")
+
+def nan_to_none(value):
+    return None if np.isnan(value) else float(value)
+
+class LiveUpdates:
+    """
+    Server-Sent Events for mapped cities' forecasts and station readings, served by aiohttp on the upstream
+    event loop. The forecast precomputer and the station poller publish from their threads; each event is
+    serialized once and queued for every subscriber of its topic, and only changes are pushed. An idle
+    subscriber is a parked coroutine and a socket, so thousands of them cost almost nothing.
+    """
+
+    def __init__(self):
+        self.port = None
+        self._topics = {}
+        self._states = {}
+        self._forecasts = {}
+        self._subscribers = set()
+
+    @property
+    def running(self):
+        return self.port is not None
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def start(self, port):
+        upstream_client.run(self._serve(port))
+        self.port = port
+        logger.info("Live updates listening on port %d", port)
+
+    async def _serve(self, port):
+        web_app = web.Application()
+        web_app.router.add_get("/api/subscribe", self.subscribe)
+        runner = web.AppRunner(web_app, access_log=None)
+        await runner.setup()
+        # Every preforked worker binds the same port and the kernel spreads connections between them
+        await web.TCPSite(runner, "0.0.0.0", port, reuse_port=hasattr(socket, "SO_REUSEPORT")).start()
+        asyncio.get_running_loop().create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        # One timer for all subscribers; keeps proxies from closing idle streams and finds dead sockets
+        while True:
+            await asyncio.sleep(SSE_HEARTBEAT)
+            for subscriber in list(self._subscribers):
+                self._push(subscriber, SSE_PING)
+
+    def _push(self, subscriber, frame):
+        try:
+            subscriber.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Too far behind: disconnect, the client reconnects and starts again from the latest state
+            while not subscriber.empty():
+                subscriber.get_nowait()
+            subscriber.put_nowait(None)
+
+    def _fan_out(self, topic, state_frame, frame):
+        self._states[topic] = state_frame
+        for subscriber in self._topics.get(topic, ()):
+            self._push(subscriber, frame)
+
+    def publish(self, topic, state_frame, frame):
+        """Record a topic's latest full state and push frame to its subscribers; callable from any thread"""
+        if self.running:
+            upstream_client.loop.call_soon_threadsafe(self._fan_out, topic, state_frame, frame)
+
+    def forecast_updated(self, city_name, entry):
+        """Push what changed in a city's precomputed forecast, as top-level keys of the compact format"""
+        if not self.running:
+            return
+        topic = ("city", normalize_city(city_name))
+        forecast = compact_forecast(json.loads(entry.body))
+        previous = self._forecasts.get(topic)
+        self._forecasts[topic] = forecast
+        if forecast == previous:
+            return
+        state = {"city": city_name, "etag": entry.etag, "forecast": forecast}
+        state_frame = sse_frame("forecast", state)
+        if previous is None:
+            self.publish(topic, state_frame, state_frame)
+            return
+        changed = {key: value for key, value in forecast.items() if previous.get(key) != value}
+        if "predictions" in changed:
+            changed["predictions"] = {
+                pollutant: column for pollutant, column in forecast["predictions"].items()
+                if previous["predictions"].get(pollutant) != column
+            }
+        self.publish(topic, state_frame, sse_frame("forecast-delta", {"city": city_name, "etag": entry.etag, "changed": changed}))
+
+    def stations_updated(self, previous, snapshot):
+        """Push the stations whose readings changed between two poller snapshots"""
+        if not self.running:
+            return
+
+        def unchanged(old, new):
+            return (old == new) | (np.isnan(old) & np.isnan(new))
+
+        same = unchanged(previous.values, snapshot.values) & unchanged(previous.sub_indices, snapshot.sub_indices)
+        for row, station_id in enumerate(snapshot.station_ids):
+            payload = snapshot.payloads[row]
+            if payload is None:
+                continue
+            aqi = station_aqi(payload[0] if isinstance(payload, list) else payload)
+            old_payload = previous.payloads[row]
+            old_aqi = station_aqi(old_payload[0] if isinstance(old_payload, list) else old_payload) if old_payload else np.nan
+            if same[row].all() and unchanged(old_aqi, aqi):
+                continue
+            pollutants = {
+                pollutant: [nan_to_none(snapshot.values[row, i]), nan_to_none(snapshot.sub_indices[row, i])]
+                for i, pollutant in enumerate(TARGET_POLLUTANTS)
+            }
+            header = {"id": station_id, "aqi": nan_to_none(aqi),
+                      "fetched_at": datetime.fromtimestamp(snapshot.fetched_at[row], IST).isoformat(timespec="seconds")}
+            state_frame = sse_frame("station", {**header, "pollutants": pollutants})
+            if old_payload is None:
+                frame = state_frame
+            else:
+                changed = {p: pollutants[p] for i, p in enumerate(TARGET_POLLUTANTS) if not same[row, i]}
+                frame = sse_frame("station-delta", {**header, "changed": changed})
+            self.publish(("station", station_id), state_frame, frame)
+
+    def _parse_topics(self, query):
+        """Topics for ?cities=Bhopal,Indore&stations=27,34, or (None, error message)"""
+        topics = []
+        for city_name in query.get("cities", "").split(","):
+            if not city_name.strip():
+                continue
+            if not forecast_precomputer.covers(city_name):
+                return None, f"No live forecast for {city_name.strip()}; only mapped cities are refreshed hourly"
+            topics.append(("city", normalize_city(city_name)))
+        try:
+            station_ids = [int(sid) for sid in query.get("stations", "").split(",") if sid.strip()]
+        except ValueError:
+            return None, "stations must be a comma-separated list of station IDs"
+        if len(station_ids) > MAX_BATCH_STATIONS:
+            return None, f"At most {MAX_BATCH_STATIONS} stations per subscription"
+        for station_id in station_ids:
+            if not station_poller.running or station_id not in station_poller.snapshot.rows:
+                return None, f"No live readings for station {station_id}"
+            topics.append(("station", station_id))
+        if not topics:
+            return None, "Subscribe to at least one of cities or stations"
+        return list(dict.fromkeys(topics)), None
+
+    async def subscribe(self, request):
+        """GET /api/subscribe?cities=..&stations=..: latest state of each topic, then changes as they happen"""
+        topics, error = self._parse_topics(request.query)
+        cors = {"Access-Control-Allow-Origin": "*"}
+        if error:
+            return web.json_response({"error": error}, status=400, headers=cors)
+
+        response = web.StreamResponse(headers={
+            **cors, "Content-Type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"
+        })
+        await response.prepare(request)
+        subscriber = asyncio.Queue(SSE_QUEUE_SIZE)
+        self._subscribers.add(subscriber)
+        for topic in topics:
+            self._topics.setdefault(topic, set()).add(subscriber)
+        try:
+            await response.write(b"retry: 5000\n\n" + b"".join(self._states.get(topic, b"") for topic in topics))
+            while True:
+                frame = await subscriber.get()
+                if frame is None:
+                    break
+                await response.write(frame)
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            for topic in topics:
+                subscribers = self._topics.get(topic)
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._topics[topic]
+        return response
+
+live_updates = LiveUpdates()
+
+@role_route(SERVES_FORECASTS, '/predict', methods=['POST', 'OPTIONS'])
 def predict():
     if request.method == 'OPTIONS':
         return jsonify({"status": "OK"}), 200
@@ -471,183 +3146,183 @@ def predict():
             return jsonify({"error": "No JSON data provided"}), 400
         
         city_name = request.json.get("city")
-        lat, lon = get_city_coordinates(city_name)
-        if not lat or not lon:
-            return jsonify({"error": "Invalid city"}), 400
+        return cached_json_response("predict", city_name, lambda: build_forecast(city_name))
 
-        weather_data = fetch_weather_series(lat, lon)
-        if not weather_data:
-            return jsonify({"error": "Weather fetch failed"}), 400
+    except Exception:
+        logger.exception("Error in /predict")
+        return jsonify({"error": "Internal Server Error"}), 500
 
-        # Try to get today's data from EnvAlert API
-        envalert_today_data = get_today_data_from_envalert(city_name)
-        
-        result = {}
-        model_predictions_for_error = {}  # Store model predictions for error calculation
-        today_pollutants = []
-        # Only use API data for PM2.5 and PM10
-        api_pollutants = ["pm2_5", "pm10"]
-        use_api_data = envalert_today_data is not None
-
-        print(f"\n{'='*60}")
-        print(f"Using EnvAlert API for PM2.5 and PM10 (today)")
-        print(f"Using Model Predictions for CO, NO2, O3, SO2 (all days)")
-        print(f"{'='*60}\n")
-
-        # Fetch pollutant data for all pollutants in parallel
-        def fetch_pollutant_data(pollutant):
-            return pollutant, fetch_pollutant_series(lat, lon, pollutant)
-        
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            pollutant_results = dict(executor.map(lambda p: fetch_pollutant_data(p), TARGET_POLLUTANTS))
+MAX_BULK_CITIES = int(os.environ.get("MAX_BULK_CITIES", 64))
+BULK_FETCH_CONCURRENCY = int(os.environ.get("BULK_FETCH_CONCURRENCY", 16))
+BULK_TIMEOUT = 120
+BULK_WAVE_WINDOW = 0.025
 
-        for pollutant in TARGET_POLLUTANTS:
-            pol_data, ts_series = pollutant_results.get(pollutant, ([], []))
-            
-            # Only use API data for PM2.5 and PM10 for today
-            if use_api_data and pollutant in api_pollutants and pollutant in envalert_today_data:
-                # Get model prediction for today for error calculation
-                model_pred_today = predict_pollutant(pollutant, pol_data, weather_data, ts_series, start_day=0)
-                if model_pred_today:
-                    model_predictions_for_error[pollutant] = model_pred_today[0]
-                
-                # Use EnvAlert API data for today (PM2.5 and PM10 only)
-                api_data = envalert_today_data[pollutant]
-                api_value = api_data['value']
-                api_aqi = api_data['aqi']
-                
-                category, warning, color = get_category_info(api_aqi)
-                
-                today_data = {
-                    "day": "Today",
-                    "date": datetime.utcnow().strftime("%Y-%m-%d"),
-                    "value": round(api_value, 2),
-                    "aqi": int(api_aqi),
-                    "category": category,
-                    "warning": warning,
-                    "color": color
-                }
-                
-                # Get predictions for tomorrow onwards (start_day=1)
-                future_predictions = predict_pollutant(pollutant, pol_data, weather_data, ts_series, start_day=1)
-                result[pollutant] = [today_data] + future_predictions
-            else:
-                # Use model predictions for all days including today (CO, NO2, O3, SO2)
-                prediction = predict_pollutant(pollutant, pol_data, weather_data, ts_series, start_day=0)
-                result[pollutant] = prediction
-
-        # Calculate errors (avg of all stations - predicted by model)
-        errors = calculate_errors(envalert_today_data, model_predictions_for_error)
-
-        # Adjust pm10 values by adding pm2_5 values (only for model predictions, not API data)
-        pm10_preds = result.get("pm10", [])
-        pm25_preds = result.get("pm2_5", [])
-        if pm10_preds and pm25_preds:
-            for i in range(min(len(pm10_preds), len(pm25_preds))):
-                # For EnvAlert API data (day 0 only), PM10 already includes PM2.5
-                # Only add PM2.5 to PM10 if using model predictions
-                if not (use_api_data and i == 0 and "pm10" in envalert_today_data and "pm2_5" in envalert_today_data):
-                    combined_value = pm10_preds[i]["value"] + pm25_preds[i]["value"]
-                    pm10_preds[i]["value"] = round(combined_value, 2)
-                    new_aqi = get_aqi_sub_index(combined_value, "pm10")
-                    pm10_preds[i]["aqi"] = int(new_aqi) if not pd.isna(new_aqi) else 0
-                    category, warning, color = get_category_info(pm10_preds[i]["aqi"])
-                    pm10_preds[i]["category"] = category
-                    pm10_preds[i]["warning"] = warning
-                    pm10_preds[i]["color"] = color
-
-        # Add errors to future predictions (days 1-6) for PM2.5 and PM10
-        if errors:
-            # Add PM2.5 concentration error to future predictions
-            if "pm2_5_concentration" in errors and "pm2_5" in result:
-                for i in range(1, len(result["pm2_5"])):
-                    result["pm2_5"][i]["value"] = round(result["pm2_5"][i]["value"] + errors["pm2_5_concentration"], 2)
-                    # Recalculate AQI based on adjusted concentration
-                    new_aqi = get_aqi_sub_index(result["pm2_5"][i]["value"], "pm2_5")
-                    result["pm2_5"][i]["aqi"] = int(new_aqi) if not pd.isna(new_aqi) else 0
-                    category, warning, color = get_category_info(result["pm2_5"][i]["aqi"])
-                    result["pm2_5"][i]["category"] = category
-                    result["pm2_5"][i]["warning"] = warning
-                    result["pm2_5"][i]["color"] = color
-            
-            # Add PM10 concentration error to future predictions
-            if "pm10_concentration" in errors and "pm10" in result:
-                for i in range(1, len(result["pm10"])):
-                    result["pm10"][i]["value"] = round(result["pm10"][i]["value"] + errors["pm10_concentration"], 2)
-                    # Recalculate AQI based on adjusted concentration
-                    new_aqi = get_aqi_sub_index(result["pm10"][i]["value"], "pm10")
-                    result["pm10"][i]["aqi"] = int(new_aqi) if not pd.isna(new_aqi) else 0
-                    category, warning, color = get_category_info(result["pm10"][i]["aqi"])
-                    result["pm10"][i]["category"] = category
-                    result["pm10"][i]["warning"] = warning
-                    result["pm10"][i]["color"] = color
-
-
-        # Prepare today's pollutants list
-        for pollutant in TARGET_POLLUTANTS:
-            prediction = result.get(pollutant, [])
-            if prediction:
-                today_data = prediction[0].copy()
-                today_data["pollutant"] = pollutant
-                today_pollutants.append(today_data)
-
-        # Calculate overall_daily_aqi ignoring ozone ('o3')
-        overall_daily_aqi = []
-        for i in range(7):
-            daily_values = []
-            for p in TARGET_POLLUTANTS:
-                pollutant_data = result.get(p, [])
-                if len(pollutant_data) > i:
-                    daily_values.append({
-                        "pollutant": p,
-                        "aqi": pollutant_data[i]["aqi"],
-                        "value": pollutant_data[i]["value"],
-                        "category": pollutant_data[i]["category"],
-                        "warning": pollutant_data[i]["warning"],
-                        "color": pollutant_data[i]["color"]
-                    })
-            if daily_values:
-                daily_values_sorted = sorted(daily_values, key=lambda x: x["aqi"], reverse=True)
-                if daily_values_sorted[0]["pollutant"] == "o3" and len(daily_values_sorted) > 1:
-                    highest = daily_values_sorted[1]
+async def acollect_bulk_inputs(cities, results):
+    """Collect forecast inputs for many cities, putting (city, inputs, failure) on results as each one finishes"""
+    semaphore = asyncio.Semaphore(BULK_FETCH_CONCURRENCY)
+
+    async def collect(city_name):
+        try:
+            async with semaphore:
+                inputs, failure = await acollect_forecast_inputs(city_name)
+        except Exception as e:
+            logger.warning("Bulk fetch failed for %s: %s", city_name, e)
+            inputs, failure = None, ({"error": "Forecast inputs unavailable"}, 502)
+        results.put((city_name, inputs, failure))
+
+    await asyncio.gather(*(collect(city_name) for city_name in cities))
+
+def bulk_line(city_name, status, body):
+    """One NDJSON line; body is the already serialized forecast or error object"""
+    return b'{"city":' + app.json.dumps(city_name).encode("utf-8") + b',"status":%d,"forecast":' % status + body + b'}\n'
+
+def bulk_error_line(city_name, payload, status):
+    return bulk_line(city_name, status, app.json.dumps(payload).encode("utf-8"))
+
+def bulk_forecast_lines(cities):
+    """
+    Yield one NDJSON line per city: cached forecasts straight away, then the rest as their inputs arrive.
+    Fetches run concurrently on the upstream loop (sharing the upstream cache, so cities with the same
+    coordinates or stations hit each upstream once); each wave of cities that finish fetching together
+    shares one batched_forecast_rollouts call, and fresh forecasts go into the response cache for /predict.
+    """
+    hour_bucket = current_hour_bucket()
+    pending = []
+    for city_name in cities:
+        entry = response_cache.get(ResponseCache.make_key("predict", city_name, hour_bucket))
+        if entry is None and forecast_precomputer.covers(city_name):
+            entry = response_cache.get(ResponseCache.make_key("predict", city_name, hour_bucket - 3600))
+        if entry is not None:
+            yield bulk_line(city_name, 200, entry.body)
+        else:
+            pending.append(city_name)
+    if not pending:
+        return
+
+    results = queue.SimpleQueue()
+    future = upstream_client.submit(acollect_bulk_inputs(pending, results))
+    deadline = time.monotonic() + BULK_TIMEOUT
+    remaining = set(pending)
+    try:
+        while remaining:
+            try:
+                wave = [results.get(timeout=max(deadline - time.monotonic(), 0))]
+            except queue.Empty:
+                break
+            # Cities finishing within a few milliseconds of each other share one inference batch
+            wave_end = time.monotonic() + BULK_WAVE_WINDOW
+            while len(wave) < len(remaining):
+                try:
+                    wave.append(results.get(timeout=max(wave_end - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            ready = []
+            for city_name, inputs, failure in wave:
+                remaining.discard(city_name)
+                if failure:
+                    yield bulk_error_line(city_name, *failure)
                 else:
-                    highest = daily_values_sorted[0]
-                overall_daily_aqi.append({
-                    "day": result[TARGET_POLLUTANTS[0]][i]["day"],
-                    "date": result[TARGET_POLLUTANTS[0]][i]["date"],
-                    "main_pollutant": highest["pollutant"],
-                    "value": highest["value"],
-                    "aqi": highest["aqi"],
-                    "category": highest["category"],
-                    "warning": highest["warning"],
-                    "color": highest["color"]
-                })
-
-        response_data = {
-            "city": city_name,
-            "predictions": result,
-            "today_pollutants": today_pollutants,
-            "overall_daily_aqi": overall_daily_aqi,
-            "errors": errors,
-            "lat": lat,
-            "lon": lon,
-            "data_source": {
-                "pm2_5": "EnvAlert API (today)" if (use_api_data and "pm2_5" in envalert_today_data) else "Model Predictions",
-                "pm10": "EnvAlert API (today)" if (use_api_data and "pm10" in envalert_today_data) else "Model Predictions",
-                "co": "Model Predictions",
-                "no2": "Model Predictions",
-                "o3": "Model Predictions",
-                "so2": "Model Predictions"
-            }
-        }
-        
-        return jsonify(response_data)
+                    ready.append(inputs)
+            if not ready:
+                continue
 
-    except Exception as e:
-        print(f"Error in /predict: {e}", flush=True)
-        return jsonify({"error": "Internal Server Error"}), 500
+            for inputs, rollouts in zip(ready, batched_forecast_rollouts(ready)):
+                try:
+                    payload = assemble_forecast(inputs, rollouts)
+                    if inputs["degraded"]:
+                        entry = response_cache.serialize(payload, time.time())
+                    else:
+                        entry = response_cache.put(ResponseCache.make_key("predict", inputs["city"], hour_bucket), payload)
+                    yield bulk_line(inputs["city"], 200, entry.body)
+                except Exception:
+                    logger.exception("Bulk forecast failed for %s", inputs["city"])
+                    count_error("bulk")
+                    yield bulk_error_line(inputs["city"], {"error": "Internal Server Error"}, 500)
+
+        for city_name in pending:
+            if city_name in remaining:
+                yield bulk_error_line(city_name, {"error": "Timed out"}, 504)
+    finally:
+        # Client went away or the deadline passed: stop fetching for cities nobody will read
+        future.cancel()
+
+@role_route(SERVES_FORECASTS, '/predict/bulk', methods=['POST', 'OPTIONS'])
+def predict_bulk():
+    """
+    Forecasts for many cities in one call, streamed as NDJSON in completion order:
+    {"cities": ["Bhopal", "Indore"]} or {"cities": "all"} for every mapped city.
+    Each line is {"city", "status", "forecast"}, where forecast is the /predict payload or an error object.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({"status": "OK"}), 200
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "No JSON data provided"}), 400
+    cities = body.get("cities")
+    if cities == "all":
+        cities = list(CITY_STATIONS)
+    if not isinstance(cities, list) or not cities or not all(isinstance(c, str) and c.strip() for c in cities):
+        return jsonify({"error": "cities must be a list of city names or \"all\""}), 400
+    # Same city spelled differently is forecast once, under its first spelling
+    unique = {}
+    for city_name in cities:
+        unique.setdefault(normalize_city(city_name), city_name.strip())
+    cities = list(unique.values())
+    if len(cities) > MAX_BULK_CITIES:
+        return jsonify({"error": f"At most {MAX_BULK_CITIES} cities per request"}), 400
+
+    response = app.response_class(stream_with_context(bulk_forecast_lines(cities)), mimetype="application/x-ndjson")
+    # Let proxies pass lines through as they are produced
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+async def abuild_weather_forecast(city_name):
+    """Fetch the 4-day daily weather forecast for a city; returns (payload, status code)"""
+    lat, lon = await aget_city_coordinates(city_name)
+    if not lat or not lon:
+        return {"error": "City not found"}, 404
+
+    today = datetime.utcnow().date()
+    start_date = today.strftime("%Y-%m-%d")
+    end_date = (today + timedelta(days=3)).strftime("%Y-%m-%d")
+
+    url = (
+        f"{OPEN_METEO_FORECAST_URL}"
+        f"?latitude={lat}&longitude={lon}"
+        f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max"
+        f"&timezone=auto&start_date={start_date}&end_date={end_date}"
+    )
+
+    data = await upstream_cache.get_or_load(
+        "open-meteo-daily", lat, lon, "daily", lambda: upstream_client.fetch_json("GET", url)
+    )
+    daily = data.get("daily", {})
+
+    forecast = []
+    for i in range(len(daily.get("time", []))):
+        date_str = daily["time"][i]
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+        day = "Today" if i == 0 else "Tomorrow" if i == 1 else date_obj.strftime("%A")
+        forecast.append({
+            "date": date_str,
+            "day": day,
+            "max_temp": daily["temperature_2m_max"][i],
+            "min_temp": daily["temperature_2m_min"][i],
+            "precipitation_mm": daily["precipitation_sum"][i],
+            "max_wind_speed_kmh": daily["windspeed_10m_max"][i]
+        })
 
-@app.route('/weather', methods=['POST', 'OPTIONS'])
+    return {
+        "city": city_name,
+        "forecast": forecast
+    }, 200
+
+def build_weather_forecast(city_name):
+    return upstream_client.run(abuild_weather_forecast(city_name))
+
+@role_route(SERVES_PROXY, '/weather', methods=['POST', 'OPTIONS'])
 def weather_forecast():
     if request.method == 'OPTIONS':
         return jsonify({"status": "OK"}), 200
@@ -660,60 +3335,173 @@ def weather_forecast():
         if not city_name:
             return jsonify({"error": "City name required"}), 400
 
-        lat, lon = get_city_coordinates(city_name)
-        if not lat or not lon:
-            return jsonify({"error": "City not found"}), 404
-
-        today = datetime.utcnow().date()
-        start_date = today.strftime("%Y-%m-%d")
-        end_date = (today + timedelta(days=3)).strftime("%Y-%m-%d")
-
-        url = (
-            f"https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}"
-            f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max"
-            f"&timezone=auto&start_date={start_date}&end_date={end_date}"
-        )
-
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        daily = data.get("daily", {})
-
-        forecast = []
-        for i in range(len(daily.get("time", []))):
-            date_str = daily["time"][i]
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-            day = "Today" if i == 0 else "Tomorrow" if i == 1 else date_obj.strftime("%A")
-            forecast.append({
-                "date": date_str,
-                "day": day,
-                "max_temp": daily["temperature_2m_max"][i],
-                "min_temp": daily["temperature_2m_min"][i],
-                "precipitation_mm": daily["precipitation_sum"][i],
-                "max_wind_speed_kmh": daily["windspeed_10m_max"][i]
-            })
-
-        return jsonify({
-            "city": city_name,
-            "forecast": forecast
-        })
+        return cached_json_response("weather", city_name, lambda: build_weather_forecast(city_name))
 
-    except Exception as e:
-        print(f"Error in /weather: {e}", flush=True)
+    except Exception:
+        logger.exception("Error in /weather")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/station/<int:station_id>', methods=['GET'])
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the worker is up and answering"""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: models are loaded and warmed up, so /predict won't pay for it"""
+    ready = model_registry.warm or not preloads_models()
+    body = {
+        "ready": ready,
+        "role": AEROVISION_ROLE,
+        "models": model_registry.status(),
+        "station_poller": station_poller.running,
+        "precompute_last_run": forecast_precomputer.last_run,
+        "pid": os.getpid()
+    }
+    return jsonify(body), 200 if ready else 503
+
+def hit_ratio(stats):
+    # Requests that waited on another caller's in-flight load count as hits
+    hits = stats["hits"] + stats.get("coalesced", 0)
+    return hits / (hits + stats["misses"]) if hits + stats["misses"] else 0.0
+
+metrics.gauge(
+    "aerovision_cache_hit_ratio", "Hit ratio of the upstream and response caches since start",
+    lambda: {("upstream",): hit_ratio(upstream_cache.stats()), ("response",): hit_ratio(response_cache.stats())},
+    ("cache",)
+)
+metrics.gauge(
+    "aerovision_cache_lookups", "Cache lookups since start by cache and result",
+    lambda: {
+        (cache, result): stats[result]
+        for cache, stats in (("upstream", upstream_cache.stats()), ("response", response_cache.stats()))
+        for result in ("hits", "misses", "coalesced") if result in stats
+    },
+    ("cache", "result")
+)
+metrics.gauge("aerovision_live_subscribers", "Open Server-Sent Events connections", lambda: live_updates.subscribers)
+metrics.gauge("aerovision_models_warm", "1 once the forecast models are loaded and warmed up", lambda: int(model_registry.warm))
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """This worker's metrics in the Prometheus text format"""
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "upstream": upstream_cache.stats(),
+        "responses": response_cache.stats(),
+        "precompute_last_run": forecast_precomputer.last_run,
+        "station_snapshot_version": station_poller.snapshot.version
+    })
+
+@role_route(SERVES_PROXY, '/api/station/<int:station_id>', methods=['GET'])
 def proxy_station_aqi(station_id):
     try:
-        url = f"https://erc.mp.gov.in/EnvAlert/Wa-CityAQI?id={station_id}"
-        resp = requests.post(url, timeout=10)
-        data = resp.json()
+        cached = station_poller.lookup(station_id)
+        if cached is not None:
+            data, fetched_at = cached
+            response = jsonify(data)
+            response.headers["X-Data-Age"] = str(int(time.time() - fetched_at))
+            return response
+        data = upstream_client.run(afetch_station_payload(station_id))
         return jsonify(data)
     except Exception as e:
-        print(f"Error proxying station {station_id}: {e}", flush=True)
+        logger.warning("Error proxying station %s: %s", station_id, e)
+        return jsonify({"error": "Failed to fetch station data"}), 500
+
+@role_route(SERVES_PROXY, '/api/stations', methods=['GET'])
+def batch_station_aqi():
+    """
+    Current readings for many stations in one call: /api/stations?ids=27,34,10[&fields=aqi,pm25]
+    Stations that fail are listed under "errors" instead of failing the whole batch.
+    """
+    try:
+        station_ids = list(dict.fromkeys(int(sid) for sid in request.args.get("ids", "").split(",") if sid.strip()))
+    except ValueError:
+        return jsonify({"error": "ids must be a comma-separated list of station IDs"}), 400
+    if not station_ids:
+        return jsonify({"error": "No station IDs provided"}), 400
+    if len(station_ids) > MAX_BATCH_STATIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_STATIONS} stations per request"}), 400
+
+    try:
+        stations, errors, fetched_at = upstream_client.run(afetch_stations(station_ids))
+    except Exception:
+        logger.exception("Error fetching station batch %s", station_ids)
         return jsonify({"error": "Failed to fetch station data"}), 500
 
+    fields = [f for f in request.args.get("fields", "").split(",") if f]
+    if fields:
+        stations = {sid: {f: station.get(f) for f in fields} for sid, station in stations.items()}
+
+    return jsonify({
+        "stations": {str(sid): station for sid, station in stations.items()},
+        "errors": {str(sid): message for sid, message in errors.items()},
+        # Oldest reading in the batch, so clients can tell how stale the snapshot is
+        "fetched_at": datetime.fromtimestamp(fetched_at, IST).isoformat(timespec="seconds")
+    })
+
+@role_route(SERVES_PROXY, '/api/nearest-city', methods=['GET'])
+def nearest_city():
+    """Mapped city closest to /api/nearest-city?lat=..&lon=.., resolved offline from station coordinates"""
+    try:
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lon are required"}), 400
+    result = geocoding_index.nearest_mapped_city(lat, lon)
+    if result is None:
+        return jsonify({"error": "No mapped cities"}), 404
+    return jsonify(result)
+
+@role_route(SERVES_PROXY, '/api/map', methods=['GET'])
+def station_map_layers():
+    """
+    Voronoi cells of every EnvAlert station (GeoJSON FeatureCollection, current AQI in each feature's
+    properties) plus an IDW-interpolated AQI grid over Madhya Pradesh under "grid"
+    """
+    try:
+        return cached_response(station_map.response_entry())
+    except Exception:
+        logger.exception("Error building station map")
+        return jsonify({"error": "Failed to build station map"}), 500
+
+def preloads_models():
+    return SERVES_FORECASTS and os.environ.get("PRELOAD_MODELS", "1") == "1"
+
+def start_services(background=False):
+    """
+    Load the models and start the background pollers (the proxy role only runs the station poller).
+    Importing back starts nothing: `python back.py` calls this in the serving process, and
+    gunicorn.conf.py in each worker after the fork. Other servers should call it once per process.
+    background=True warms the models on a thread; /readyz reports when they are done.
+    """
+    # Load and warm up all models when the worker boots rather than on the first /predict
+    if preloads_models():
+        if background:
+            model_registry.preload_in_background()
+        else:
+            model_registry.preload()
+
+    # Push forecast and station changes to subscribers instead of having clients poll
+    if SSE_PORT and not live_updates.running:
+        live_updates.start(SSE_PORT)
+
+    # Keep every EnvAlert station's latest reading in memory
+    if os.environ.get("STATION_POLLER", "1") == "1":
+        station_poller.start()
+
+    # Refresh every mapped city's forecast in the background each hour
+    if SERVES_FORECASTS and os.environ.get("PRECOMPUTE_FORECASTS", "1") == "1":
+        forecast_precomputer.start()
+
 if __name__ == "__main__":
-    print("🚀 Flask server is starting...", flush=True)
+    logger.info("Flask server is starting...")
+    # The reloader runs this file in a watcher process and again in the serving child
+    # (WERKZEUG_RUN_MAIN=true); only the child loads models and polls
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_services()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""
+Replay past pollutant and weather data through the forecast pipeline and measure its accuracy.
+
+Usage:
+    python backtest.py --start 2025-01-01 --end 2025-12-31 [--cities Bhopal,Indore] [--hour 12]
+        [--workers N] [--model-dir DIR] [--backend keras|tflite] [--history-dir DIR] [--json] [--output FILE]
+
+For every city in CITY_STATIONS and every day in the range, a forecast is issued at --hour (IST) from the
+inputs /predict would have had: the 72 hours of pollutant data up to that hour and the last weather row of
+the previous UTC day. The inputs go through the serving code (batched_forecast_rollouts, then
+assemble_forecast with calculate_errors), and forecast day d is compared with the concentration observed
+at the first forecast hour plus 24 * d hours. Two variants are scored:
+
+    model      the payload /predict serves without EnvAlert data
+    corrected  PM2.5/PM10 days 1-6 of the payload served when EnvAlert has today's readings; the
+               observation at the issue hour stands in for EnvAlert
+
+History is downloaded once into the history store (HISTORY_DIR) and reused by later runs; cities are then
+scored in parallel worker processes, each running one batched rollout per pollutant over all its days.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FORMAT", "text")
+os.environ.update(AEROVISION_ROLE="forecast", INFERENCE_BATCH_WAIT_MS="0")
+
+import numpy as np  # noqa: E402
+from numpy.lib.stride_tricks import sliding_window_view  # noqa: E402
+
+import back  # noqa: E402
+
+OPEN_METEO_ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+AQ_VARIABLES = [back.POLLUTANT_API_MAP[p] for p in back.TARGET_POLLUTANTS]
+DAYS = back.FORECAST_DAYS
+WINDOW = 72
+# Hours per upstream request when filling the history store
+CHUNK_HOURS = 24 * 90
+# The archive API lags a few days behind; newer weather rows are fetched again next run
+ARCHIVE_DELAY_HOURS = 24 * 7
+IST_OFFSET_SECONDS = 19800
+# The forecast is issued after the last input hour; day d is observed this many hours after it, plus 24 * d
+FIRST_FORECAST_HOUR = 1
+
+
+def issue_hours(start, end, hour):
+    """IST epoch hours at which a forecast is issued: `hour` o'clock on every day from start to end"""
+    first = (start - date(1970, 1, 1)).days
+    return np.arange(first, first + (end - start).days + 1, dtype=np.int64) * 24 + hour
+
+
+def weather_hours(origins):
+    """UTC epoch hour of the weather row /predict uses at each IST origin: 23:00 of the previous UTC day"""
+    utc_days = (origins * 3600 - IST_OFFSET_SECONDS) // 86400
+    return utc_days * 24 - 1
+
+
+def data_ranges(origins):
+    """([start, end) IST hours of pollutant data, [start, end) UTC hours of weather) the origins need"""
+    weather = weather_hours(origins)
+    aq = (int(origins.min()) - (WINDOW - 1), int(origins.max()) + FIRST_FORECAST_HOUR + 24 * (DAYS - 1) + 1)
+    return aq, (int(weather.min()), int(weather.max()) + 1)
+
+
+def check_downloaded(dataset, lo, window, final_until):
+    """Raise when rows of a downloaded chunk are still empty, rather than scoring fewer forecasts"""
+    final = window[:max(0, final_until - lo)]
+    missing = int(np.isnan(final).all(axis=1).sum())
+    if missing:
+        first = np.datetime64(int(lo), "h")
+        raise ValueError(f"{dataset} history from {first}: {missing} of {len(final)} hours still missing after download")
+
+
+async def adownload_city(lat, lon, aq_range, weather_range):
+    now_ist = back.HourIndex.hour_of(datetime.now(back.IST))
+    now_utc = int(time.time() // 3600)
+    fields = ",".join(AQ_VARIABLES)
+    weather_params = ",".join(back.WEATHER_COLS)
+    for lo in range(aq_range[0], aq_range[1], CHUNK_HOURS):
+        hi = min(lo + CHUNK_HOURS, aq_range[1])
+        final_until = min(hi, now_ist - 1)
+        window = await back.arefresh_history(
+            "open-meteo-aq", lat, lon, "air_quality", AQ_VARIABLES, lo, hi, final_until,
+            lambda first, last: (
+                f"{back.OPEN_METEO_AQ_URL}?latitude={lat}&longitude={lon}"
+                f"&start_hour={back.hour_param(first)}&end_hour={back.hour_param(last)}"
+                f"&hourly={fields}&timezone=Asia%2FKolkata"
+            )
+        )
+        check_downloaded("air_quality", lo, window, final_until)
+    for lo in range(weather_range[0], weather_range[1], CHUNK_HOURS):
+        hi = min(lo + CHUNK_HOURS, weather_range[1])
+        final_until = min(hi, now_utc - ARCHIVE_DELAY_HOURS)
+        # The archive only takes whole days; the extra hours are stored too
+        window = await back.arefresh_history(
+            "open-meteo-archive", lat, lon, "weather", back.WEATHER_COLS, lo, hi, final_until,
+            lambda first, last: (
+                f"{OPEN_METEO_ARCHIVE_URL}?latitude={lat}&longitude={lon}"
+                f"&start_date={np.datetime64(int(first), 'h').astype('datetime64[D]')}"
+                f"&end_date={np.datetime64(int(last), 'h').astype('datetime64[D]')}&hourly={weather_params}"
+            )
+        )
+        check_downloaded("weather", lo, window, final_until)
+
+
+async def adownload(cities, aq_range, weather_range, concurrency=4):
+    """Fill the history store for every city; returns {city: error message} for the ones that failed"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def download(city, lat, lon):
+        async with semaphore:
+            try:
+                await adownload_city(lat, lon, aq_range, weather_range)
+            except Exception as e:
+                return city, str(e) or type(e).__name__
+        return city, None
+
+    results = await asyncio.gather(*(download(city, lat, lon) for city, (lat, lon) in cities.items()))
+    return {city: error for city, error in results if error}
+
+
+def init_worker(model_dir, backend, history_dir):
+    # One process per core already; more inference threads per process only contend
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    back.model_registry = back.ModelRegistry(model_dir, backend)
+    back.history_store = back.HistoryStore(history_dir)
+
+
+def accumulate(stats, key, forecast, observed):
+    """Add (sum |error|, sum error^2, count) per horizon day for the finite pairs"""
+    error = forecast - observed
+    valid = ~np.isnan(error)
+    error = np.where(valid, error, 0.0)
+    stats[key] = np.stack([np.abs(error).sum(axis=0), (error ** 2).sum(axis=0), valid.sum(axis=0)])
+
+
+def issue_time(hour):
+    """Aware datetime of an IST epoch hour"""
+    return (datetime(1970, 1, 1) + timedelta(hours=int(hour))).replace(tzinfo=back.IST)
+
+
+def forecast_matrix(payload, now):
+    """(pollutant, day) array of the values in a /predict payload, NaN on days it has no forecast for"""
+    now_utc = now.astimezone(back.UTC)
+    day_of = {(now_utc + timedelta(days=d)).strftime("%Y-%m-%d"): d for d in range(DAYS)}
+    matrix = np.full((len(back.TARGET_POLLUTANTS), DAYS), np.nan)
+    for j, pollutant in enumerate(back.TARGET_POLLUTANTS):
+        for entry in payload["predictions"].get(pollutant, []):
+            matrix[j, day_of[entry["date"]]] = entry["value"]
+    return matrix
+
+
+def evaluate_city(city, lat, lon, origins, batch_size=1024):
+    """Error sums {(pollutant, variant): (3, DAYS) array} for one city's forecasts issued at origins"""
+    (aq_start, aq_end), (weather_start, weather_end) = data_ranges(origins)
+    location = back.HistoryStore.location_key(lat, lon)
+    aq = back.history_store.window(location, "air_quality", AQ_VARIABLES, aq_start, aq_end)
+    weather = back.history_store.window(location, "weather", back.WEATHER_COLS, weather_start, weather_end)
+    if aq is None or weather is None:
+        raise ValueError(f"history for {city} does not cover the range")
+
+    rows = origins - aq_start
+    windows = sliding_window_view(aq, WINDOW, axis=0)[rows - (WINDOW - 1)]  # (N, pollutant, 72)
+    weather_rows = weather[weather_hours(origins) - weather_start]  # (N, 9)
+    observed = aq[rows[:, None] + FIRST_FORECAST_HOUR + 24 * np.arange(DAYS)].transpose(0, 2, 1)  # (N, pollutant, day)
+    # /predict only forecasts when the window and the previous day are complete
+    usable = ~np.isnan(windows).any(axis=(1, 2)) & ~np.isnan(weather_rows).any(axis=1)
+
+    forecasts = {"model": [], "corrected": []}
+    scored = np.flatnonzero(usable)
+    for lo in range(0, len(scored), batch_size):
+        batch = scored[lo:lo + batch_size]
+        inputs_list = []
+        for i in batch.tolist():
+            index = back.HourIndex.from_range(int(origins[i]) - (WINDOW - 1), int(origins[i]) + 1)
+            inputs_list.append({
+                "city": city, "lat": lat, "lon": lon, "weather_data": weather_rows[i:i + 1],
+                "envalert_today_data": None,
+                "pollutant_series": {p: (windows[i, j], index) for j, p in enumerate(back.TARGET_POLLUTANTS)},
+            })
+        for i, inputs, rollouts in zip(batch.tolist(), inputs_list, back.batched_forecast_rollouts(inputs_list)):
+            now = issue_time(origins[i])
+            forecasts["model"].append(forecast_matrix(back.assemble_forecast(inputs, rollouts, now), now))
+            # The latest reading at issue time stands in for EnvAlert's station average
+            envalert = {}
+            for p in back.API_POLLUTANTS:
+                value = float(windows[i, back.POLLUTANT_ROW[p], -1])
+                envalert[p] = {"value": value, "aqi": back.get_aqi_sub_index(value, p)}
+            corrected = back.assemble_forecast({**inputs, "envalert_today_data": envalert}, rollouts, now)
+            forecasts["corrected"].append(forecast_matrix(corrected, now))
+
+    stats = {}
+    if not len(scored):
+        return {"forecasts": 0, "skipped": int((~usable).sum()), "stats": stats}
+    observed = observed[usable]
+    model, corrected = np.array(forecasts["model"]), np.array(forecasts["corrected"])
+    for j, pollutant in enumerate(back.TARGET_POLLUTANTS):
+        if not np.isnan(model[:, j]).all():
+            accumulate(stats, (pollutant, "model"), model[:, j], observed[:, j])
+    # Day 0 of the corrected payload is the EnvAlert reading itself, so only days 1-6 are scored
+    corrected[:, :, 0] = np.nan
+    for pollutant in back.API_POLLUTANTS:
+        j = back.POLLUTANT_ROW[pollutant]
+        if not np.isnan(corrected[:, j]).all():
+            accumulate(stats, (pollutant, "corrected"), corrected[:, j], observed[:, j])
+    return {"forecasts": len(scored), "skipped": int((~usable).sum()), "stats": stats}
+
+
+def summarize(stats):
+    abs_sum, sq_sum, count = stats
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mae = abs_sum / count
+        rmse = np.sqrt(sq_sum / count)
+    return mae, rmse, count
+
+
+def result_rows(per_city):
+    """Flat rows for every (city or ALL, pollutant, variant, horizon day), plus all-horizon rows (day=None)"""
+    totals = {}
+    for result in per_city.values():
+        for key, stats in result["stats"].items():
+            totals[key] = totals.get(key, 0) + stats
+
+    rows = []
+    for city, stats_by_key in [("ALL", totals)] + [(city, r["stats"]) for city, r in sorted(per_city.items())]:
+        for (pollutant, variant), stats in sorted(stats_by_key.items()):
+            for day, (mae, rmse, n) in enumerate(zip(*summarize(stats))):
+                rows.append(_row(city, pollutant, variant, day, mae, rmse, n))
+            mae, rmse, n = summarize(stats.sum(axis=1))
+            rows.append(_row(city, pollutant, variant, None, mae, rmse, n))
+    return rows
+
+
+def _row(city, pollutant, variant, day, mae, rmse, n):
+    finite = lambda v: round(float(v), 3) if np.isfinite(v) else None
+    return {"city": city, "pollutant": pollutant, "variant": variant, "day": day,
+            "mae": finite(mae), "rmse": finite(rmse), "n": int(n)}
+
+
+def print_report(rows):
+    overall = [r for r in rows if r["city"] == "ALL" and r["day"] is not None]
+    keys = sorted({(r["pollutant"], r["variant"]) for r in overall}, key=lambda k: (back.TARGET_POLLUTANTS.index(k[0]), k[1]))
+    cell = lambda v: f"{v:>7.2f}" if v is not None else f"{'-':>7}"
+    for metric in ("mae", "rmse"):
+        print(f"\n{metric.upper()} by forecast day, all cities")
+        print(f"{'pollutant':<10}{'variant':<11}" + "".join(f"{'day ' + str(d):>7}" for d in range(DAYS)))
+        for pollutant, variant in keys:
+            by_day = {r["day"]: r[metric] for r in overall if (r["pollutant"], r["variant"]) == (pollutant, variant)}
+            print(f"{pollutant:<10}{variant:<11}" + "".join(cell(by_day.get(d)) for d in range(DAYS)))
+
+    print("\nMAE per city, all forecast days (model variant; corrected for PM2.5/PM10)")
+    print(f"{'city':<13}" + "".join(f"{p:>8}" for p in back.TARGET_POLLUTANTS))
+    cities = sorted({r["city"] for r in rows} - {"ALL"})
+    for city in cities:
+        values = {}
+        for r in rows:
+            if r["city"] == city and r["day"] is None:
+                # The corrected variant is what users see for PM2.5/PM10 when EnvAlert is up
+                if r["variant"] == "corrected" or r["pollutant"] not in values:
+                    values[r["pollutant"]] = r["mae"]
+        print(f"{city:<13}" + "".join(f"{cell(values.get(p)):>8}" for p in back.TARGET_POLLUTANTS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="first forecast day (IST)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="last forecast day (IST)")
+    parser.add_argument("--cities", help="comma-separated subset of CITY_STATIONS (default: all)")
+    parser.add_argument("--hour", type=int, default=12, help="IST hour at which forecasts are issued")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--model-dir", default=back.MODEL_DIR)
+    parser.add_argument("--backend", choices=sorted(back.MODEL_BACKENDS), default=back.MODEL_BACKEND)
+    parser.add_argument("--history-dir", default=os.environ.get("HISTORY_DIR") or os.path.join(back.MODEL_DIR, "history"))
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="write results to this file")
+    args = parser.parse_args()
+    if args.end < args.start or not 0 <= args.hour < 24:
+        parser.error("--end must not be before --start, and --hour must be 0-23")
+
+    names = [c.strip() for c in args.cities.split(",")] if args.cities else list(back.CITY_STATIONS)
+    cities = {}
+    for name in names:
+        coords = back.geocoding_index.lookup(name)
+        if coords is None:
+            parser.error(f"unknown city {name!r}")
+        cities[name] = coords
+
+    back.history_store = back.HistoryStore(args.history_dir)
+    origins = issue_hours(args.start, args.end, args.hour)
+    aq_range, weather_range = data_ranges(origins)
+
+    started = time.time()
+    failed = back.upstream_client.run(adownload(cities, aq_range, weather_range), timeout=None)
+    if failed:
+        # Scoring a partial history would quietly drop forecasts from the averages
+        for city, error in failed.items():
+            print(f"{city}: history download failed: {error}", file=sys.stderr)
+        sys.exit(1)
+    downloaded = time.time()
+
+    per_city = {}
+    todo = list(cities)
+    init_args = (args.model_dir, args.backend, args.history_dir)
+    if args.workers <= 1:
+        init_worker(*init_args)
+        for city in todo:
+            per_city[city] = evaluate_city(city, *cities[city], origins)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(args.workers, len(todo)) or 1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker, initargs=init_args
+        ) as pool:
+            futures = {pool.submit(evaluate_city, city, *cities[city], origins): city for city in todo}
+            for future in concurrent.futures.as_completed(futures):
+                per_city[futures[future]] = future.result()
+
+    rows = result_rows(per_city)
+    forecasts = sum(r["forecasts"] for r in per_city.values())
+    summary = {
+        "start": args.start.isoformat(), "end": args.end.isoformat(), "hour": args.hour, "backend": args.backend,
+        "cities": len(per_city), "forecasts": forecasts,
+        "skipped_incomplete_inputs": sum(r["skipped"] for r in per_city.values()),
+        "download_seconds": round(downloaded - started, 1), "evaluate_seconds": round(time.time() - downloaded, 1),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "results": rows}, f, indent=1)
+    if args.json:
+        print(json.dumps({"summary": summary, "results": rows}))
+        return
+    print_report(rows)
+    print(f"\n{forecasts} forecasts for {len(per_city)} cities; history {summary['download_seconds']}s, "
+          f"scoring {summary['evaluate_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Per-request inference latency: legacy per-step model.predict loop vs the batched rollout engine.
+
+Usage:
+    python benchmarks/bench_inference.py [--model-dir DIR] [--backend keras|tflite] [--requests 20] [--json]
+
+Models are loaded from best_cnn_{pollutant}.keras in --model-dir (default: repo root).
+Missing models are replaced by an untrained CNN with the same (82, 1) input, which is
+enough to measure call overhead. --backend tflite runs the engine on converted models.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import back  # noqa: E402
+import tensorflow as tf  # noqa: E402
+
+# PM2.5 and PM10 are predicted twice per request when EnvAlert data is available
+API_POLLUTANTS = ("pm2_5", "pm10")
+
+
+def prepare_model_dir(model_dir, backend):
+    """Return a directory holding all six models, writing stand-ins for any that are missing"""
+    if all(os.path.exists(os.path.join(model_dir, f"best_cnn_{p}.keras")) for p in back.TARGET_POLLUTANTS):
+        stand_in_dir = model_dir
+    else:
+        stand_in_dir = tempfile.mkdtemp(prefix="aerovision-bench-")
+        for pollutant in back.TARGET_POLLUTANTS:
+            model = tf.keras.Sequential([
+                tf.keras.Input((back.SEQUENCE_LENGTH, 1)),
+                tf.keras.layers.Conv1D(64, 3, activation="relu"),
+                tf.keras.layers.Conv1D(64, 3, activation="relu"),
+                tf.keras.layers.GlobalAveragePooling1D(),
+                tf.keras.layers.Dense(1),
+            ])
+            model.save(os.path.join(stand_in_dir, f"best_cnn_{pollutant}.keras"))
+    if backend == "tflite":
+        import convert_models
+        for pollutant in back.TARGET_POLLUTANTS:
+            if not os.path.exists(os.path.join(stand_in_dir, f"best_cnn_{pollutant}.tflite")):
+                convert_models.convert(stand_in_dir, pollutant)
+    return stand_in_dir
+
+
+def load_models(model_dir):
+    return {
+        p: tf.keras.models.load_model(os.path.join(model_dir, f"best_cnn_{p}.keras"))
+        for p in back.TARGET_POLLUTANTS
+    }
+
+
+def legacy_request(loaded, series, weather_data):
+    """The pre-engine inference path: one model.predict per day, PM2.5/PM10 rolled out twice"""
+    for pollutant in back.TARGET_POLLUTANTS:
+        start_days = (0, 1) if pollutant in API_POLLUTANTS else (0,)
+        for start_day in start_days:
+            seq = [0.0] + series[pollutant][-72:] + weather_data[-1][:9]
+            sequence = np.array(seq).reshape((1, 82, 1))
+            for _ in range(start_day, 7):
+                pred_val = float(abs(loaded[pollutant].predict(sequence, verbose=0)[0, 0]))
+                sequence[0, -1, 0] = pred_val
+                sequence = np.roll(sequence, -1, axis=1)
+
+
+def engine_request(series, weather_data):
+    pollutant_series = {p: (series[p], []) for p in back.TARGET_POLLUTANTS}
+    back.forecast_rollouts(pollutant_series, weather_data)
+
+
+def measure(fn, n):
+    fn()  # warm-up (tracing, graph building)
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {
+        "mean_ms": round(float(samples.mean()), 2),
+        "p50_ms": round(float(np.percentile(samples, 50)), 2),
+        "p95_ms": round(float(np.percentile(samples, 95)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=ROOT)
+    parser.add_argument("--backend", choices=sorted(back.MODEL_BACKENDS), default="keras")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    model_dir = prepare_model_dir(args.model_dir, args.backend)
+    loaded = load_models(model_dir)
+    back.model_registry = back.ModelRegistry(model_dir, args.backend)
+    back.model_registry.preload()
+
+    rng = np.random.default_rng(0)
+    series = {p: list(rng.uniform(5, 150, 72)) for p in back.TARGET_POLLUTANTS}
+    weather_data = [list(rng.uniform(0, 30, len(back.WEATHER_COLS)))]
+
+    results = {
+        "legacy": measure(lambda: legacy_request(loaded, series, weather_data), args.requests),
+        "engine": measure(lambda: engine_request(series, weather_data), args.requests),
+    }
+    results["backend"] = args.backend
+    results["speedup"] = round(results["legacy"]["mean_ms"] / results["engine"]["mean_ms"], 1)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{'path':<8} {'mean':>10} {'p50':>10} {'p95':>10}")
+    for name in ("legacy", "engine"):
+        r = results[name]
+        print(f"{name:<8} {r['mean_ms']:>8.1f}ms {r['p50_ms']:>8.1f}ms {r['p95_ms']:>8.1f}ms")
+    print(f"speedup: {results['speedup']}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Microbenchmarks of the CPU-bound forecast steps, without any upstream I/O or model inference.
+
+Usage:
+    python benchmarks/bench_micro.py [--number 200] [--repeat 5] [--json] [--output FILE] [--compare FILE]
+
+Inputs are synthetic (a 72-hour window ending at the current IST hour) and model rollouts are
+precomputed with the stub model, so the numbers isolate the pure-Python/NumPy post-processing.
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+
+sys.path.insert(0, harness.ROOT)
+os.environ["LOG_LEVEL"] = "WARNING"
+import back  # noqa: E402
+
+
+def synthetic_inputs(seed=0):
+    """Forecast inputs shaped like acollect_forecast_inputs() output, with EnvAlert data for PM2.5/PM10"""
+    rng = np.random.default_rng(seed)
+    end = back.HourIndex.hour_of(datetime.now(back.IST)) + 1
+    index = back.HourIndex.from_range(end - 72, end)
+    series = {p: (rng.uniform(5, 150, 72), index) for p in back.TARGET_POLLUTANTS}
+    weather = rng.uniform(0, 30, (120, len(back.WEATHER_COLS)))
+    envalert = {"pm2_5": {"value": 61.5, "aqi": 104}, "pm10": {"value": 120.25, "aqi": 113}}
+    return {"city": "Bhopal", "lat": 23.2599, "lon": 77.4126, "weather_data": weather,
+            "envalert_today_data": envalert, "pollutant_series": series}
+
+
+def cases():
+    harness.install_stub_models(back)
+    inputs = synthetic_inputs()
+    series, weather = inputs["pollutant_series"], inputs["weather_data"]
+    rollouts = back.forecast_rollouts(series, weather)
+    values, index = series["pm2_5"]
+    concentrations = np.random.default_rng(1).uniform(0, 600, 1000)
+
+    return {
+        "build_input_sequence": lambda: back.build_input_sequence(values, weather),
+        "get_aqi_sub_index": lambda: back.get_aqi_sub_index(87.3, "pm2_5"),
+        "aqi_sub_index_array_1000": lambda: back.aqi_sub_index_array(concentrations, "pm10"),
+        "predict_pollutant": lambda: back.predict_pollutant(
+            "pm2_5", values, weather, index, start_day=0, rollout=rollouts["pm2_5"]
+        ),
+        "assemble_forecast": lambda: back.assemble_forecast(inputs, rollouts),
+        "forecast_rollouts_stub": lambda: back.forecast_rollouts(series, weather),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs; the fastest is reported")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="write results to this file")
+    parser.add_argument("--compare", help="results file to compare against")
+    args = parser.parse_args()
+
+    rows = []
+    for name, fn in cases().items():
+        fn()
+        runs = timeit.repeat(fn, number=args.number, repeat=args.repeat)
+        per_call = [run / args.number * 1000 for run in runs]
+        rows.append({"case": name, "best_ms": round(min(per_call), 5), "median_ms": round(float(np.median(per_call)), 5)})
+        if not args.json:
+            print(f"{name:<26} best {min(per_call) * 1000:>10.1f}us  median {np.median(per_call) * 1000:>10.1f}us")
+
+    results = {"meta": harness.run_metadata(number=args.number, repeat=args.repeat), "results": rows}
+    harness.write_results(results, args.output, args.json)
+    if args.compare:
+        harness.compare(results, args.compare, ("case",), ("best_ms", "median_ms"))
+
+
+if __name__ == "__main__":
+    main()
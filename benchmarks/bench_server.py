@@ -0,0 +1,189 @@
+"""
+Load test for /predict, /weather and /api/station/<id> against stubbed upstream responses
+(synthetic unless fixtures were recorded with upstream_stub.py --record).
+
+Usage:
+    python benchmarks/bench_server.py [--models stub|real] [--scenario warm|cold] [--concurrency 1,4,16,64]
+        [--requests 200] [--upstream-latency-ms 50] [--target URL] [--json] [--output FILE] [--compare FILE]
+
+Starts benchmarks/upstream_stub.py and the backend (threaded werkzeug server) in their own
+processes, then reports throughput and p50/p95/p99 latency per endpoint and concurrency level.
+--scenario warm primes every cache first and measures what a steady-state worker serves;
+cold disables the response cache, upstream cache and history store so every request runs
+the whole pipeline. --target benchmarks an already running server (e.g. gunicorn started with
+the stub's environment variables) instead of starting one.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness  # noqa: E402
+import upstream_stub  # noqa: E402
+
+ENDPOINTS = ("predict", "weather", "station")
+
+
+def serve(port, models):
+    """Child process: run back.app on port, optionally with stub models"""
+    sys.path.insert(0, harness.ROOT)
+    import back
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    if models == "stub":
+        harness.install_stub_models(back)
+    else:
+        back.model_registry.preload()
+    make_server("127.0.0.1", port, back.app, threaded=True, request_handler=QuietHandler).serve_forever()
+
+
+def start_backend(base_url, models, scenario):
+    port = upstream_stub.free_port()
+    scratch = tempfile.mkdtemp(prefix="aerovision-bench-")
+    env = dict(os.environ, **upstream_stub.upstream_env(base_url))
+    env.update(
+        LOG_LEVEL="WARNING",
+        GEOCODE_CACHE_PATH=os.path.join(scratch, "geocode_cache.json"),
+        HISTORY_DIR=os.path.join(scratch, "history"),
+    )
+    if scenario == "cold":
+        env.update(RESPONSE_CACHE_MAX_BYTES="0", UPSTREAM_CACHE_SIZE="0", HISTORY_DIR="")
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--models", models], env=env
+    )
+    upstream_stub.wait_for_port(port, timeout=300, proc=proc)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def request_plan(endpoint):
+    """Cycle of (method, path, json body) covering every mapped city or station"""
+    if endpoint in ("predict", "weather"):
+        return [("POST", f"/{endpoint}", {"city": c}) for c in CITY_NAMES]
+    return [("GET", f"/api/station/{sid}", None) for sid in range(1, 45)]
+
+
+# Mapped cities (CITY_STATIONS in back.py); kept here so the load generator doesn't import the backend
+CITY_NAMES = (
+    "Anuppur", "Betul", "Bhopal", "CTSDF", "Damoh", "Dewas", "Gwalior", "Indore", "Jabalpur", "Katni",
+    "Khandwa", "Khargone", "Maihar", "Mandideep", "Narsinghpur", "Neemuch", "Panna", "Pithampur",
+    "Ratlam", "Rewa", "Sagar", "Satna", "Singrauli", "Ujjain",
+)
+
+
+async def run_level(session, target, plan, concurrency, total):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, body = plan[i % len(plan)]
+            start = time.perf_counter()
+            try:
+                async with session.request(method, target + path, json=body) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests": total, "errors": errors, "throughput_rps": round(total / elapsed, 2),
+            **harness.latency_summary(latencies)}
+
+
+async def wait_ready(session, target, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            async with session.get(target + "/readyz") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"{target} not ready after {timeout}s")
+
+
+async def benchmark(target, endpoints, levels, total, scenario):
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        await wait_ready(session, target)
+        results = []
+        for endpoint in endpoints:
+            plan = request_plan(endpoint)
+            if scenario == "warm":
+                await run_level(session, target, plan, 8, len(plan))
+            for concurrency in levels:
+                row = await run_level(session, target, plan, concurrency, total)
+                results.append({"endpoint": endpoint, "concurrency": concurrency, **row})
+                print(f"{endpoint:<8} c={concurrency:<4} {row['throughput_rps']:>9.1f} req/s  "
+                      f"p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  p99 {row['p99_ms']:>8.2f}ms  "
+                      f"errors {row['errors']}", file=sys.stderr)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", choices=("stub", "real"), default="stub")
+    parser.add_argument("--scenario", choices=("warm", "cold"), default="warm")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50)
+    parser.add_argument("--fixtures", default=upstream_stub.DEFAULT_FIXTURES)
+    parser.add_argument("--target", help="benchmark this running server instead of starting one")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="write results to this file")
+    parser.add_argument("--compare", help="results file to compare against")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.models)
+        return
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    processes = []
+    try:
+        target = args.target
+        if target is None:
+            stub, base_url = upstream_stub.start_subprocess(args.fixtures, args.upstream_latency_ms)
+            processes.append(stub)
+            backend, target = start_backend(base_url, args.models, args.scenario)
+            processes.append(backend)
+        rows = asyncio.run(benchmark(target.rstrip("/"), endpoints, levels, args.requests, args.scenario))
+    finally:
+        for proc in processes:
+            proc.terminate()
+            proc.wait()
+
+    results = {
+        "meta": harness.run_metadata(
+            models=args.models, scenario=args.scenario, requests=args.requests,
+            upstream_latency_ms=args.upstream_latency_ms, target=args.target,
+            fixtures=os.path.exists(args.fixtures or "")
+        ),
+        "results": rows,
+    }
+    harness.write_results(results, args.output, args.json)
+    if args.compare:
+        harness.compare(results, args.compare, ("endpoint", "concurrency"), ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"))
+
+
+if __name__ == "__main__":
+    main()
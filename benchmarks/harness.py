@@ -0,0 +1,102 @@
+"""
+Shared pieces of the benchmark scripts: stub models, latency summaries and result files
+that can be compared between commits.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubModel:
+    """
+    Stand-in for a forecast model: a damped persistence forecast over the 72 pollutant inputs.
+    Costs microseconds, so benchmarks measure the serving path rather than TensorFlow.
+    """
+
+    extension = "stub"
+    shareable = False
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return np.nan_to_num(batch[:, 1:73, 0].mean(axis=1, keepdims=True) * 0.95)
+
+
+def install_stub_models(back):
+    """Serve every pollutant from StubModel instead of the files in MODEL_DIR"""
+    back.MODEL_BACKENDS["stub"] = StubModel
+    back.model_registry = back.ModelRegistry(backend="stub")
+    back.model_registry.preload()
+
+
+def latency_summary(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if not len(samples):
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+
+
+def run_metadata(**params):
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+    }
+
+
+def write_results(results, output=None, as_json=False):
+    """Save results to output (when given) and print them as JSON if asked"""
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=1)
+    if as_json:
+        print(json.dumps(results))
+
+
+def compare(results, baseline_path, keys, metrics):
+    """
+    Print the relative change of each metric against a saved results file.
+    Rows are matched on the given keys; lower is better for *_ms, higher for everything else.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')})")
+    previous = {tuple(row[k] for k in keys): row for row in baseline["results"]}
+    for row in results["results"]:
+        old = previous.get(tuple(row[k] for k in keys))
+        if old is None:
+            continue
+        changes = []
+        for metric in metrics:
+            if old.get(metric) and row.get(metric) is not None:
+                delta = (row[metric] - old[metric]) / old[metric] * 100
+                better = delta < 0 if metric.endswith("_ms") else delta > 0
+                changes.append(f"{metric} {delta:+.1f}%{'' if abs(delta) < 5 else (' better' if better else ' WORSE')}")
+        print(f"  {' '.join(str(row[k]) for k in keys):<28} " + ", ".join(changes))
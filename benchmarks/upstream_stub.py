@@ -0,0 +1,251 @@
+"""
+Local stand-in for the upstream APIs (Open-Meteo, OpenWeatherMap geocoding, EnvAlert), so benchmarks
+don't depend on the network or on live data.
+
+Usage:
+    python benchmarks/upstream_stub.py [--port 8900] [--fixtures FILE] [--latency-ms 0]
+    python benchmarks/upstream_stub.py --record [--fixtures FILE]
+
+No fixtures are committed: by default the stub serves deterministic synthetic data shaped like the
+real responses. --record captures fixtures from the live APIs into benchmarks/fixtures/upstream.json
+(the default --fixtures path), and the stub replays them when that file exists. Hourly series are replayed cyclically onto
+whatever hours are requested, so the stub answers any date range and window.
+Point the backend at the stub with the variables printed at start-up (see upstream_env()).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import zlib
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures", "upstream.json")
+REPLAY_HOURS = 24 * 7
+EPOCH = datetime(1970, 1, 1)
+
+# Recorded for one reference location; the stub serves it for every lat/lon
+RECORD_LAT, RECORD_LON = 23.2366, 77.4023
+
+
+def upstream_env(base_url):
+    """Environment variables that point back.py at a stub listening on base_url"""
+    return {
+        "OPENWEATHER_GEO_URL": f"{base_url}/geo/1.0/direct",
+        "ENVALERT_URL": f"{base_url}/EnvAlert/Wa-CityAQI",
+        "OPEN_METEO_AQ_URL": f"{base_url}/v1/air-quality",
+        "OPEN_METEO_FORECAST_URL": f"{base_url}/v1/forecast",
+        "OPEN_METEO_ARCHIVE_URL": f"{base_url}/v1/archive",
+    }
+
+
+def _rng(name):
+    return np.random.default_rng(zlib.crc32(name.encode()))
+
+
+def synthetic_series(name, hours=REPLAY_HOURS):
+    """A week of hourly values with a daily cycle, seeded by the variable name"""
+    rng = _rng(name)
+    base, amp = rng.uniform(10, 120), rng.uniform(2, 30)
+    t = np.arange(hours)
+    values = base + amp * np.sin(2 * np.pi * t / 24) + rng.normal(0, amp / 5, hours)
+    return [round(float(v), 2) for v in np.abs(values)]
+
+
+def synthetic_station(station_id):
+    rng = _rng(f"station-{station_id}")
+    station = {"station_id": station_id, "station_name": f"Station {station_id}"}
+    for key in ("pm25", "pm10", "nox", "so2", "ozone", "co"):
+        station[key] = f"{rng.uniform(5, 150):.2f}"
+        station[f"{key}_subindex"] = str(int(rng.uniform(10, 250)))
+    station["aqi"] = max(int(station[f"{k}_subindex"]) for k in ("pm25", "pm10"))
+    return station
+
+
+class Replay:
+    def __init__(self, fixtures):
+        self.fixtures = fixtures or {}
+
+    def hourly(self, section, name):
+        series = self.fixtures.get(section, {}).get(name)
+        return series if series else synthetic_series(f"{section}:{name}")
+
+    def hourly_response(self, section, query):
+        """Hourly payload for the requested start_hour/end_hour or start_date/end_date range"""
+        if "start_hour" in query:
+            start = datetime.fromisoformat(query["start_hour"])
+            end = datetime.fromisoformat(query["end_hour"])
+        else:
+            start = datetime.fromisoformat(query["start_date"])
+            end = datetime.fromisoformat(query["end_date"]) + timedelta(hours=23)
+        # Naive wall-clock hours: cycle position only depends on the hour, not the server's timezone
+        first = int((start - EPOCH).total_seconds() // 3600)
+        hours = range(first, int((end - EPOCH).total_seconds() // 3600) + 1)
+        hourly = {"time": [(start + timedelta(hours=h - first)).strftime("%Y-%m-%dT%H:%M") for h in hours]}
+        for name in query.get("hourly", "").split(","):
+            series = self.hourly(section, name)
+            hourly[name] = [series[h % len(series)] for h in hours]
+        return {"latitude": float(query.get("latitude", 0)), "longitude": float(query.get("longitude", 0)),
+                "hourly": hourly}
+
+    def daily_response(self, query):
+        start = date.fromisoformat(query["start_date"])
+        days = (date.fromisoformat(query["end_date"]) - start).days + 1
+        daily = {"time": [(start + timedelta(days=i)).isoformat() for i in range(days)]}
+        for name in query["daily"].split(","):
+            series = self.fixtures.get("daily", {}).get(name) or synthetic_series(f"daily:{name}", 7)
+            daily[name] = [series[(start.toordinal() + i) % len(series)] for i in range(days)]
+        return {"daily": daily}
+
+    def station(self, station_id):
+        recorded = self.fixtures.get("envalert", {}).get(str(station_id))
+        return [recorded if recorded else synthetic_station(station_id)]
+
+    def geocode(self, name):
+        recorded = self.fixtures.get("geocode", {}).get(" ".join(name.split()).lower())
+        return recorded if recorded is not None else [{"name": name, "lat": RECORD_LAT, "lon": RECORD_LON}]
+
+
+def make_app(replay, latency_ms=0):
+    async def delay():
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+    async def geocode(request):
+        await delay()
+        return web.json_response(replay.geocode(request.query.get("q", "")))
+
+    async def envalert(request):
+        await delay()
+        return web.json_response(replay.station(int(request.query["id"])))
+
+    async def air_quality(request):
+        await delay()
+        return web.json_response(replay.hourly_response("air_quality", request.query))
+
+    async def forecast(request):
+        await delay()
+        if "daily" in request.query:
+            return web.json_response(replay.daily_response(request.query))
+        return web.json_response(replay.hourly_response("weather", request.query))
+
+    app = web.Application()
+    app.router.add_get("/geo/1.0/direct", geocode)
+    app.router.add_route("*", "/EnvAlert/Wa-CityAQI", envalert)
+    app.router.add_get("/v1/air-quality", air_quality)
+    app.router.add_get("/v1/forecast", forecast)
+    app.router.add_get("/v1/archive", forecast)
+    return app
+
+
+def load_fixtures(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=60, proc=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"process exited with {proc.returncode} before listening on {port}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"nothing listening on port {port} after {timeout}s")
+
+
+def start_subprocess(fixtures=DEFAULT_FIXTURES, latency_ms=0):
+    """Run the stub in its own process (so it doesn't compete for the GIL); returns (process, base URL)"""
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--port", str(port), "--fixtures", fixtures or "",
+         "--latency-ms", str(latency_ms), "--quiet"]
+    )
+    wait_for_port(port, proc=proc)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def record(path):
+    """Capture a week of live responses for the reference location plus every EnvAlert station"""
+    os.environ["HISTORY_DIR"] = ""
+    sys.path.insert(0, ROOT)
+    import back
+
+    def get(url, method="GET"):
+        with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=30) as response:
+            return json.load(response)
+
+    end = datetime.now(back.IST).date()
+    start = end - timedelta(days=6)
+    common = f"latitude={RECORD_LAT}&longitude={RECORD_LON}&start_date={start}&end_date={end}"
+    aq_fields = ",".join(back.POLLUTANT_API_MAP[p] for p in back.TARGET_POLLUTANTS)
+    fixtures = {
+        "recorded_at": datetime.now(back.IST).isoformat(timespec="seconds"),
+        "air_quality": get(f"{back.OPEN_METEO_AQ_URL}?{common}&hourly={aq_fields}&timezone=Asia%2FKolkata")["hourly"],
+        "weather": get(f"{back.OPEN_METEO_FORECAST_URL}?{common}&hourly={','.join(back.WEATHER_COLS)}")["hourly"],
+        "daily": get(
+            f"{back.OPEN_METEO_FORECAST_URL}?latitude={RECORD_LAT}&longitude={RECORD_LON}"
+            f"&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max"
+            f"&timezone=auto&start_date={end}&end_date={end + timedelta(days=6)}"
+        )["daily"],
+        "envalert": {},
+        "geocode": {},
+    }
+    # Keep the value arrays only; times are regenerated for each request on replay
+    for section in ("air_quality", "weather", "daily"):
+        fixtures[section].pop("time", None)
+    for station_id in sorted(back.STATION_COORDINATES):
+        try:
+            data = get(f"{back.ENVALERT_URL}?id={station_id}", method="POST")
+            if isinstance(data, list) and data:
+                fixtures["envalert"][str(station_id)] = data[0]
+        except Exception as e:
+            print(f"station {station_id}: {e}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fixtures, f, indent=1)
+    print(f"recorded {len(fixtures['envalert'])} stations and a week of hourly data to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--record", action="store_true", help="capture fixtures from the live APIs and exit")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.fixtures)
+        return
+    fixtures = load_fixtures(args.fixtures)
+    if not args.quiet:
+        base_url = f"http://127.0.0.1:{args.port}"
+        print(f"replaying {'fixtures from ' + args.fixtures if fixtures else 'synthetic data'} on {base_url}")
+        for key, value in upstream_env(base_url).items():
+            print(f"export {key}={value}")
+    web.run_app(make_app(Replay(fixtures), args.latency_ms), host="127.0.0.1", port=args.port,
+                print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Convert the best_cnn_{pollutant}.keras models to TFLite for the lightweight backend.
+
+Usage:
+    python convert_models.py [--model-dir DIR] [--quantize]
+
+Run with MODEL_BACKEND=tflite afterwards. Only this conversion step needs full
+TensorFlow; serving can use the standalone tflite-runtime package.
+"""
+import argparse
+import os
+
+import tensorflow as tf
+
+TARGET_POLLUTANTS = ["pm2_5", "pm10", "no2", "so2", "o3", "co"]
+
+
+def convert(model_dir, pollutant, quantize=False):
+    src = os.path.join(model_dir, f"best_cnn_{pollutant}.keras")
+    dst = os.path.join(model_dir, f"best_cnn_{pollutant}.tflite")
+    model = tf.keras.models.load_model(src)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        # Dynamic-range quantization: int8 weights, float activations
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(dst, "wb") as f:
+        f.write(converter.convert())
+    return src, dst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert forecast models to TFLite")
+    parser.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument("--quantize", action="store_true", help="apply dynamic-range weight quantization")
+    args = parser.parse_args()
+
+    for pollutant in TARGET_POLLUTANTS:
+        try:
+            src, dst = convert(args.model_dir, pollutant, args.quantize)
+            print(f"✅ {os.path.basename(src)} -> {os.path.basename(dst)} ({os.path.getsize(dst) / 1024:.0f} KiB)")
+        except Exception as e:
+            print(f"Conversion failed for {pollutant}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Production server for back.py:
+
+    gunicorn -c gunicorn.conf.py back:app
+
+The app is imported once in the master (preload_app) and workers are forked from it, so
+module-level state and, with MODEL_BACKEND=tflite, the model bytes are shared copy-on-write.
+Threads, the upstream event loop, TensorFlow and the TFLite interpreters don't survive a fork,
+so each worker starts them in post_fork.
+
+/predict spends most of its time waiting on upstream APIs, so the default is a few
+processes with several threads each (gthread) rather than one process per core.
+
+Signals: HUP re-reads the model files and gracefully replaces the workers (new code needs a
+restart or USR2), TERM drains in-flight requests for up to graceful_timeout seconds.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+preload_app = True
+
+# Cold forecasts can take a while when every upstream is slow
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Optional periodic worker recycling; 0 disables it
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+
+def when_ready(server):
+    import back
+    if back.SERVES_FORECASTS:
+        back.model_registry.load_shared()
+
+
+def on_reload(server):
+    # Workers forked after a HUP pick up model files replaced on disk
+    import back
+    if back.SERVES_FORECASTS:
+        back.model_registry.load_shared()
+
+
+def post_fork(server, worker):
+    import back
+    back.start_services(background=True)
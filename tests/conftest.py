@@ -0,0 +1,41 @@
+"""
+Shared setup for the back.py regression tests: no background services, no files written next to
+the code, and a small deterministic model instead of the trained ones.
+"""
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.update(LOG_LEVEL="ERROR", HISTORY_DIR="", GEOCODE_CACHE_PATH="", INFERENCE_BATCH_WAIT_MS="0")
+
+import back  # noqa: E402
+
+
+class LinearModel:
+    """
+    Fixed random weighting of all 82 inputs, different per pollutant file. Every position matters,
+    so a rollout that feeds predictions back into the wrong slot gives different numbers.
+    """
+
+    extension = "test"
+    shareable = False
+
+    def __init__(self, path):
+        rng = np.random.default_rng(zlib.crc32(os.path.basename(path).encode()))
+        self.weights = rng.uniform(-0.05, 0.05, back.SEQUENCE_LENGTH).astype(np.float32)
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return (batch[:, :, 0] @ self.weights)[:, None]
+
+
+@pytest.fixture
+def models(monkeypatch):
+    monkeypatch.setitem(back.MODEL_BACKENDS, "test", LinearModel)
+    monkeypatch.setattr(back, "model_registry", back.ModelRegistry(backend="test"))
+    return back.model_registry
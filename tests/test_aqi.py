@@ -0,0 +1,67 @@
+"""The vectorized AQI helpers against the original one-value-at-a-time loops"""
+import math
+
+import numpy as np
+import pytest
+
+import back
+
+
+def baseline_sub_index(C, pollutant):
+    if C is None or math.isnan(C):
+        return np.nan
+    for B_low, B_high, I_low, I_high in back.AQI_BREAKPOINTS[pollutant]:
+        if B_low <= C <= B_high:
+            return min(round(((I_high - I_low) / (B_high - B_low)) * (C - B_low) + I_low), 500)
+    return np.nan
+
+
+def baseline_category(aqi):
+    for (low, high), cat in back.AQI_CATEGORIES.items():
+        if low <= aqi <= high:
+            return cat, f"{cat} air quality.", back.AQI_CATEGORY_COLORS[cat]
+    return "Out of Range", "AQI beyond measurable limits.", "gray"
+
+
+def concentrations(pollutant):
+    """Every breakpoint edge and the values just around it, the gaps between bands, and random values"""
+    edges = np.array(back.AQI_BREAKPOINTS[pollutant], dtype=np.float64)[:, :2].ravel()
+    edges = edges[np.isfinite(edges)]
+    top = edges.max()
+    values = np.concatenate([
+        edges, edges - 0.01, edges + 0.01, edges + 0.5,
+        np.random.default_rng(0).uniform(-10, top * 1.2, 2000),
+        [0.0, -1.0, top * 3, np.nan],
+    ])
+    return values
+
+
+@pytest.mark.parametrize("pollutant", back.TARGET_POLLUTANTS)
+def test_sub_index_array_matches_scalar_loop(pollutant):
+    values = concentrations(pollutant)
+    expected = np.array([baseline_sub_index(float(c), pollutant) for c in values], dtype=np.float64)
+    np.testing.assert_array_equal(back.aqi_sub_index_array(values, pollutant), expected)
+    for c, e in zip(values.tolist(), expected.tolist()):
+        result = back.get_aqi_sub_index(c, pollutant)
+        assert (np.isnan(result) and np.isnan(e)) or result == e
+
+
+def test_sub_indices_follow_the_pollutant_axis():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 500, (len(back.TARGET_POLLUTANTS), 7, 3))
+    result = back.aqi_sub_indices(values)
+    for i, pollutant in enumerate(back.TARGET_POLLUTANTS):
+        np.testing.assert_array_equal(result[i], back.aqi_sub_index_array(values[i], pollutant))
+
+
+def test_missing_concentration_has_no_sub_index():
+    assert np.isnan(back.get_aqi_sub_index(None, "pm2_5"))
+    assert np.isnan(back.get_aqi_sub_index(float("nan"), "pm10"))
+
+
+def test_category_codes_match_scalar_loop():
+    aqi = np.concatenate([np.arange(-2, 520), np.arange(-2, 520) + 0.5])
+    names, warnings, colors = back.aqi_category_info(aqi)
+    for value, name, warning, color in zip(aqi.tolist(), names, warnings, colors):
+        assert (name, warning, color) == baseline_category(value)
+    assert back.get_category_info(np.nan)[0] == "Out of Range"
@@ -0,0 +1,255 @@
+"""
+Forecast pipeline regressions: the batched rollouts and the (pollutant x day) assembly against the
+original per-pollutant code, and inputs with missing hours.
+"""
+import asyncio
+import copy
+import json
+import math
+import random
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import back
+from test_aqi import baseline_category, baseline_sub_index
+
+
+def baseline_rollout(model, sequence, steps=back.FORECAST_DAYS):
+    """The original loop: one sequence, prediction written to the last slot, then rolled left"""
+    sequence = np.array(sequence, dtype=np.float32).reshape((1, back.SEQUENCE_LENGTH, 1))
+    preds = []
+    for _ in range(steps):
+        value = float(abs(model(sequence)[0, 0]))
+        preds.append(value)
+        sequence[0, -1, 0] = value
+        sequence = np.roll(sequence, -1, axis=1)
+    return np.array(preds)
+
+
+def baseline_days(pollutant, data, timestamps, rollout, start_day):
+    """The original predict_pollutant with the model rollout given"""
+    if rollout is None or len(data) < 72:
+        return []
+    now = datetime.now(back.IST)
+    prev_date = now.date() - timedelta(days=1)
+    prev_day = [i for i, ts in enumerate(timestamps) if datetime.fromisoformat(ts).date() == prev_date]
+    if not prev_day:
+        return []
+    prev_hour = next((i for i in prev_day if datetime.fromisoformat(timestamps[i]).hour == now.hour), prev_day[-1])
+    last_23_hours = [data[j] for j in range(max(prev_hour - 23, 0), prev_hour)]
+    utc = datetime.utcnow()
+    results = []
+    for i in range(start_day, back.FORECAST_DAYS):
+        value = float(rollout[i - start_day])
+        values = last_23_hours + [value]
+        aqi = baseline_sub_index(sum(values) / len(values), pollutant)
+        category, warning, color = baseline_category(aqi)
+        results.append({
+            "day": "Today" if i == 0 else "Tomorrow" if i == 1 else (utc + timedelta(days=i)).strftime("%d %b"),
+            "date": (utc + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "value": round(value, 2), "aqi": 0 if math.isnan(aqi) else int(aqi),
+            "category": category, "warning": warning, "color": color,
+        })
+    return results
+
+
+def rescore(entry, pollutant):
+    aqi = baseline_sub_index(entry["value"], pollutant)
+    entry["aqi"] = 0 if math.isnan(aqi) else int(aqi)
+    entry["category"], entry["warning"], entry["color"] = baseline_category(entry["aqi"])
+
+
+def baseline_forecast(series, envalert, rollouts):
+    """The original /predict assembly; None where it raised (pm2_5 missing while others have days)"""
+    result, model_today = {}, {}
+    use_api = envalert is not None
+    for p in back.TARGET_POLLUTANTS:
+        data, timestamps = series[p]
+        if use_api and p in back.API_POLLUTANTS and p in envalert:
+            today = baseline_days(p, data, timestamps, rollouts.get(p), 0)
+            if today:
+                model_today[p] = today[0]
+            category, warning, color = baseline_category(envalert[p]["aqi"])
+            result[p] = [{
+                "day": "Today", "date": datetime.utcnow().strftime("%Y-%m-%d"),
+                "value": round(envalert[p]["value"], 2), "aqi": int(envalert[p]["aqi"]),
+                "category": category, "warning": warning, "color": color,
+            }] + baseline_days(p, data, timestamps, rollouts.get(p), 1)
+        else:
+            result[p] = baseline_days(p, data, timestamps, rollouts.get(p), 0)
+    errors = back.calculate_errors(envalert, model_today)
+
+    pm10, pm25 = result["pm10"], result["pm2_5"]
+    for i in range(min(len(pm10), len(pm25))):
+        if not (use_api and i == 0 and "pm10" in envalert and "pm2_5" in envalert):
+            pm10[i]["value"] = round(pm10[i]["value"] + pm25[i]["value"], 2)
+            rescore(pm10[i], "pm10")
+    for p in back.API_POLLUTANTS:
+        if f"{p}_concentration" in errors:
+            for entry in result[p][1:]:
+                entry["value"] = round(entry["value"] + errors[f"{p}_concentration"], 2)
+                rescore(entry, p)
+
+    today_pollutants = [{**result[p][0], "pollutant": p} for p in back.TARGET_POLLUTANTS if result[p]]
+    overall = []
+    for i in range(back.FORECAST_DAYS):
+        day = [{"pollutant": p, **result[p][i]} for p in back.TARGET_POLLUTANTS if len(result[p]) > i]
+        if not day:
+            continue
+        ranked = sorted(day, key=lambda d: d["aqi"], reverse=True)
+        main = ranked[1] if ranked[0]["pollutant"] == "o3" and len(ranked) > 1 else ranked[0]
+        if len(result["pm2_5"]) <= i:
+            return None
+        overall.append({
+            "day": result["pm2_5"][i]["day"], "date": result["pm2_5"][i]["date"], "main_pollutant": main["pollutant"],
+            **{k: main[k] for k in ("value", "aqi", "category", "warning", "color")},
+        })
+    return {"predictions": result, "today_pollutants": today_pollutants, "overall_daily_aqi": overall, "errors": errors}
+
+
+def window_timestamps():
+    now = datetime.now(back.IST).replace(minute=0, second=0, microsecond=0)
+    return [(now - timedelta(hours=71 - i)).strftime("%Y-%m-%dT%H:%M") for i in range(72)]
+
+
+def random_inputs(rng, timestamps):
+    scale = rng.choice([10, 100, 400, 3000])
+    series, rollouts = {}, {}
+    for p in back.TARGET_POLLUTANTS:
+        data = [round(rng.uniform(0, scale), 1) for _ in range(72)] if rng.random() > 0.1 else []
+        series[p] = (data, timestamps)
+        if rng.random() > 0.1:
+            rollouts[p] = np.array([rng.uniform(0, scale) for _ in range(back.FORECAST_DAYS)])
+    envalert = None
+    if rng.random() < 0.75:
+        envalert = {p: {"value": rng.uniform(0, scale), "aqi": round(rng.uniform(0, 500))}
+                    for p in rng.sample(back.TARGET_POLLUTANTS, rng.randint(0, 6))} or None
+    return series, envalert, rollouts
+
+
+def test_assemble_forecast_matches_original_assembly():
+    rng = random.Random(1)
+    timestamps = window_timestamps()
+    compared = 0
+    for _ in range(400):
+        series, envalert, rollouts = random_inputs(rng, timestamps)
+        expected = baseline_forecast(copy.deepcopy(series), envalert, rollouts)
+        if expected is None:
+            continue
+        payload = back.assemble_forecast({"city": "X", "lat": 1, "lon": 2, "envalert_today_data": envalert,
+                                          "pollutant_series": series, "weather_data": [[0] * 9]}, rollouts)
+        for key, value in expected.items():
+            assert payload[key] == value, key
+        compared += 1
+    assert compared > 300
+
+
+def sequences(rng, n):
+    data = rng.uniform(0, 200, (n, 72))
+    weather = rng.uniform(0, 30, (n, 9))
+    return np.stack([back.build_input_sequence(d, w[None, :]) for d, w in zip(data, weather)])
+
+
+@pytest.mark.parametrize("pollutant", back.TARGET_POLLUTANTS)
+def test_batched_rollout_matches_single_sequence_loop(models, pollutant):
+    batch = sequences(np.random.default_rng(2), 9)
+    expected = np.array([baseline_rollout(models.get(pollutant), s) for s in batch])
+    np.testing.assert_allclose(back.rollout_forecast(pollutant, batch), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_batched_forecast_rollouts_match_per_request(models):
+    rng = np.random.default_rng(3)
+    index = back.HourIndex.from_range(0, 72)
+    inputs_list = [
+        {"pollutant_series": {p: (rng.uniform(0, 200, 72), index) for p in back.TARGET_POLLUTANTS},
+         "weather_data": rng.uniform(0, 30, (24, 9))}
+        for _ in range(4)
+    ]
+    inputs_list[1]["pollutant_series"]["co"] = ([], index)
+    batched = back.batched_forecast_rollouts(inputs_list)
+    for inputs, rollouts in zip(inputs_list, batched):
+        single = back.forecast_rollouts(inputs["pollutant_series"], inputs["weather_data"])
+        assert sorted(rollouts) == sorted(single)
+        for p in single:
+            np.testing.assert_allclose(rollouts[p], single[p], rtol=1e-4, atol=1e-5)
+    assert "co" not in batched[1]
+
+
+def test_inference_batcher_merges_concurrent_rollouts(models):
+    batcher = back.InferenceBatcher(max_batch=8, max_wait=0.05)
+    batch = sequences(np.random.default_rng(4), 6)
+    results = [None] * len(batch)
+
+    def submit(i):
+        results[i] = batcher.submit("pm2_5", batch[i:i + 1]).result(timeout=10)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(batch))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    np.testing.assert_allclose(np.concatenate(results), back.rollout_forecast("pm2_5", batch), rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("missing", [None, float("nan")])
+def test_input_sequence_rejects_missing_hours(missing):
+    data = [10.0] * 72
+    with pytest.raises(ValueError):
+        back.build_input_sequence(data[:-1] + [missing], [[1.0] * 9])
+    with pytest.raises(ValueError):
+        back.build_input_sequence(data, [[1.0] * 8 + [missing]])
+
+
+def test_missing_hour_drops_the_pollutant_and_keeps_json_valid(models):
+    index = window_timestamps()
+    rng = np.random.default_rng(5)
+    series = {p: (list(rng.uniform(5, 150, 72)), index) for p in back.TARGET_POLLUTANTS}
+    series["o3"][0][-1] = None
+    series["co"][0][10] = float("nan")
+    inputs = {"city": "X", "lat": 1, "lon": 2, "weather_data": [[1.0] * 9],
+              "envalert_today_data": None, "pollutant_series": series}
+
+    rollouts = back.forecast_rollouts(series, inputs["weather_data"])
+    assert sorted(rollouts) == ["no2", "pm10", "pm2_5", "so2"]
+    payload = back.assemble_forecast(inputs, rollouts)
+    assert payload["predictions"]["o3"] == [] and payload["predictions"]["co"] == []
+    json.dumps(payload, allow_nan=False)
+
+
+def test_finite_window():
+    assert back.finite_window([1.0] * 72)
+    assert back.finite_window(np.ones(80))
+    assert not back.finite_window([1.0] * 71)
+    assert not back.finite_window([1.0] * 71 + [None])
+    assert not back.finite_window(np.r_[np.ones(71), np.nan])
+
+
+def test_inputs_with_missing_hours_are_degraded(monkeypatch):
+    index = back.HourIndex.from_range(0, 72)
+    gap = [1.0] * 72
+    gap[5] = None
+
+    async def coordinates(city_name):
+        return 23.0, 77.0
+
+    async def weather(lat, lon):
+        return [[1.0] * 9]
+
+    async def pollutants(lat, lon):
+        return {"pm2_5": ([1.0] * 72, index), "pm10": ([1.0] * 72, index), "o3": (gap, index),
+                "co": (np.full(72, np.nan), index), "so2": ([], index), "no2": ([1.0] * 72, index)}
+
+    async def envalert(city_name):
+        return None
+
+    monkeypatch.setattr(back, "aget_city_coordinates", coordinates)
+    monkeypatch.setattr(back, "afetch_weather_series", weather)
+    monkeypatch.setattr(back, "afetch_pollutant_batch", pollutants)
+    monkeypatch.setattr(back, "aget_today_data_from_envalert", envalert)
+
+    inputs, failure = asyncio.run(back.acollect_forecast_inputs("Bhopal"))
+    assert failure is None
+    assert inputs["degraded"] == ["o3", "co", "so2", "envalert"]